@@ -1,3 +1,8 @@
+import os
+import time
+import threading
+from typing import Dict
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -7,6 +12,11 @@ from app.auth import decode_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
+# Usuários já conferidos no banco pelas rotas de imagem (email -> validade)
+AUTH_CACHE_SEC = float(os.getenv("AUTH_CACHE_SEC", "30"))
+_checked_users: Dict[str, float] = {}
+_checked_lock = threading.Lock()
+
 
 def get_db():
     db = SessionLocal()
@@ -34,6 +44,53 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     return user
 
 
+def forget_user(email: str):
+    """Descarta a conferência em cache (usuário alterado ou removido)."""
+    with _checked_lock:
+        _checked_users.pop(email, None)
+
+
+def _user_is_active(email: str) -> bool:
+    now = time.monotonic()
+    with _checked_lock:
+        if _checked_users.get(email, 0.0) > now:
+            return True
+    db = SessionLocal()
+    try:
+        row = db.query(User.is_active).filter(User.email == email).first()
+    finally:
+        db.close()
+    active = row is not None and row[0] is not False
+    with _checked_lock:
+        if active:
+            _checked_users[email] = now + AUTH_CACHE_SEC
+        else:
+            _checked_users.pop(email, None)
+    return active
+
+
+def get_token_subject(token: str = Depends(oauth2_scheme)) -> str:
+    """
+    Valida o JWT e se o usuário ainda existe e está ativo (rotas de imagem e
+    prévias). A conferência no banco fica em cache por AUTH_CACHE_SEC
+    segundos, para não consultar o banco a cada miniatura.
+    """
+    payload = decode_access_token(token)
+    if not payload or "sub" not in payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido ou expirado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not _user_is_active(payload["sub"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Usuário não encontrado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload["sub"]
+
+
 def require_roles(*roles: Role):
     def role_checker(user: User = Depends(get_current_user)) -> User:
         if user.role not in roles:
@@ -1,20 +1,20 @@
 import os
 import asyncio
+import logging
 import json
 import pathlib
-import datetime as dt
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from sqlalchemy.orm import Session
 
-from fastapi import FastAPI, Depends, Request, Form, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, Request, Form, WebSocket
 from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from app.auth import create_access_token, verify_password, get_password_hash
 from app.deps import get_db, get_current_user, require_roles
-from app.models import Base, engine, SessionLocal, User, Camera, Event, AuditLog, Setting, Role
+from app.models import init_db, SessionLocal, User, Camera, AuditLog, Setting, Role
 from app.routers import cameras as cameras_router
 from app.routers import events as events_router
 from app.routers import reports as reports_router
@@ -22,8 +22,15 @@ from app.routers import users as users_router
 from app.routers import logs as logs_router
 from app.routers import metrics as metrics_router
 from app.routers import monitoring as monitoring_router
-from app.services.metrics import Metrics
-from app.workers.manager import WorkerManager
+from app.routers import reanalysis as reanalysis_router
+from app.services.camera_feed import get_camera_feed
+from app.services.cluster import SHARDING_ENABLED, get_cluster_coordinator
+from app.services.event_hub import get_event_hub, serve_websocket
+from app.services.metrics import get_metrics, record_retention_error
+from app.services.reanalysis import get_reanalysis_runner
+from app.services.retention import create_retention_sweeper
+from app.services.yolo import shutdown_inference_engine
+from app.workers.manager import get_worker_manager
 
 DATA_DIR = pathlib.Path("./data")
 IMAGES_DIR = DATA_DIR / "images"
@@ -32,12 +39,14 @@ os.makedirs(IMAGES_DIR, exist_ok=True)
 os.makedirs(THUMBS_DIR, exist_ok=True)
 os.makedirs("model", exist_ok=True)
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="PPE Local", version="1.0.0")
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
-Base.metadata.create_all(bind=engine)
+init_db()
 
 
 def ensure_bootstrap():
@@ -60,8 +69,12 @@ def ensure_bootstrap():
 
 ensure_bootstrap()
 
-metrics = Metrics()
-manager = WorkerManager()
+metrics = get_metrics()
+manager = get_worker_manager()
+# Vários nós no mesmo banco (SHARDING_ENABLED=1): cada nó fica com parte das câmeras
+cluster = get_cluster_coordinator(manager)
+retention = create_retention_sweeper()
+RETENTION_RESUME_SEC = float(os.getenv("RETENTION_RESUME_SEC", "60"))
 
 
 @app.get("/")
@@ -97,7 +110,7 @@ async def create_camera_page(
     detect_helmet: bool = Form(False),
     detect_mask: bool = Form(False),
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_roles(Role.admin, Role.supervisor)),
+    user: User = Depends(require_roles(Role.admin, Role.supervisor)),
 ):
     cam = Camera(
         name=name,
@@ -114,7 +127,7 @@ async def create_camera_page(
     db.add(cam)
     db.commit()
     db.refresh(cam)
-    manager._start_worker(cam)
+    get_camera_feed().publish_upsert(cam)
     return RedirectResponse(url="/cameras", status_code=303)
 
 
@@ -182,47 +195,51 @@ app.include_router(reports_router.router, prefix="/api/reports", tags=["reports"
 app.include_router(users_router.router, prefix="/api/users", tags=["users"])
 app.include_router(logs_router.router, prefix="/api/logs", tags=["logs"])
 app.include_router(metrics_router.router, prefix="/api/metrics", tags=["metrics"])
+app.include_router(reanalysis_router.router, prefix="/api", tags=["reanalysis"])
 app.include_router(monitoring_router.router)
 
 
 @app.websocket("/ws/events")
-async def ws_events(ws: WebSocket):
-    await ws.accept()
-    try:
-        while True:
-            await ws.receive_text()
-    except WebSocketDisconnect:
-        pass
-    except Exception:
-        pass
+async def ws_events(ws: WebSocket, camera_id: Optional[str] = None, last_event_id: Optional[int] = None):
+    """Feed ao vivo; `camera_id=1,2` filtra câmeras e `last_event_id` retoma após reconexão."""
+    cameras = {int(c) for c in camera_id.split(",") if c.strip().isdigit()} if camera_id else None
+    await serve_websocket(ws, get_event_hub(), cameras, last_event_id)
 
 
 async def retention_loop():
     while True:
+        if cluster is not None and not cluster.is_leader():
+            # Só o líder do cluster faz a limpeza
+            await asyncio.sleep(RETENTION_RESUME_SEC)
+            continue
         days = 15
         db = SessionLocal()
         try:
             s = db.query(Setting).filter(Setting.key == "retention_days").first()
             if s:
                 days = int(s.value)
-            cutoff = dt.datetime.utcnow() - dt.timedelta(days=days)
-            old = db.query(Event).filter(Event.timestamp < cutoff).all()
-            for e in old:
-                if e.image_path and os.path.exists(e.image_path):
-                    try:
-                        os.remove(e.image_path)
-                    except Exception:
-                        pass
-                db.delete(e)
-            db.commit()
         finally:
             db.close()
-        await asyncio.sleep(3600)
+        try:
+            result = await retention.run(days)
+        except Exception:
+            # Tenta de novo no próximo ciclo; a falha fica no log e na métrica
+            logger.exception("Falha na varredura de retenção")
+            record_retention_error()
+            result = {"finished": True}
+        # Varredura interrompida pelo limite de tempo continua logo em seguida
+        await asyncio.sleep(3600 if result["finished"] else RETENTION_RESUME_SEC)
 
 
 async def startup():
-    manager.start_all()
+    await manager.start()
+    if cluster is not None:
+        await cluster.start()
     asyncio.create_task(retention_loop())
+    # Jobs de reanálise interrompidos por restart continuam do checkpoint
+    # (com vários nós o job é retomado manualmente, para não rodar em dois nós)
+    if not SHARDING_ENABLED:
+        get_reanalysis_runner().resume_interrupted()
 
 
 @app.on_event("startup")
@@ -232,4 +249,10 @@ async def on_startup():
 
 @app.on_event("shutdown")
 async def on_shutdown():
-    manager.stop_all()
+    if cluster is not None:
+        await cluster.stop()
+    await manager.stop()
+    await get_reanalysis_runner().stop()
+    # Depois dos workers e do sink: coletores por modelo, pools e processos de inferência
+    await shutdown_inference_engine()
+    retention.close()
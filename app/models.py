@@ -2,19 +2,49 @@ import enum
 import os
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Enum, ForeignKey, Boolean, Text, Float
+    Column, Integer, String, DateTime, Enum, ForeignKey, Boolean, Text, Float, Index, event
 )
 from sqlalchemy.orm import relationship, declarative_base, sessionmaker
 from sqlalchemy.ext.declarative import declared_attr
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 
 DB_URL = os.getenv("DB_URL", "sqlite:///./data/app.db")
 
+IS_SQLITE = DB_URL.startswith("sqlite")
+
+# Ajustes do SQLite (ver _sqlite_pragmas)
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
 Base = declarative_base()
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {})
+engine = create_engine(DB_URL, connect_args={"check_same_thread": False} if IS_SQLITE else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def dialect_insert(db):
+    """`insert` do dialeto da sessão (SQLite ou PostgreSQL), com ON CONFLICT para upserts."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        """WAL (leitores não bloqueiam o escritor), fsync reduzido e caches maiores."""
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
+
+
 class Role(str, enum.Enum):
     admin = "admin"
     supervisor = "supervisor"
@@ -59,6 +89,7 @@ class Camera(Base, TimestampMixin):
     detect_person = Column(Boolean, default=True)
     detect_helmet = Column(Boolean, default=True)
     detect_mask = Column(Boolean, default=True)
+    change_sensitivity = Column(Float, default=0.02)
 
 
 class Event(Base, TimestampMixin):
@@ -74,6 +105,11 @@ class Event(Base, TimestampMixin):
 
     camera = relationship("Camera")
 
+    __table_args__ = (
+        Index("ix_events_camera_created", "camera_id", "created_at"),
+        Index("ix_events_created_at", "created_at"),
+    )
+
 
 class AuditLog(Base, TimestampMixin):
     __tablename__ = "audit_logs"
@@ -85,6 +121,102 @@ class AuditLog(Base, TimestampMixin):
 
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_audit_logs_created_at", "created_at"),
+    )
+
+
+class EventRollup(Base):
+    """Contagem de eventos por câmera, tipo e intervalo (minute, hour, day)."""
+
+    __tablename__ = "event_rollups"
+
+    # Ordem da chave: consultas por câmera fazem range em (bucket, bucket_start)
+    camera_id = Column(Integer, primary_key=True)
+    bucket = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_event_rollups_bucket_start", "bucket", "bucket_start"),
+    )
+
+
+class ReanalysisJob(Base, TimestampMixin):
+    """Reprocessamento em lote de imagens arquivadas (eventos ou uma pasta)."""
+
+    __tablename__ = "reanalysis_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False, default="events")  # events | directory
+    directory = Column(String, nullable=True)
+    camera_id = Column(Integer, nullable=True)
+    start_date = Column(DateTime, nullable=True)
+    end_date = Column(DateTime, nullable=True)
+    model_path = Column(String, nullable=True)
+    threshold = Column(Float, nullable=True)  # None = limiar de cada câmera
+    status = Column(String, nullable=False, default="pending")
+    # Checkpoint: último Event.id (events) ou caminho relativo (directory) gravado
+    position = Column(String, nullable=True)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    changed = Column(Integer, default=0)
+    rate = Column(Float, default=0.0)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+
+
+class ReanalysisResult(Base):
+    __tablename__ = "reanalysis_results"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("reanalysis_jobs.id", ondelete="CASCADE"), nullable=False)
+    event_id = Column(Integer, nullable=True)
+    camera_id = Column(Integer, nullable=True)
+    image_path = Column(String, nullable=False)
+    previous_status = Column(String, nullable=True)
+    ppe_status = Column(String, nullable=True)
+    persons = Column(Integer, default=0)
+    violations = Column(Integer, default=0)
+    changed = Column(Boolean, default=False)
+    summary = Column(Text, nullable=True)
+    error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_reanalysis_results_job", "job_id", "id"),
+        Index("ix_reanalysis_results_event", "event_id"),
+    )
+
+
+class ClusterNode(Base):
+    """Instância do ppe-local no modo com vários nós (SHARDING_ENABLED)."""
+
+    __tablename__ = "cluster_nodes"
+
+    node_id = Column(String, primary_key=True)
+    host = Column(String, nullable=True)
+    pid = Column(Integer, nullable=True)
+    url = Column(String, nullable=True)
+    weight = Column(Float, default=1.0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, nullable=False)
+
+
+class CameraLease(Base):
+    """Posse de uma câmera por um nó; vale enquanto `renewed_at` estiver dentro do TTL."""
+
+    __tablename__ = "camera_leases"
+
+    camera_id = Column(Integer, primary_key=True)
+    node_id = Column(String, nullable=False, index=True)
+    # Incrementa a cada troca de dono
+    epoch = Column(Integer, nullable=False, default=1)
+    acquired_at = Column(DateTime, nullable=False)
+    renewed_at = Column(DateTime, nullable=False)
+
 
 class Setting(Base):
     __tablename__ = "settings"
@@ -93,5 +225,36 @@ class Setting(Base):
     value = Column(String, nullable=False)
 
 
+def _add_missing_columns():
+    """Adiciona colunas novas em tabelas já existentes (create_all não altera tabelas)."""
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(dialect=engine.dialect)}"
+                if col.default is not None and col.default.is_scalar:
+                    ddl += f" DEFAULT {col.default.arg!r}"
+                conn.execute(text(ddl))
+
+
+def _create_missing_indexes():
+    """Cria índices declarados nos modelos que ainda não existem no banco."""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
 def init_db():
+    """Cria as tabelas e aplica as migrações leves (colunas e índices novos)."""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _create_missing_indexes()
+    if IS_SQLITE:
+        with engine.begin() as conn:
+            conn.execute(text("PRAGMA optimize"))
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List
 
 from app import models, schemas, deps
-from app.workers.manager import WorkerManager
+from app.services.camera_feed import get_camera_feed
+from app.workers.manager import get_worker_manager
 
 router = APIRouter(prefix="/cameras", tags=["Câmeras"])
-manager = WorkerManager()
+manager = get_worker_manager()
 
 @router.get("/", response_model=List[schemas.CameraOut])
 def list_cameras(db: Session = Depends(deps.get_db), _: models.User = Depends(deps.get_current_user)):
@@ -18,10 +19,21 @@ def create_camera(camera_in: schemas.CameraCreate, db: Session = Depends(deps.ge
     db.add(camera)
     db.commit()
     db.refresh(camera)
-    if camera.enabled:
-        manager._start_worker(camera)
+    get_camera_feed().publish_upsert(camera)
     return camera
 
+@router.get("/health", response_model=List[Dict[str, Any]])
+def cameras_health(_: models.User = Depends(deps.get_current_user)):
+    """Saúde dos workers: estado, idade do heartbeat e do último frame, erros e reinícios."""
+    return manager.health()
+
+@router.get("/{camera_id}/health", response_model=Dict[str, Any])
+def camera_health(camera_id: int, _: models.User = Depends(deps.get_current_user)):
+    health = manager.health(camera_id)
+    if not health:
+        raise HTTPException(status_code=404, detail="Câmera sem worker ativo")
+    return health[0]
+
 @router.put("/{camera_id}", response_model=schemas.CameraOut)
 def update_camera(camera_id: int, camera_in: schemas.CameraUpdate, db: Session = Depends(deps.get_db), _: models.User = Depends(deps.get_admin_user)):
     camera = db.query(models.Camera).filter(models.Camera.id == camera_id).first()
@@ -31,10 +43,8 @@ def update_camera(camera_id: int, camera_in: schemas.CameraUpdate, db: Session =
         setattr(camera, field, value)
     db.commit()
     db.refresh(camera)
-    if camera.enabled:
-        manager.restart_worker(camera_id)
-    else:
-        manager.stop_worker(camera_id)
+    # O worker em execução recebe só a diferença; desativar para o worker
+    get_camera_feed().publish_upsert(camera)
     return camera
 
 @router.delete("/{camera_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -44,7 +54,7 @@ def delete_camera(camera_id: int, db: Session = Depends(deps.get_db), _: models.
         raise HTTPException(status_code=404, detail="Câmera não encontrada")
     db.delete(camera)
     db.commit()
-    manager.stop_worker(camera_id)
+    get_camera_feed().publish_delete(camera_id)
     return None
 
 @router.post("/reload", status_code=status.HTTP_200_OK)
@@ -1,33 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Union
 
 from app import models, schemas, deps
+from app.models import SessionLocal
+from app.services import rollups
+from app.services.pagination import keyset_page, page_size
+from app.services.thumbnails import get_image_cache, image_response, variant_paths
 import os
 
 router = APIRouter(prefix="/events", tags=["Eventos"])
 
 @router.get("/", response_model=List[schemas.EventOut])
 def list_events(limit: int = 50, db: Session = Depends(deps.get_db), _: models.User = Depends(deps.get_current_user)):
-    return db.query(models.Event).order_by(models.Event.created_at.desc()).limit(limit).all()
+    return (
+        db.query(models.Event)
+        .options(selectinload(models.Event.camera))
+        .order_by(models.Event.created_at.desc(), models.Event.id.desc())
+        .limit(page_size(limit))
+        .all()
+    )
 
-@router.get("/search", response_model=List[schemas.EventOut])
+@router.get("/search", response_model=Union[schemas.EventPage, List[schemas.EventOut]])
 def search_events(
     camera_id: int = None,
     start_date: str = None,
     end_date: str = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    legacy: bool = False,
     db: Session = Depends(deps.get_db),
     _: models.User = Depends(deps.get_current_user)
 ):
-    query = db.query(models.Event)
+    """
+    Página de eventos (mais recentes primeiro) e `next_cursor` para a próxima.
+    `legacy=true` devolve só a lista da página, no formato anterior à paginação.
+    """
+    query = db.query(models.Event).options(selectinload(models.Event.camera))
     if camera_id:
         query = query.filter(models.Event.camera_id == camera_id)
     if start_date:
         query = query.filter(models.Event.created_at >= start_date)
     if end_date:
         query = query.filter(models.Event.created_at <= end_date)
-    return query.order_by(models.Event.created_at.desc()).all()
+    try:
+        items, next_cursor = keyset_page(query, models.Event, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if legacy:
+        return items
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.get("/{event_id}", response_model=schemas.EventOut)
 def get_event(event_id: int, db: Session = Depends(deps.get_db), _: models.User = Depends(deps.get_current_user)):
@@ -37,19 +59,26 @@ def get_event(event_id: int, db: Session = Depends(deps.get_db), _: models.User
     return event
 
 @router.get("/{event_id}/image")
-def get_event_image(event_id: int, db: Session = Depends(deps.get_db), _: models.User = Depends(deps.get_current_user)):
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if not event or not event.image_path or not os.path.exists(event.image_path):
-        raise HTTPException(status_code=404, detail="Imagem não encontrada")
-    return FileResponse(event.image_path)
+def get_event_image(request: Request, event_id: int, _: str = Depends(deps.get_token_subject)):
+    def lookup():
+        db = SessionLocal()
+        try:
+            event = db.query(models.Event).filter(models.Event.id == event_id).first()
+            return event.image_path if event else None
+        finally:
+            db.close()
+    return image_response(request, event_id, 0, lookup)
 
 @router.delete("/{event_id}")
 def delete_event(event_id: int, db: Session = Depends(deps.get_db), _: models.User = Depends(deps.get_admin_user)):
     event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
-    if event.image_path and os.path.exists(event.image_path):
-        os.remove(event.image_path)
+    for path in [event.image_path, *variant_paths(event.thumb_path)]:
+        if path and os.path.exists(path):
+            os.remove(path)
+    get_image_cache().discard(event_id)
+    rollups.forget_events(db, [event])
     db.delete(event)
     db.commit()
     return {"message": "Evento excluído com sucesso"}
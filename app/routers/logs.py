@@ -1,19 +1,25 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session, selectinload
+from typing import Optional
 
 from app import models, schemas, deps
+from app.services.pagination import keyset_page
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
 
-@router.get("/", response_model=List[schemas.AuditLogOut])
+@router.get("/", response_model=schemas.AuditLogPage)
 def list_logs(
-    skip: int = 0,
-    limit: int = 50,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
     db: Session = Depends(deps.get_db),
     _: models.User = Depends(deps.get_admin_user)
 ):
-    return db.query(models.AuditLog).order_by(models.AuditLog.created_at.desc()).offset(skip).limit(limit).all()
+    query = db.query(models.AuditLog).options(selectinload(models.AuditLog.user))
+    try:
+        items, next_cursor = keyset_page(query, models.AuditLog, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.post("/", response_model=schemas.AuditLogOut)
 def create_log(
@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Depends
 from fastapi.responses import PlainTextResponse
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+import datetime as dt
+import psutil
 from sqlalchemy.orm import Session
 
 from app import deps, models
-from app.services import metrics
+from app.services import metrics, rollups
+from app.services.event_hub import get_event_hub
+from app.services.snapshots import get_snapshot_cache
+from app.services.model_registry import get_model_registry
+from app.services.cluster import get_cluster_coordinator
+from app.workers.manager import get_worker_manager
 
 router = APIRouter(prefix="/metrics", tags=["Métricas"])
 
@@ -19,12 +26,46 @@ def get_stats(
     db: Session = Depends(deps.get_db),
     _: models.User = Depends(deps.get_current_user)
 ):
+    cpu = psutil.cpu_percent(interval=None)
+    ram = psutil.virtual_memory().percent
+    metrics.record_cpu_usage(cpu)
+    metrics.record_ram_usage(ram)
     total_cameras = db.query(models.Camera).count()
-    total_events = db.query(models.Event).count()
+    total_events = rollups.total_count(db)
+    events_24h = rollups.count_since(db, dt.datetime.utcnow() - dt.timedelta(hours=24))
     return {
         "total_cameras": total_cameras,
         "total_events": total_events,
-        "fps": metrics.fps_gauge.collect()[0].samples[0].value if metrics.fps_gauge.collect() else 0,
-        "cpu_usage": metrics.cpu_usage_gauge.collect()[0].samples[0].value if metrics.cpu_usage_gauge.collect() else 0,
-        "ram_usage": metrics.ram_usage_gauge.collect()[0].samples[0].value if metrics.ram_usage_gauge.collect() else 0
+        "events_24h": events_24h,
+        "cpu_usage": cpu,
+        "ram_usage": ram,
+        "pipeline": metrics.get_metrics().summary(),
+        "models": get_model_registry().stats(),
+        "ws": get_event_hub().stats(),
+        "snapshots": get_snapshot_cache().stats(),
+        "workers": _worker_counts(),
     }
+
+
+def _worker_counts():
+    counts = {}
+    for h in get_worker_manager().health():
+        counts[h["status"]] = counts.get(h["status"], 0) + 1
+    return counts
+
+@router.get("/models")
+def get_models(
+    _: models.User = Depends(deps.get_current_user)
+):
+    """Modelos carregados: tempo de carga, memória estimada e câmeras que os usam."""
+    return get_model_registry().stats()
+
+@router.get("/cluster")
+def get_cluster(
+    _: models.User = Depends(deps.get_current_user)
+):
+    """Nós do cluster (modo SHARDING_ENABLED), líder e câmeras de cada nó."""
+    cluster = get_cluster_coordinator()
+    if cluster is None:
+        return {"enabled": False}
+    return {"enabled": True, **cluster.stats()}
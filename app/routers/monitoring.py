@@ -1,11 +1,12 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from app import models, deps
+from app.services.snapshots import get_snapshot_cache
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
@@ -26,11 +27,11 @@ async def monitoring_page(
     cols = COLS_MAP.get(layout, 4)
 
     cameras: List[models.Camera] = (
-        db.query(models.Camera).filter(models.Camera.active == True).all()
+        db.query(models.Camera).filter(models.Camera.enabled == True).all()
     )
     events: List[models.Event] = (
         db.query(models.Event)
-        .order_by(models.Event.ts.desc())
+        .order_by(models.Event.created_at.desc())
         .limit(50)
         .all()
     )
@@ -63,3 +64,65 @@ async def monitoring_event_detail(
     return templates.TemplateResponse(
         "event_detail.html", {"request": request, "event": event}
     )
+
+
+MJPEG_BOUNDARY = "ppeframe"
+
+
+@router.get("/monitoramento/preview/{camera_id}.jpg")
+async def camera_preview(
+    request: Request,
+    camera_id: int,
+    width: Optional[int] = None,
+    boxes: bool = False,
+    _: str = Depends(deps.get_token_subject),
+):
+    """Último snapshot reduzido da câmera; ETag = sequência do frame (304 se não mudou)."""
+    cache = get_snapshot_cache()
+    snap = cache.latest(camera_id)
+    if snap is None:
+        raise HTTPException(status_code=404, detail="Sem imagem para a câmera")
+    width = cache.preview_width(width)
+    etag = f'"{snap.seq:x}-{width}-{int(boxes)}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    try:
+        body = await cache.preview(snap, width, boxes)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Sem imagem para a câmera")
+    return Response(body, media_type="image/jpeg", headers=headers)
+
+
+@router.get("/monitoramento/stream/{camera_id}")
+async def camera_stream(
+    request: Request,
+    camera_id: int,
+    width: Optional[int] = None,
+    boxes: bool = False,
+    _: str = Depends(deps.get_token_subject),
+):
+    """MJPEG (multipart/x-mixed-replace) com um frame a cada snapshot novo do worker."""
+    cache = get_snapshot_cache()
+    width = cache.preview_width(width)
+
+    async def frames():
+        seq = 0
+        while not await request.is_disconnected():
+            snap = await cache.wait_newer(camera_id, seq, timeout=5.0)
+            if snap is None:
+                continue
+            seq = snap.seq
+            try:
+                body = await cache.preview(snap, width, boxes)
+            except ValueError:
+                continue
+            yield (
+                f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(body)}\r\n\r\n"
+            ).encode() + body + b"\r\n"
+
+    return StreamingResponse(
+        frames(),
+        media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app import models, schemas, deps
+from app.services import reanalysis
+from app.services.pagination import page_size
+
+router = APIRouter(prefix="/reanalysis", tags=["Reanálise"])
+
+
+def _get_job(db: Session, job_id: int) -> models.ReanalysisJob:
+    job = db.get(models.ReanalysisJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@router.post("/", response_model=schemas.ReanalysisJobOut)
+async def create_job(
+    job_in: schemas.ReanalysisJobCreate,
+    db: Session = Depends(deps.get_db),
+    _: models.User = Depends(deps.get_admin_user)
+):
+    """Cria um job de reanálise e o coloca na fila de execução em background."""
+    try:
+        job = reanalysis.create_job(db, **job_in.model_dump())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    reanalysis.get_reanalysis_runner().submit(job.id)
+    return reanalysis.job_dict(job)
+
+
+@router.get("/", response_model=List[schemas.ReanalysisJobOut])
+def list_jobs(
+    db: Session = Depends(deps.get_db),
+    _: models.User = Depends(deps.get_admin_user)
+):
+    jobs = db.query(models.ReanalysisJob).order_by(models.ReanalysisJob.id.desc()).limit(100).all()
+    return [reanalysis.job_dict(j) for j in jobs]
+
+
+@router.get("/{job_id}", response_model=schemas.ReanalysisJobOut)
+def get_job(
+    job_id: int,
+    db: Session = Depends(deps.get_db),
+    _: models.User = Depends(deps.get_admin_user)
+):
+    """Progresso do job (processados, vazão, previsão de término)."""
+    return reanalysis.job_dict(_get_job(db, job_id))
+
+
+@router.post("/{job_id}/pause", response_model=schemas.ReanalysisJobOut)
+def pause_job(
+    job_id: int,
+    db: Session = Depends(deps.get_db),
+    _: models.User = Depends(deps.get_admin_user)
+):
+    """Pausa ao fim do bloco corrente; o checkpoint permite retomar depois."""
+    job = _get_job(db, job_id)
+    if job.status not in reanalysis.ACTIVE:
+        raise HTTPException(status_code=409, detail=f"Job está {job.status}")
+    job.status = "paused"
+    db.commit()
+    return reanalysis.job_dict(job)
+
+
+@router.post("/{job_id}/resume", response_model=schemas.ReanalysisJobOut)
+async def resume_job(
+    job_id: int,
+    db: Session = Depends(deps.get_db),
+    _: models.User = Depends(deps.get_admin_user)
+):
+    job = _get_job(db, job_id)
+    if job.status not in ("paused", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job está {job.status}")
+    job.status = "pending"
+    db.commit()
+    reanalysis.get_reanalysis_runner().submit(job.id)
+    return reanalysis.job_dict(job)
+
+
+@router.post("/{job_id}/cancel", response_model=schemas.ReanalysisJobOut)
+def cancel_job(
+    job_id: int,
+    db: Session = Depends(deps.get_db),
+    _: models.User = Depends(deps.get_admin_user)
+):
+    job = _get_job(db, job_id)
+    if job.status in ("done", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job está {job.status}")
+    job.status = "cancelled"
+    db.commit()
+    return reanalysis.job_dict(job)
+
+
+@router.get("/{job_id}/results", response_model=schemas.ReanalysisResultPage)
+def list_results(
+    job_id: int,
+    changed_only: bool = False,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(deps.get_db),
+    _: models.User = Depends(deps.get_admin_user)
+):
+    """Resultados em ordem de gravação; `changed_only` traz só os eventos cujo status mudou."""
+    _get_job(db, job_id)
+    query = db.query(models.ReanalysisResult).filter(models.ReanalysisResult.job_id == job_id)
+    if changed_only:
+        query = query.filter(models.ReanalysisResult.changed.is_(True))
+    if cursor:
+        if not cursor.isdigit():
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        query = query.filter(models.ReanalysisResult.id > int(cursor))
+    size = page_size(limit)
+    rows = query.order_by(models.ReanalysisResult.id).limit(size + 1).all()
+    next_cursor = str(rows[size - 1].id) if len(rows) > size else None
+    return {"items": rows[:size], "next_cursor": next_cursor}
@@ -1,64 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Union
 from fastapi.responses import StreamingResponse
-import csv
-import io
 import os
+import datetime as dt
 
 from app import models, schemas, deps
+from app.models import SessionLocal
+from app.services import export, rollups, thumbnails
+from app.services.pagination import keyset_page
 
 router = APIRouter(prefix="/reports", tags=["Relatórios"])
 
-@router.post("/search", response_model=List[schemas.EventOut])
+@router.post("/search", response_model=Union[schemas.EventPage, List[schemas.EventOut]])
 def search_reports(
     filters: schemas.ReportFilter,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    legacy: bool = False,
     db: Session = Depends(deps.get_db),
     _: models.User = Depends(deps.get_current_user)
 ):
-    query = db.query(models.Event)
+    """
+    Página de eventos (mais recentes primeiro) e `next_cursor` para a próxima.
+    `legacy=true` devolve só a lista da página, no formato anterior à paginação.
+    """
+    query = db.query(models.Event).options(selectinload(models.Event.camera))
     if filters.camera_id:
         query = query.filter(models.Event.camera_id == filters.camera_id)
     if filters.start_date:
         query = query.filter(models.Event.created_at >= filters.start_date)
     if filters.end_date:
         query = query.filter(models.Event.created_at <= filters.end_date)
-    return query.order_by(models.Event.created_at.desc()).all()
+    try:
+        items, next_cursor = keyset_page(query, models.Event, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if legacy:
+        return items
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.post("/export")
 def export_reports_csv(
     filters: schemas.ReportFilter,
-    db: Session = Depends(deps.get_db),
+    format: str = "csv",
+    gzip: bool = False,
     _: models.User = Depends(deps.get_current_user)
 ):
-    query = db.query(models.Event)
-    if filters.camera_id:
-        query = query.filter(models.Event.camera_id == filters.camera_id)
-    if filters.start_date:
-        query = query.filter(models.Event.created_at >= filters.start_date)
-    if filters.end_date:
-        query = query.filter(models.Event.created_at <= filters.end_date)
-    events = query.order_by(models.Event.created_at.desc()).all()
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido; use {', '.join(export.FORMATS)}")
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=400, detail="Exportação Parquet requer pyarrow instalado")
+    media_type, ext = export.FORMATS[format]
+    filename = f"relatorio.{ext}"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    chunk_size = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+    return StreamingResponse(
+        export.export_events(filters, format, gzip=gzip, chunk_size=chunk_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ID", "Câmera", "Data/Hora", "Status EPI", "Caminho Imagem"])
-    for e in events:
-        writer.writerow([
-            e.id,
-            e.camera.name if e.camera else "",
-            e.created_at.isoformat(),
-            e.event_type,
-            e.image_path
-        ])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv", headers={
-        "Content-Disposition": "attachment; filename=relatorio.csv"
-    })
+@router.get("/trends")
+def get_trends(
+    bucket: str = "hour",
+    days: int = 7,
+    start_date: Optional[dt.datetime] = None,
+    end_date: Optional[dt.datetime] = None,
+    camera_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    group_by: Optional[str] = None,
+    db: Session = Depends(deps.get_db),
+    _: models.User = Depends(deps.get_current_user)
+):
+    """Contagens por intervalo (minute, hour, day) a partir de `event_rollups`."""
+    end = end_date or dt.datetime.utcnow()
+    start = start_date or end - dt.timedelta(days=days)
+    try:
+        series = rollups.trend(db, bucket, start, end, camera_id, event_type, group_by)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"bucket": bucket, "start": start, "end": end, "series": series}
 
 @router.get("/thumbnails/{event_id}")
-def get_event_thumbnail(event_id: int, db: Session = Depends(deps.get_db), _: models.User = Depends(deps.get_current_user)):
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if not event or not event.thumb_path or not os.path.exists(event.thumb_path):
-        raise HTTPException(status_code=404, detail="Miniatura não encontrada")
-    return StreamingResponse(open(event.thumb_path, "rb"), media_type="image/jpeg")
+def get_event_thumbnail(
+    request: Request,
+    event_id: int,
+    size: int = thumbnails.DEFAULT_THUMB_SIZE,
+    _: str = Depends(deps.get_token_subject)
+):
+    """Miniatura do evento no tamanho de THUMB_SIZES mais próximo de `size`."""
+    size = min(thumbnails.THUMB_SIZES, key=lambda s: abs(s - size))
+
+    def lookup():
+        db = SessionLocal()
+        try:
+            event = db.query(models.Event).filter(models.Event.id == event_id).first()
+            return thumbnails.variant_path(event.thumb_path, size) if event and event.thumb_path else None
+        finally:
+            db.close()
+    return thumbnails.image_response(request, event_id, size, lookup)
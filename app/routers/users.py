@@ -43,6 +43,7 @@ def update_user(
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    old_email = user.email
     if user_in.email:
         user.email = user_in.email
     if user_in.password:
@@ -52,6 +53,8 @@ def update_user(
     if user_in.is_active is not None:
         user.is_active = user_in.is_active
     db.commit()
+    # Só depois do commit: antes dele outro pedido poderia recolocar o estado antigo no cache
+    deps.forget_user(old_email)
     db.refresh(user)
     return user
 
@@ -66,4 +69,5 @@ def delete_user(
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     db.delete(user)
     db.commit()
+    deps.forget_user(user.email)
     return None
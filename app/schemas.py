@@ -62,6 +62,7 @@ class CameraBase(BaseModel):
     detect_person: bool = True
     detect_helmet: bool = True
     detect_mask: bool = True
+    change_sensitivity: float = 0.02
 
 
 class CameraCreate(CameraBase):
@@ -82,6 +83,7 @@ class CameraUpdate(BaseModel):
     detect_person: Optional[bool] = None
     detect_helmet: Optional[bool] = None
     detect_mask: Optional[bool] = None
+    change_sensitivity: Optional[float] = None
 
 
 class CameraOut(CameraBase):
@@ -118,6 +120,11 @@ class EventOut(EventBase):
         from_attributes = True
 
 
+class EventPage(BaseModel):
+    items: List[EventOut]
+    next_cursor: Optional[str] = None
+
+
 # ------------------------
 # Relatórios
 # ------------------------
@@ -127,6 +134,70 @@ class ReportFilter(BaseModel):
     end_date: Optional[datetime] = None
 
 
+# ------------------------
+# Reanálise
+# ------------------------
+class ReanalysisJobCreate(BaseModel):
+    source: str = "events"
+    directory: Optional[str] = None
+    camera_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    model_path: Optional[str] = None
+    threshold: Optional[float] = None
+
+    class Config:
+        protected_namespaces = ()
+
+
+class ReanalysisJobOut(BaseModel):
+    id: int
+    source: str
+    directory: Optional[str] = None
+    camera_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    model_path: Optional[str] = None
+    threshold: Optional[float] = None
+    status: str
+    total: int
+    processed: int
+    failed: int
+    changed: int
+    rate: float
+    percent: float
+    eta_sec: Optional[int] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    class Config:
+        protected_namespaces = ()
+
+
+class ReanalysisResultOut(BaseModel):
+    id: int
+    job_id: int
+    event_id: Optional[int] = None
+    camera_id: Optional[int] = None
+    image_path: str
+    previous_status: Optional[str] = None
+    ppe_status: Optional[str] = None
+    persons: int
+    violations: int
+    changed: bool
+    summary: Optional[str] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ReanalysisResultPage(BaseModel):
+    items: List[ReanalysisResultOut]
+    next_cursor: Optional[str] = None
+
+
 # ------------------------
 # Auditoria
 # ------------------------
@@ -149,6 +220,11 @@ class AuditLogOut(AuditLogBase):
         from_attributes = True
 
 
+class AuditLogPage(BaseModel):
+    items: List[AuditLogOut]
+    next_cursor: Optional[str] = None
+
+
 # ------------------------
 # Configurações
 # ------------------------
@@ -0,0 +1,74 @@
+import threading
+from typing import Callable, List, Optional
+
+from app.models import Camera
+
+
+def detached_copy(camera: Camera) -> Camera:
+    """Cópia da câmera fora da sessão (só colunas), segura para outras threads."""
+    return Camera(**{col.key: getattr(camera, col.key) for col in Camera.__table__.columns})
+
+
+class CameraChange:
+    __slots__ = ("seq", "camera_id", "camera")
+
+    def __init__(self, seq: int, camera_id: int, camera: Optional[Camera]):
+        self.seq = seq
+        self.camera_id = camera_id
+        self.camera = camera  # None = câmera removida
+
+    @property
+    def deleted(self) -> bool:
+        return self.camera is None
+
+
+class CameraFeed:
+    """
+    Feed em processo das alterações de câmera.
+
+    As rotas publicam a câmera gravada logo após o commit e o WorkerManager
+    aplica só a diferença no worker em execução, sem reler a tabela. Os
+    assinantes são chamados na thread de quem publicou; o manager repassa a
+    alteração ao event loop.
+    """
+
+    def __init__(self):
+        self._seq = 0
+        self._listeners: List[Callable[[CameraChange], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: Callable[[CameraChange], None]):
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[CameraChange], None]):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _publish(self, camera_id: int, camera: Optional[Camera]) -> CameraChange:
+        with self._lock:
+            self._seq += 1
+            change = CameraChange(self._seq, camera_id, camera)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(change)
+        return change
+
+    def publish_upsert(self, camera: Camera) -> CameraChange:
+        """Câmera criada ou alterada (inclusive desativada)."""
+        return self._publish(camera.id, detached_copy(camera))
+
+    def publish_delete(self, camera_id: int) -> CameraChange:
+        return self._publish(camera_id, None)
+
+
+_feed: Optional[CameraFeed] = None
+
+
+def get_camera_feed() -> CameraFeed:
+    global _feed
+    if _feed is None:
+        _feed = CameraFeed()
+    return _feed
@@ -0,0 +1,289 @@
+import os
+import math
+import socket
+import asyncio
+import hashlib
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, update
+
+from app.models import SessionLocal, Camera, CameraLease, ClusterNode, dialect_insert
+from app.services import metrics
+
+SHARDING_ENABLED = os.getenv("SHARDING_ENABLED", "0") == "1"
+
+
+def default_node_id() -> str:
+    return os.getenv("NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def rendezvous_owner(camera_id: int, nodes: Dict[str, float]) -> Optional[str]:
+    """
+    Nó dono de uma câmera por hashing de rendezvous ponderado.
+
+    Cada nó tem um score por câmera; vence o maior. Quando um nó entra ou
+    sai, só as câmeras que ele ganha ou perde mudam de dono.
+    """
+    best, best_score = None, -1.0
+    for node_id, weight in nodes.items():
+        digest = hashlib.sha1(f"{node_id}:{camera_id}".encode()).digest()
+        h = (int.from_bytes(digest[:8], "big") + 1) / 2.0**64  # (0, 1]
+        score = weight / -math.log(h) if h < 1.0 else math.inf
+        if score > best_score or (score == best_score and node_id < (best or "")):
+            best, best_score = node_id, score
+    return best
+
+
+class ClusterCoordinator:
+    """
+    Divide as câmeras entre os nós que compartilham o banco.
+
+    A cada `heartbeat` segundos o nó renova a sua linha em `cluster_nodes`,
+    calcula pelo rendezvous quais câmeras ativas são suas entre os nós vivos
+    (heartbeat dentro de `ttl`) e acerta as linhas de `camera_leases`:
+
+    - renova os leases que já são seus; se a renovação falhar (outro nó
+      assumiu), para o worker;
+    - devolve os que passaram a ser de outro nó (entrada de um nó novo),
+      parando o worker antes de apagar o lease;
+    - toma os que estão livres ou vencidos (nó morto: lease sem renovação
+      há mais de `ttl`), com UPDATE condicional, para que dois nós nunca
+      fiquem com a mesma câmera.
+
+    As câmeras em posse do nó são repassadas ao WorkerManager. O nó vivo de
+    menor id é o líder, que roda as tarefas de manutenção (retenção).
+    Os relógios dos nós devem estar sincronizados (NTP).
+    """
+
+    def __init__(self, manager, node_id: Optional[str] = None, heartbeat: float = 3.0, ttl: float = 10.0,
+                 weight: float = 1.0, url: Optional[str] = None, session_factory=SessionLocal):
+        self.manager = manager
+        self.node_id = node_id or default_node_id()
+        self.heartbeat = heartbeat
+        self.ttl = ttl
+        self.weight = weight
+        self.url = url
+        self.session_factory = session_factory
+        self.owned: Set[int] = set()
+        self.live_nodes: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ppe-cluster-db")
+        # O manager só inicia workers das câmeras com lease deste nó
+        manager.owns = self.owns
+
+    def owns(self, camera_id: int) -> bool:
+        return camera_id in self.owned
+
+    def is_leader(self) -> bool:
+        return bool(self.live_nodes) and min(self.live_nodes) == self.node_id
+
+    # ------------------------
+    # Banco (rodam na thread do _db_pool)
+    # ------------------------
+    def _beat(self, db, now: dt.datetime):
+        insert = dialect_insert(db)
+        values = {
+            "node_id": self.node_id,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "url": self.url,
+            "weight": self.weight,
+            "started_at": now,
+            "heartbeat_at": now,
+        }
+        stmt = insert(ClusterNode).values(**values)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["node_id"],
+            set_={"heartbeat_at": now, "url": self.url, "weight": self.weight, "pid": os.getpid()},
+        ))
+
+    def _take(self, db, camera_id: int, lease: Optional[CameraLease], now: dt.datetime) -> bool:
+        if lease is None:
+            insert = dialect_insert(db)
+            result = db.execute(insert(CameraLease).values(
+                camera_id=camera_id, node_id=self.node_id, epoch=1, acquired_at=now, renewed_at=now,
+            ).on_conflict_do_nothing(index_elements=["camera_id"]))
+        else:
+            # Só troca se ninguém mexeu no lease desde a leitura
+            result = db.execute(
+                update(CameraLease)
+                .where(
+                    CameraLease.camera_id == camera_id,
+                    CameraLease.node_id == lease.node_id,
+                    CameraLease.renewed_at == lease.renewed_at,
+                )
+                .values(node_id=self.node_id, epoch=lease.epoch + 1, acquired_at=now, renewed_at=now)
+            )
+        return result.rowcount == 1
+
+    def _tick(self) -> Tuple[Dict[int, Camera], List[int]]:
+        """Um ciclo de heartbeat/balanceamento: (câmeras em posse do nó, leases a devolver)."""
+        now = dt.datetime.utcnow()
+        expired = now - dt.timedelta(seconds=self.ttl)
+        db = self.session_factory()
+        try:
+            self._beat(db, now)
+            db.commit()
+
+            self.live_nodes = {
+                n: (w or 1.0) for n, w in
+                db.query(ClusterNode.node_id, ClusterNode.weight).filter(ClusterNode.heartbeat_at >= expired)
+            }
+            self.live_nodes.setdefault(self.node_id, self.weight)
+            cameras = {c.id: c for c in db.query(Camera).filter(Camera.enabled == True).all()}
+            for cam in cameras.values():
+                db.expunge(cam)  # seguem para o WorkerManager depois do commit
+            leases = {l.camera_id: l for l in db.query(CameraLease).all()}
+
+            owned: Set[int] = set()
+            released: List[int] = []
+            for cam_id in cameras:
+                lease = leases.get(cam_id)
+                mine = rendezvous_owner(cam_id, self.live_nodes) == self.node_id
+                if lease is not None and lease.node_id == self.node_id:
+                    if not mine:
+                        released.append(cam_id)
+                        continue
+                    renewed = db.execute(
+                        update(CameraLease)
+                        .where(CameraLease.camera_id == cam_id, CameraLease.node_id == self.node_id)
+                        .values(renewed_at=now)
+                    ).rowcount
+                    if renewed:
+                        owned.add(cam_id)
+                elif mine and (lease is None or lease.renewed_at < expired or lease.node_id not in self.live_nodes):
+                    if self._take(db, cam_id, lease, now):
+                        owned.add(cam_id)
+                        metrics.record_lease_acquired(self.node_id)
+                # Demais casos: outro nó ainda tem o lease e vai devolvê-lo
+            db.commit()
+
+            # Leases de câmeras removidas/desativadas ou entregues a outro nó
+            stale = [cam_id for cam_id, l in leases.items() if l.node_id == self.node_id and cam_id not in cameras]
+            self.owned = owned
+            return {cam_id: cameras[cam_id] for cam_id in owned}, released + stale
+        finally:
+            db.close()
+
+    def _release(self, camera_ids: List[int]):
+        if not camera_ids:
+            return
+        db = self.session_factory()
+        try:
+            db.execute(delete(CameraLease).where(
+                CameraLease.camera_id.in_(camera_ids), CameraLease.node_id == self.node_id,
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def _leave(self):
+        db = self.session_factory()
+        try:
+            db.execute(delete(CameraLease).where(CameraLease.node_id == self.node_id))
+            db.execute(delete(ClusterNode).where(ClusterNode.node_id == self.node_id))
+            # Limpa nós mortos há muito tempo
+            db.execute(delete(ClusterNode).where(
+                ClusterNode.heartbeat_at < dt.datetime.utcnow() - dt.timedelta(seconds=self.ttl * 30)
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_pool, fn, *args)
+
+    # ------------------------
+    # Ciclo (event loop)
+    # ------------------------
+    async def step(self):
+        owned, to_release = await self._db(self._tick)
+        # Espera as tasks dos workers terminarem antes de liberar os leases:
+        # nunca há dois nós na mesma câmera. Um worker que não parou a tempo
+        # fica com o lease até ele vencer (ttl), sem renovação.
+        still_running = await self.manager.assign(owned)
+        to_release = [cam_id for cam_id in to_release if cam_id not in still_running]
+        if to_release:
+            await self._db(self._release, to_release)
+        metrics.record_cluster_state(self.node_id, len(self.live_nodes), len(owned))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Sem banco não dá para renovar: os leases vencem e outro nó assume
+                self.owned = set()
+                await self.manager.assign({})
+            await asyncio.sleep(self.heartbeat)
+
+    async def start(self):
+        await self.step()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Sai do cluster liberando os leases, para outro nó assumir na hora."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.owned = set()
+        await self.manager.assign({})
+        try:
+            await self._db(self._leave)
+        finally:
+            self._db_pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Nós conhecidos, vivos ou não, e quantas câmeras cada um tem."""
+        expired = dt.datetime.utcnow() - dt.timedelta(seconds=self.ttl)
+        db = self.session_factory()
+        try:
+            nodes = db.query(ClusterNode).order_by(ClusterNode.node_id).all()
+            cameras: Dict[str, List[int]] = {}
+            for node_id, cam_id in db.query(CameraLease.node_id, CameraLease.camera_id).order_by(CameraLease.camera_id):
+                cameras.setdefault(node_id, []).append(cam_id)
+        finally:
+            db.close()
+        return {
+            "node_id": self.node_id,
+            "leader": self.is_leader(),
+            "nodes": [
+                {
+                    "node_id": n.node_id,
+                    "host": n.host,
+                    "url": n.url,
+                    "weight": n.weight,
+                    "alive": n.heartbeat_at >= expired,
+                    "heartbeat_at": n.heartbeat_at,
+                    "started_at": n.started_at,
+                    "cameras": cameras.get(n.node_id, []),
+                }
+                for n in nodes
+            ],
+        }
+
+
+_coordinator: Optional[ClusterCoordinator] = None
+
+
+def get_cluster_coordinator(manager=None) -> Optional[ClusterCoordinator]:
+    """Coordenador do nó (None fora do modo com vários nós, SHARDING_ENABLED=1)."""
+    global _coordinator
+    if _coordinator is None and SHARDING_ENABLED and manager is not None:
+        _coordinator = ClusterCoordinator(
+            manager,
+            node_id=default_node_id(),
+            heartbeat=float(os.getenv("CLUSTER_HEARTBEAT_SEC", "3")),
+            ttl=float(os.getenv("CLUSTER_LEASE_TTL_SEC", "10")),
+            weight=float(os.getenv("NODE_WEIGHT", "1")),
+            url=os.getenv("NODE_URL") or None,
+        )
+    return _coordinator
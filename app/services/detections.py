@@ -0,0 +1,98 @@
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+
+def names_tuple(names) -> tuple:
+    """Normaliza `model.names` (dict id->nome ou lista) para uma tupla indexada por id."""
+    if isinstance(names, dict):
+        return tuple(names[i] for i in sorted(names))
+    return tuple(names)
+
+
+class Detections:
+    """
+    Detecções de um frame mantidas em arrays NumPy.
+
+    - `boxes`: float (N, 4) em xyxy
+    - `scores`: float (N,)
+    - `class_ids`: int32 (N,), índices em `names`
+
+    Evita montar DataFrame/dicts por frame; quem ainda precisa do formato
+    antigo ([{'class','confidence','bbox'}]) usa `to_dicts()`.
+    """
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, names: Sequence[str]):
+        self.boxes = boxes
+        self.scores = scores
+        self.class_ids = class_ids
+        self.names = tuple(names)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @property
+    def size(self) -> int:
+        return len(self.scores)
+
+    @classmethod
+    def empty(cls, names: Sequence[str] = ()) -> "Detections":
+        return cls(
+            np.zeros((0, 4), dtype=np.float32),
+            np.zeros((0,), dtype=np.float32),
+            np.zeros((0,), dtype=np.int32),
+            names,
+        )
+
+    @classmethod
+    def from_xyxy(cls, pred: np.ndarray, names: Sequence[str]) -> "Detections":
+        """Cria a partir da saída N x 6 do YOLO (x1, y1, x2, y2, conf, cls)."""
+        pred = np.asarray(pred).reshape(-1, 6)
+        return cls(
+            pred[:, :4].astype(np.float32, copy=False),
+            pred[:, 4].astype(np.float32, copy=False),
+            pred[:, 5].astype(np.int32),
+            names,
+        )
+
+    @classmethod
+    def from_dicts(cls, detections: List[Dict[str, Any]], names: Optional[Sequence[str]] = None) -> "Detections":
+        """Adaptador do formato antigo de lista de dicts."""
+        if names is None:
+            names = list(dict.fromkeys(d["class"] for d in detections))
+        index = {name: i for i, name in enumerate(names)}
+        if not detections:
+            return cls.empty(names)
+        return cls(
+            np.array([d["bbox"] for d in detections], dtype=np.float64).reshape(-1, 4),
+            np.array([d.get("confidence", 1.0) for d in detections], dtype=np.float64),
+            np.array([index[d["class"]] for d in detections], dtype=np.int32),
+            names,
+        )
+
+    def class_id(self, name: str) -> int:
+        try:
+            return self.names.index(name)
+        except ValueError:
+            return -1
+
+    def boxes_of(self, name: str) -> np.ndarray:
+        """Caixas de uma classe, na ordem original."""
+        return self.boxes[self.class_ids == self.class_id(name)]
+
+    def filter(self, threshold: float) -> "Detections":
+        """Mantém só as detecções com confiança >= threshold."""
+        keep = self.scores >= threshold
+        if keep.all():
+            return self
+        return Detections(self.boxes[keep], self.scores[keep], self.class_ids[keep], self.names)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "class": self.names[int(c)],
+                "confidence": float(s),
+                "bbox": [float(v) for v in box],
+            }
+            for box, s, c in zip(self.boxes, self.scores, self.class_ids)
+        ]
@@ -0,0 +1,71 @@
+import os
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import cv2
+
+from app.services.detections import Detections
+from app.services.preprocess import INPUT_SIZE
+
+# Backends de detecção disponíveis:
+#   torch - modelo .pt carregado via torch.hub (ultralytics/yolov5)
+#   onnx  - modelo .onnx exportado por `python -m app.services.export_onnx`,
+#           servido pelo ONNX Runtime (CPU)
+DETECTOR_BACKENDS = ("torch", "onnx")
+
+
+class BaseDetector:
+    """
+    Contrato comum dos detectores.
+
+    Subclasses implementam `detect_batch(images, conf_threshold)`, que recebe
+    imagens BGR ou `PreparedFrame` e devolve um `Detections` por imagem, com
+    as caixas na resolução original. `names` é a tupla de classes do modelo.
+    """
+
+    backend = ""
+
+    def __init__(self, model_path: str, conf_threshold: float = 0.4, input_size: int = INPUT_SIZE):
+        self.model_path = Path(model_path)
+        self.conf_threshold = conf_threshold
+        self.input_size = input_size
+        self.names: tuple = ()
+        if not self.model_path.exists():
+            raise FileNotFoundError(f"Modelo YOLO não encontrado: {self.model_path}")
+
+    def detect_batch(self, images, conf_threshold: Optional[float] = None) -> List[Detections]:
+        raise NotImplementedError
+
+    def detect(self, bgr_image, conf_threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Recebe imagem BGR (OpenCV) e retorna lista de detecções."""
+        return self.detect_batch([bgr_image], conf_threshold)[0].to_dicts()
+
+    def detect_from_path(self, image_path: str) -> List[Dict[str, Any]]:
+        """Recebe caminho de imagem e retorna detecções."""
+        if not os.path.exists(image_path):
+            return []
+        bgr_image = cv2.imread(image_path)
+        return self.detect(bgr_image)
+
+
+def detector_backend_for(model_path: str, backend: Optional[str] = None) -> str:
+    """Backend a usar para um modelo: explícito, DETECTOR_BACKEND ou pela extensão."""
+    backend = (backend or os.getenv("DETECTOR_BACKEND", "auto")).lower()
+    if backend == "auto":
+        return "onnx" if str(model_path).lower().endswith(".onnx") else "torch"
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Backend de detecção inválido: {backend} (use auto, {', '.join(DETECTOR_BACKENDS)})")
+    return backend
+
+
+def create_detector(model_path: str, backend: Optional[str] = None, **kwargs) -> BaseDetector:
+    """Carrega o detector adequado ao arquivo do modelo."""
+    if detector_backend_for(model_path, backend) == "onnx":
+        from app.services.onnx_detector import OnnxDetector
+        # DETECTOR_BACKEND=onnx com MODEL_PATH .pt usa o .onnx exportado ao lado
+        onnx_path = Path(model_path)
+        if onnx_path.suffix.lower() != ".onnx":
+            onnx_path = onnx_path.with_suffix(".onnx")
+        return OnnxDetector(str(onnx_path), **kwargs)
+    from app.services.yolo import YoloDetector
+    return YoloDetector(model_path, **kwargs)
@@ -0,0 +1,133 @@
+import os
+import json
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.services import metrics
+
+# Código de fechamento para cliente lento: "tente novamente mais tarde"
+CLOSE_SLOW_CONSUMER = 1013
+
+
+class Subscriber:
+    def __init__(self, cameras: Optional[Set[int]], buffer: int):
+        self.cameras = cameras
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer + 1)  # +1 para o aviso de descarte
+        self.buffer = buffer
+        self.dropped = False
+
+    def wants(self, camera_id: int) -> bool:
+        return self.cameras is None or camera_id in self.cameras
+
+    def offer(self, text: str) -> bool:
+        """Enfileira sem bloquear; False se o cliente estourou o buffer."""
+        if self.dropped:
+            return False
+        if self.queue.qsize() >= self.buffer:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)  # sinaliza ao remetente para fechar
+            return False
+        self.queue.put_nowait(text)
+        return True
+
+
+class EventHub:
+    """
+    Pub/sub em memória para o feed ao vivo (/ws/events).
+
+    `EventSink` publica cada evento depois do commit. A mensagem é serializada
+    uma única vez e entregue a todos os assinantes, sem consultar o banco.
+    Cada cliente tem um buffer de `client_buffer` mensagens; quem não consome
+    a tempo é desconectado (código 1013) em vez de atrasar os demais. Os
+    últimos `history` eventos ficam num buffer circular para que um cliente
+    reconectado retome a partir do `last_event_id` que viu.
+    """
+
+    def __init__(self, client_buffer: int = 100, history: int = 1000):
+        self.client_buffer = max(1, client_buffer)
+        self._history: Deque[Tuple[int, int, str]] = deque(maxlen=max(1, history))
+        self._subscribers: Set[Subscriber] = set()
+
+    def subscribe(self, cameras: Optional[Iterable[int]] = None, last_event_id: Optional[int] = None) -> Subscriber:
+        sub = Subscriber(set(cameras) if cameras else None, self.client_buffer)
+        if last_event_id is not None:
+            backlog = [text for event_id, camera_id, text in self._history if event_id > last_event_id and sub.wants(camera_id)]
+            lost = bool(self._history) and self._history[0][0] > last_event_id + 1
+            if lost or len(backlog) >= self.client_buffer:
+                # Parte do intervalo não cabe: o cliente deve recarregar a lista
+                backlog = backlog[len(backlog) - (self.client_buffer - 1):]
+                sub.offer(json.dumps({"kind": "gap", "last_event_id": last_event_id}))
+            for text in backlog:
+                sub.offer(text)
+        self._subscribers.add(sub)
+        metrics.record_ws_clients(len(self._subscribers))
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+        metrics.record_ws_clients(len(self._subscribers))
+
+    def publish(self, event_id: int, camera_id: int, data: Dict[str, Any]):
+        text = json.dumps({"kind": "event", "data": data}, ensure_ascii=False, default=str)
+        self._history.append((event_id, camera_id, text))
+        for sub in list(self._subscribers):
+            if sub.wants(camera_id) and not sub.offer(text):
+                self._subscribers.discard(sub)
+                metrics.record_ws_client_dropped()
+        metrics.record_ws_clients(len(self._subscribers))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._subscribers),
+            "history": len(self._history),
+            "last_event_id": self._history[-1][0] if self._history else None,
+        }
+
+
+async def _send_loop(ws: WebSocket, sub: Subscriber):
+    while True:
+        text = await sub.queue.get()
+        if text is None:
+            await ws.close(code=CLOSE_SLOW_CONSUMER)
+            return
+        await ws.send_text(text)
+
+
+async def serve_websocket(ws: WebSocket, hub: EventHub, cameras: Optional[Set[int]] = None, last_event_id: Optional[int] = None):
+    """Atende um cliente do feed até ele desconectar ou ser descartado por lentidão."""
+    await ws.accept()
+    sub = hub.subscribe(cameras, last_event_id)
+    sender = asyncio.create_task(_send_loop(ws, sub))
+    receiver = asyncio.create_task(ws.receive_text())
+    try:
+        while True:
+            done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                break
+            receiver.result()  # mensagens do cliente são ignoradas (keepalive)
+            receiver = asyncio.create_task(ws.receive_text())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        for task in (sender, receiver):
+            task.cancel()
+        hub.unsubscribe(sub)
+
+
+_hub: Optional[EventHub] = None
+
+
+def get_event_hub() -> EventHub:
+    """Hub compartilhado do processo (WS_CLIENT_BUFFER, WS_HISTORY)."""
+    global _hub
+    if _hub is None:
+        _hub = EventHub(
+            client_buffer=int(os.getenv("WS_CLIENT_BUFFER", "100")),
+            history=int(os.getenv("WS_HISTORY", "1000")),
+        )
+    return _hub
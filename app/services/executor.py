@@ -0,0 +1,220 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from app.services.detections import Detections
+from app.services.model_registry import get_model_registry
+
+# Backends de execução para decodificação e detecção:
+#   inline  - roda no próprio event loop (debug / máquinas muito pequenas)
+#   thread  - decodificação em pool de threads, inferência numa thread dedicada
+#   process - inferência em processos separados, um modelo por processo,
+#             frames trafegam por memória compartilhada em vez de pickle
+BACKEND_MODES = ("inline", "thread", "process")
+
+
+def decode_jpeg(jpg: bytes):
+    """Decodifica bytes JPEG em imagem BGR (OpenCV). Retorna None se inválido."""
+    if not jpg:
+        return None
+    return cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+class InlineBackend:
+    """Executa decodificação e detecção diretamente na coroutine chamadora."""
+
+    mode = "inline"
+    max_concurrency = 1
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+
+    def _get_detector(self, model_path: Optional[str] = None):
+        return get_model_registry().get(model_path or self.model_path)
+
+    def _detect_sync(self, images, conf: float, model_path: Optional[str] = None) -> List[Detections]:
+        return self._get_detector(model_path).detect_batch(images, conf)
+
+    async def decode(self, jpg: bytes):
+        return decode_jpeg(jpg)
+
+    async def call(self, fn, *args):
+        """Executa uma função leve de pré-processamento (ex.: filtro de mudança)."""
+        return fn(*args)
+
+    async def detect_batch(self, images, conf: float, model_path: Optional[str] = None) -> List[Detections]:
+        return self._detect_sync(images, conf, model_path)
+
+    def close(self):
+        pass
+
+
+class ThreadBackend(InlineBackend):
+    """
+    Decodifica num pool de threads (cv2.imdecode libera o GIL) e roda a
+    inferência numa thread dedicada, pois o modelo não é thread-safe.
+    """
+
+    mode = "thread"
+
+    def __init__(self, model_path: str, workers: int = 4):
+        super().__init__(model_path)
+        self._decode_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ppe-decode")
+        self._infer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ppe-infer")
+
+    async def decode(self, jpg: bytes):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._decode_pool, decode_jpeg, jpg)
+
+    async def call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._decode_pool, fn, *args)
+
+    async def detect_batch(self, images, conf: float, model_path: Optional[str] = None) -> List[Detections]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._infer_pool, self._detect_sync, images, conf, model_path)
+
+    def close(self):
+        self._decode_pool.shutdown(wait=False, cancel_futures=True)
+        self._infer_pool.shutdown(wait=False, cancel_futures=True)
+        super().close()
+
+
+# ------------------------
+# Pool de processos
+# ------------------------
+def _proc_detector(model_path: str):
+    # Cada processo do pool tem o seu registro (LRU/mtime, sem contagem de câmeras)
+    return get_model_registry().get(model_path)
+
+
+def _init_process(model_path: str, torch_threads: int):
+    """Inicializador de cada processo do pool: carrega o modelo padrão uma única vez."""
+    try:
+        import torch
+        torch.set_num_threads(max(1, torch_threads))
+    except ImportError:  # implantação só com ONNX Runtime
+        pass
+    os.environ.setdefault("ONNX_INTRA_OP_THREADS", str(max(1, torch_threads)))
+    _proc_detector(model_path)
+
+
+def _detect_shared(model_path: str, shm_name: str, layout: List[tuple], conf: float) -> tuple:
+    """
+    Roda detecção sobre frames lidos de um bloco de memória compartilhada.
+    Retorna também o PID e as estatísticas do registro deste processo, para o
+    processo pai expor carga e memória dos modelos em /metrics/models.
+    """
+    from app.services.preprocess import PreparedFrame
+
+    shm = SharedMemory(name=shm_name)
+    # O processo pai é o dono do bloco; evita que o resource_tracker o remova aqui
+    resource_tracker.unregister(shm._name, "shared_memory")
+    view = None
+    try:
+        images = []
+        for offset, shape, meta in layout:
+            view = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+            images.append(PreparedFrame(view, *meta) if meta is not None else view)
+        result = _proc_detector(model_path).detect_batch(images, conf)
+        del images, view
+        return result, os.getpid(), get_model_registry().stats()
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # Alguma view ainda viva (ex.: cache do modelo); o GC libera depois
+            pass
+
+
+def _pack_shared(images) -> tuple:
+    """Copia os frames para um único bloco de memória compartilhada."""
+    arrays = []
+    layout = []
+    offset = 0
+    for img in images:
+        meta = img.meta() if hasattr(img, "meta") else None
+        arr = img.image if meta is not None else img
+        arrays.append(arr)
+        layout.append((offset, arr.shape, meta))
+        offset += arr.nbytes
+    shm = SharedMemory(create=True, size=max(1, offset))
+    try:
+        for arr, (off, shape, _) in zip(arrays, layout):
+            np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=off)[...] = arr
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    return shm, layout
+
+
+class ProcessBackend:
+    """
+    Inferência em `workers` processos, cada um com o seu modelo carregado
+    no inicializador. Os frames de um batch são copiados uma vez para memória
+    compartilhada e o processo filho lê diretamente dali. A decodificação fica
+    num pool de threads do processo principal.
+
+    Os modelos vivem nos processos filhos: cada resposta traz as estatísticas
+    do registro do filho, que o registro do processo pai agrega em `stats()`.
+    """
+
+    mode = "process"
+
+    def __init__(self, model_path: str, workers: int = 2, decode_workers: int = 4):
+        self.model_path = model_path
+        self.max_concurrency = max(1, workers)
+        torch_threads = max(1, (os.cpu_count() or 1) // self.max_concurrency)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_concurrency,
+            mp_context=get_context("spawn"),
+            initializer=_init_process,
+            initargs=(model_path, torch_threads),
+        )
+        self._decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="ppe-decode")
+
+    async def decode(self, jpg: bytes):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._decode_pool, decode_jpeg, jpg)
+
+    async def call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._decode_pool, fn, *args)
+
+    async def detect_batch(self, images, conf: float, model_path: Optional[str] = None) -> List[Detections]:
+        loop = asyncio.get_running_loop()
+        shm, layout = _pack_shared(images)
+        try:
+            result, pid, stats = await loop.run_in_executor(
+                self._pool, _detect_shared, model_path or self.model_path, shm.name, layout, conf
+            )
+        finally:
+            shm.close()
+            shm.unlink()
+        get_model_registry().record_worker_stats(pid, stats)
+        return result
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._decode_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_backend(mode: Optional[str] = None, model_path: Optional[str] = None, workers: Optional[int] = None):
+    """Cria o backend de execução configurado (INFER_BACKEND / INFER_WORKERS)."""
+    mode = (mode or os.getenv("INFER_BACKEND", "thread")).lower()
+    model_path = model_path or os.getenv("MODEL_PATH", "./model/ppe.pt")
+    workers = workers or int(os.getenv("INFER_WORKERS", "0")) or (os.cpu_count() or 1)
+    if mode == "inline":
+        return InlineBackend(model_path)
+    if mode == "thread":
+        return ThreadBackend(model_path, workers=workers)
+    if mode == "process":
+        return ProcessBackend(model_path, workers=workers)
+    raise ValueError(f"Backend de inferência inválido: {mode} (use {', '.join(BACKEND_MODES)})")
@@ -0,0 +1,140 @@
+import io
+import csv
+import json
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.models import SessionLocal, Event, Camera
+
+COLUMNS = ["id", "camera", "created_at", "ppe_status", "image_path"]
+CSV_HEADER = ["ID", "Câmera", "Data/Hora", "Status EPI", "Caminho Imagem"]
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+Row = Tuple[int, Optional[str], Optional[str], Optional[str], Optional[str]]
+
+
+def iter_event_rows(filters, chunk_size: int = 2000, session_factory=SessionLocal) -> Iterator[List[Row]]:
+    """
+    Lê os eventos do filtro em blocos de `chunk_size` (yield_per, cursor do
+    lado do servidor), com o nome da câmera vindo do mesmo SELECT. Abre a
+    própria sessão, pois o gerador roda depois que a rota já retornou.
+    """
+    stmt = (
+        select(Event.id, Camera.name, Event.created_at, Event.ppe_status, Event.image_path)
+        .outerjoin(Camera, Camera.id == Event.camera_id)
+        .order_by(Event.created_at.desc(), Event.id.desc())
+        .execution_options(yield_per=chunk_size)
+    )
+    if filters.camera_id:
+        stmt = stmt.where(Event.camera_id == filters.camera_id)
+    if filters.start_date:
+        stmt = stmt.where(Event.created_at >= filters.start_date)
+    if filters.end_date:
+        stmt = stmt.where(Event.created_at <= filters.end_date)
+
+    db = session_factory()
+    try:
+        for part in db.execute(stmt).partitions():
+            yield [
+                (eid, name or "", created.isoformat() if created else None, status, path)
+                for eid, name, created, status, path in part
+            ]
+    finally:
+        db.close()
+
+
+def stream_csv(chunks: Iterable[List[Row]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_HEADER)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def stream_ndjson(chunks: Iterable[List[Row]]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows
+        ).encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Destino do ParquetWriter que entrega os bytes escritos a cada row group."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def take(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def stream_parquet(chunks: Iterable[List[Row]]) -> Iterator[bytes]:
+    """Um row group por bloco lido; requer pyarrow (opcional)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("camera", pa.string()),
+        ("created_at", pa.string()),
+        ("ppe_status", pa.string()),
+        ("image_path", pa.string()),
+    ])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in chunks:
+            columns = list(zip(*rows)) if rows else [[] for _ in COLUMNS]
+            writer.write_table(pa.Table.from_arrays([pa.array(c, t) for c, t in zip(columns, schema.types)], schema=schema))
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def gzip_stream(parts: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = cabeçalho gzip
+    for part in parts:
+        data = comp.compress(part)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+STREAMERS = {"csv": stream_csv, "ndjson": stream_ndjson, "parquet": stream_parquet}
+
+
+def export_events(filters, fmt: str = "csv", gzip: bool = False, chunk_size: int = 2000) -> Iterator[bytes]:
+    """Gera o arquivo exportado em pedaços, com memória constante."""
+    parts = STREAMERS[fmt](iter_event_rows(filters, chunk_size))
+    return gzip_stream(parts) if gzip else parts
@@ -0,0 +1,87 @@
+"""
+Exporta o modelo PyTorch (MODEL_PATH) para ONNX, com quantização INT8 opcional.
+
+Uso:
+    python -m app.services.export_onnx --model ./model/ppe.pt
+    python -m app.services.export_onnx --model ./model/ppe.pt --int8
+
+Gera `ppe.onnx` (e `ppe.int8.onnx` com --int8) ao lado do `.pt`. Depois basta
+apontar MODEL_PATH ou `Camera.ai_model_path` para o arquivo `.onnx`, ou usar
+DETECTOR_BACKEND=onnx para que o `.onnx` ao lado do MODEL_PATH seja usado.
+Requer torch, onnx e onnxruntime apenas na máquina que faz a exportação.
+"""
+import os
+import argparse
+from pathlib import Path
+from typing import Optional
+
+
+def export_onnx(model_path: str, output: Optional[str] = None, imgsz: int = 640, opset: int = 12) -> Path:
+    """Converte o `.pt` em ONNX com lote dinâmico e grava os nomes das classes nos metadados."""
+    import torch
+    import onnx
+
+    model_path = Path(model_path)
+    output = Path(output) if output else model_path.with_suffix(".onnx")
+
+    hub_model = torch.hub.load("ultralytics/yolov5", "custom", path=str(model_path), autoshape=False, force_reload=False)
+    model = getattr(hub_model, "model", hub_model).float().eval()
+    names = model.names if isinstance(model.names, dict) else dict(enumerate(model.names))
+    stride = int(max(model.stride)) if hasattr(model, "stride") else 32
+
+    # A camada Detect devolve só o tensor concatenado em modo export
+    for m in model.modules():
+        if hasattr(m, "export"):
+            m.export = True
+        if hasattr(m, "inplace"):
+            m.inplace = False
+
+    dummy = torch.zeros(1, 3, imgsz, imgsz)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            dummy,
+            str(output),
+            opset_version=opset,
+            input_names=["images"],
+            output_names=["output0"],
+            dynamic_axes={"images": {0: "batch"}, "output0": {0: "batch"}},
+            do_constant_folding=True,
+        )
+
+    model_onnx = onnx.load(str(output))
+    onnx.checker.check_model(model_onnx)
+    for key, value in {"names": names, "stride": stride, "imgsz": imgsz}.items():
+        meta = model_onnx.metadata_props.add()
+        meta.key, meta.value = key, str(value)
+    onnx.save(model_onnx, str(output))
+    return output
+
+
+def quantize_int8(onnx_path: str, output: Optional[str] = None) -> Path:
+    """Quantização dinâmica INT8 dos pesos (ONNX Runtime)."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    onnx_path = Path(onnx_path)
+    output = Path(output) if output else onnx_path.with_name(f"{onnx_path.stem}.int8.onnx")
+    quantize_dynamic(str(onnx_path), str(output), weight_type=QuantType.QUInt8)
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta o modelo YOLO de EPI para ONNX")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "./model/ppe.pt"), help="Arquivo .pt de origem")
+    parser.add_argument("--output", default=None, help="Arquivo .onnx de destino (padrão: ao lado do .pt)")
+    parser.add_argument("--imgsz", type=int, default=int(os.getenv("INFER_INPUT_SIZE", "640")))
+    parser.add_argument("--opset", type=int, default=12)
+    parser.add_argument("--int8", action="store_true", help="Gera também a versão quantizada INT8")
+    args = parser.parse_args(argv)
+
+    out = export_onnx(args.model, args.output, imgsz=args.imgsz, opset=args.opset)
+    print(f"Modelo exportado: {out}")
+    if args.int8:
+        print(f"Modelo INT8: {quantize_int8(out)}")
+
+
+if __name__ == "__main__":
+    main()
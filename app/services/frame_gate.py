@@ -0,0 +1,69 @@
+import hashlib
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class FrameGate:
+    """
+    Filtro barato antes da inferência: compara o snapshot novo com o último
+    frame que foi efetivamente inferido para a câmera.
+
+    1. Bytes JPEG idênticos (hash SHA-1) -> sem mudança.
+    2. Caso contrário, decodifica em escala de cinza reduzida (1/8 no domínio
+       DCT), reduz para `size` e mede a fração de pixels cuja diferença
+       absoluta passa de `pixel_delta`. Abaixo de `sensitivity` -> sem mudança.
+
+    `sensitivity` <= 0 desativa o filtro. Depois de `max_skipped` frames
+    pulados seguidos a inferência é forçada, para não ficar preso a uma
+    referência antiga.
+    """
+
+    def __init__(self, sensitivity: float = 0.02, pixel_delta: int = 12, size=(64, 48), max_skipped: int = 30):
+        self.sensitivity = sensitivity
+        self.pixel_delta = pixel_delta
+        self.size = size
+        self.max_skipped = max_skipped
+        self._ref_hash: Optional[bytes] = None
+        self._ref_small: Optional[np.ndarray] = None
+        self._skipped = 0
+
+    def _small_gray(self, jpg: bytes) -> Optional[np.ndarray]:
+        img = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if img is None:
+            return None
+        small = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def reset(self):
+        self._ref_hash = None
+        self._ref_small = None
+        self._skipped = 0
+
+    def check(self, jpg: bytes) -> bool:
+        """Retorna True se o frame mudou o suficiente para rodar a inferência."""
+        if self.sensitivity <= 0 or self._skipped >= self.max_skipped:
+            return self._accept(jpg, None)
+
+        digest = hashlib.sha1(jpg).digest()
+        if digest == self._ref_hash:
+            self._skipped += 1
+            return False
+
+        small = self._small_gray(jpg)
+        if small is None or self._ref_small is None:
+            return self._accept(jpg, small, digest)
+
+        diff = cv2.absdiff(small, self._ref_small)
+        changed = np.count_nonzero(diff > self.pixel_delta) / diff.size
+        if changed < self.sensitivity:
+            self._skipped += 1
+            return False
+        return self._accept(jpg, small, digest)
+
+    def _accept(self, jpg: bytes, small: Optional[np.ndarray], digest: Optional[bytes] = None) -> bool:
+        self._ref_hash = digest or hashlib.sha1(jpg).digest()
+        self._ref_small = small if small is not None else self._small_gray(jpg)
+        self._skipped = 0
+        return True
@@ -0,0 +1,153 @@
+import os
+import asyncio
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app.services import metrics
+
+
+class NvrClientPool:
+    """
+    Pool de clientes HTTP persistentes para os NVRs, indexado por `nvr_base_url`.
+
+    Várias câmeras costumam ser canais do mesmo NVR; todas compartilham um
+    único `httpx.AsyncClient` com conexões keep-alive, limitado a
+    `max_connections` conexões simultâneas para não sobrecarregar o gravador.
+    O objeto de autenticação é reaproveitado por (NVR, usuário, senha). O
+    padrão é basic, como antes do pool; `auth_scheme="digest"`
+    (NVR_AUTH_SCHEME=digest) atende NVRs que exigem digest, e o desafio fica em
+    cache, evitando o round trip 401 -> desafio a cada snapshot.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 4,
+        timeout: float = 5.0,
+        keepalive_expiry: float = 30.0,
+        auth_scheme: str = "basic",
+    ):
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.auth_scheme = auth_scheme
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._auths: Dict[Tuple[str, str, str], httpx.Auth] = {}
+        self._lock = asyncio.Lock()
+        # Requisições em andamento por cliente, para fechar sem cortá-las
+        self._inflight: Dict[httpx.AsyncClient, int] = {}
+        self._drained: Dict[httpx.AsyncClient, asyncio.Event] = {}
+
+    @staticmethod
+    def _key(base_url: str) -> str:
+        return base_url.rstrip("/")
+
+    async def get_client(self, base_url: str) -> httpx.AsyncClient:
+        """Retorna o cliente do NVR, criando-o na primeira requisição."""
+        key = self._key(base_url)
+        client = self._clients.get(key)
+        if client is not None and not client.is_closed:
+            metrics.record_nvr_pool_hit(key)
+            return client
+        async with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    verify=False,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                )
+                self._clients[key] = client
+                metrics.record_nvr_pool_miss(key)
+            else:
+                metrics.record_nvr_pool_hit(key)
+        return client
+
+    def get_auth(self, base_url: str, username: str, password: str) -> httpx.Auth:
+        """Autenticação em cache; o DigestAuth guarda o último desafio recebido."""
+        key = (self._key(base_url), username or "", password or "")
+        auth = self._auths.get(key)
+        if auth is None:
+            if self.auth_scheme == "digest":
+                auth = httpx.DigestAuth(key[1], key[2])
+            else:
+                auth = httpx.BasicAuth(key[1], key[2])
+            self._auths[key] = auth
+        return auth
+
+    async def fetch_picture(
+        self,
+        base_url: str,
+        channel_no: int,
+        username: str,
+        password: str,
+        timeout: Optional[float] = None,
+    ) -> Optional[bytes]:
+        """Obtém imagem estática via ISAPI usando a conexão persistente do NVR."""
+        key = self._key(base_url)
+        url = f"{key}/ISAPI/Streaming/channels/{channel_no}/picture"
+        client = await self.get_client(key)
+        self._inflight[client] = self._inflight.get(client, 0) + 1
+        try:
+            r = await client.get(
+                url,
+                auth=self.get_auth(key, username, password),
+                timeout=timeout if timeout is not None else self.timeout,
+            )
+        finally:
+            self._done(client)
+        if r.status_code == 200 and r.content:
+            return r.content
+        return None
+
+    def _done(self, client: httpx.AsyncClient):
+        count = self._inflight.get(client, 0) - 1
+        if count > 0:
+            self._inflight[client] = count
+            return
+        self._inflight.pop(client, None)
+        drained = self._drained.pop(client, None)
+        if drained is not None:
+            drained.set()
+
+    async def close_nvr(self, base_url: str):
+        """
+        Recicla a conexão de um NVR (troca de URL ou credenciais): as próximas
+        requisições já usam um cliente novo e o antigo só é fechado quando as
+        requisições em andamento terminam (no máximo `timeout` segundos).
+        """
+        key = self._key(base_url)
+        client = self._clients.pop(key, None)
+        for auth_key in [k for k in self._auths if k[0] == key]:
+            del self._auths[auth_key]
+        if client is None:
+            return
+        if self._inflight.get(client):
+            drained = self._drained.setdefault(client, asyncio.Event())
+            try:
+                await asyncio.wait_for(drained.wait(), self.timeout + 1.0)
+            except asyncio.TimeoutError:
+                pass
+        await client.aclose()
+
+    async def aclose(self):
+        """Fecha todos os clientes."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._auths.clear()
+        for client in clients:
+            await client.aclose()
+
+
+def create_nvr_pool() -> NvrClientPool:
+    """Cria o pool com a configuração do ambiente (NVR_MAX_CONNECTIONS etc.)."""
+    return NvrClientPool(
+        max_connections=int(os.getenv("NVR_MAX_CONNECTIONS", "4")),
+        timeout=float(os.getenv("NVR_TIMEOUT_SEC", "5")),
+        keepalive_expiry=float(os.getenv("NVR_KEEPALIVE_SEC", "30")),
+        auth_scheme=os.getenv("NVR_AUTH_SCHEME", "basic").lower(),
+    )
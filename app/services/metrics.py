@@ -1,5 +1,12 @@
+import time
+import threading
+from typing import Dict, Any, Optional
+
 from prometheus_client import Counter, Gauge, Histogram
 
+PIPELINE_STAGES = ("fetch", "gate", "decode", "infer", "rules", "persist")
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
 # Métricas principais
 fps_gauge = Gauge("camera_fps", "Frames por segundo por câmera", ["camera_id"])
 latency_hist = Histogram(
@@ -8,6 +15,7 @@ latency_hist = Histogram(
     ["camera_id"]
 )
 queue_gauge = Gauge("event_queue_size", "Tamanho da fila de eventos", ["camera_id"])
+events_dropped_counter = Counter("events_dropped_total", "Eventos descartados por fila de persistência cheia", ["camera_id"])
 rtsp_error_counter = Counter("rtsp_errors_total", "Total de erros RTSP por câmera", ["camera_id"])
 reconnect_success_counter = Counter("camera_reconnect_success_total", "Reconexões bem-sucedidas", ["camera_id"])
 reconnect_fail_counter = Counter("camera_reconnect_fail_total", "Reconexões mal-sucedidas", ["camera_id"])
@@ -16,6 +24,43 @@ ram_usage_gauge = Gauge("system_ram_usage_percent", "Uso de RAM em %")
 events_per_min_gauge = Gauge("events_per_minute", "Eventos por minuto", ["camera_id"])
 dedupe_hits_counter = Counter("event_dedupe_hits_total", "Eventos descartados por deduplicação", ["camera_id"])
 debounce_hits_counter = Counter("event_debounce_hits_total", "Eventos descartados por debounce", ["camera_id"])
+nvr_pool_hits_counter = Counter("nvr_pool_hits_total", "Requisições que reutilizaram o cliente HTTP do NVR", ["nvr"])
+nvr_pool_misses_counter = Counter("nvr_pool_misses_total", "Requisições que criaram um novo cliente HTTP para o NVR", ["nvr"])
+frames_skipped_counter = Counter("frames_skipped_total", "Frames sem mudança que não passaram pela inferência", ["camera_id"])
+frames_inferred_counter = Counter("frames_inferred_total", "Frames enviados à inferência", ["camera_id"])
+model_load_gauge = Gauge("model_load_seconds", "Tempo da última carga do modelo em segundos", ["model"])
+model_memory_gauge = Gauge("model_memory_bytes", "Memória residente estimada por modelo", ["model"])
+model_refs_gauge = Gauge("model_refcount", "Câmeras usando cada modelo", ["model"])
+ws_clients_gauge = Gauge("ws_event_clients", "Clientes conectados ao feed /ws/events")
+ws_dropped_counter = Counter("ws_event_clients_dropped_total", "Clientes do feed desconectados por lentidão")
+stage_hist = Histogram(
+    "pipeline_stage_seconds",
+    "Duração de cada etapa do pipeline (fetch, gate, decode, infer, rules, persist) em segundos",
+    ["stage"],
+    buckets=_STAGE_BUCKETS,
+)
+queue_wait_hist = Histogram(
+    "queue_wait_seconds",
+    "Tempo de espera em fila (inference: até entrar num batch; events: até ser gravado)",
+    ["queue"],
+    buckets=_STAGE_BUCKETS,
+)
+batch_size_hist = Histogram("inference_batch_size", "Frames por batch de inferência", buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+frames_dropped_counter = Counter("frames_dropped_total", "Frames descartados por motivo", ["camera_id", "reason"])
+retention_events_counter = Counter("retention_deleted_events_total", "Eventos removidos pela retenção")
+retention_files_counter = Counter("retention_deleted_files_total", "Arquivos (imagens e miniaturas) removidos pela retenção")
+retention_run_hist = Histogram("retention_run_seconds", "Duração de cada execução da retenção em segundos")
+retention_errors_counter = Counter("retention_errors_total", "Execuções da retenção que falharam")
+retention_pending_gauge = Gauge("retention_sweep_pending", "1 se a última execução da retenção parou no limite de tempo")
+worker_restarts_counter = Counter("worker_restarts_total", "Reinícios de worker pelo supervisor", ["camera_id", "reason"])
+watchdog_errors_counter = Counter("watchdog_errors_total", "Falhas na verificação do watchdog dos workers")
+worker_heartbeat_gauge = Gauge("worker_heartbeat_age_seconds", "Segundos desde o último heartbeat do worker", ["camera_id"])
+camera_config_counter = Counter("camera_config_changes_total", "Alterações de câmera aplicadas a workers em execução", ["kind"])
+cluster_nodes_gauge = Gauge("cluster_live_nodes", "Nós vivos no cluster, vistos por este nó", ["node"])
+cluster_cameras_gauge = Gauge("cluster_owned_cameras", "Câmeras com lease deste nó", ["node"])
+lease_acquired_counter = Counter("cluster_leases_acquired_total", "Leases de câmera assumidos por este nó", ["node"])
+reanalysis_images_counter = Counter("reanalysis_images_total", "Imagens reprocessadas por jobs de reanálise", ["result"])
+reanalysis_rate_gauge = Gauge("reanalysis_images_per_second", "Vazão do job de reanálise em andamento")
 
 
 def record_fps(camera_id: str, fps: float):
@@ -30,6 +75,10 @@ def record_queue_size(camera_id: str, size: int):
     queue_gauge.labels(camera_id=camera_id).set(size)
 
 
+def record_event_dropped(camera_id: str):
+    events_dropped_counter.labels(camera_id=camera_id).inc()
+
+
 def record_rtsp_error(camera_id: str):
     rtsp_error_counter.labels(camera_id=camera_id).inc()
 
@@ -60,3 +109,282 @@ def record_dedupe_hit(camera_id: str):
 
 def record_debounce_hit(camera_id: str):
     debounce_hits_counter.labels(camera_id=camera_id).inc()
+
+
+def record_nvr_pool_hit(nvr: str):
+    nvr_pool_hits_counter.labels(nvr=nvr).inc()
+
+
+def record_nvr_pool_miss(nvr: str):
+    nvr_pool_misses_counter.labels(nvr=nvr).inc()
+
+
+def record_frame_skipped(camera_id: str):
+    frames_skipped_counter.labels(camera_id=camera_id).inc()
+
+
+def record_frame_inferred(camera_id: str):
+    frames_inferred_counter.labels(camera_id=camera_id).inc()
+
+
+def record_model_loaded(model: str, seconds: float, memory_bytes: int):
+    model_load_gauge.labels(model=model).set(seconds)
+    model_memory_gauge.labels(model=model).set(memory_bytes)
+
+
+def record_model_refs(model: str, refs: int):
+    model_refs_gauge.labels(model=model).set(refs)
+
+
+def record_model_evicted(model: str):
+    for gauge in (model_load_gauge, model_memory_gauge):
+        try:
+            gauge.remove(model)
+        except KeyError:
+            pass
+
+
+def record_retention_deleted(events: int, files: int):
+    retention_events_counter.inc(events)
+    retention_files_counter.inc(files)
+
+
+def record_retention_run(seconds: float, finished: bool):
+    retention_run_hist.observe(seconds)
+    retention_pending_gauge.set(0 if finished else 1)
+
+
+def record_retention_error():
+    retention_errors_counter.inc()
+
+
+def record_worker_restart(camera_id: str, reason: str):
+    worker_restarts_counter.labels(camera_id=camera_id, reason=reason).inc()
+
+
+def record_watchdog_error():
+    watchdog_errors_counter.inc()
+
+
+def record_worker_heartbeat(camera_id: str, age: float):
+    worker_heartbeat_gauge.labels(camera_id=camera_id).set(age)
+
+
+def remove_worker(camera_id: str):
+    try:
+        worker_heartbeat_gauge.remove(camera_id)
+    except KeyError:
+        pass
+
+
+def record_camera_config_change(kind: str):
+    camera_config_counter.labels(kind=kind).inc()
+
+
+def record_cluster_state(node: str, live_nodes: int, owned: int):
+    cluster_nodes_gauge.labels(node=node).set(live_nodes)
+    cluster_cameras_gauge.labels(node=node).set(owned)
+
+
+def record_lease_acquired(node: str):
+    lease_acquired_counter.labels(node=node).inc()
+
+
+def record_reanalysis_chunk(ok: int, failed: int, changed: int, rate: float):
+    reanalysis_images_counter.labels(result="ok").inc(ok)
+    reanalysis_images_counter.labels(result="failed").inc(failed)
+    reanalysis_images_counter.labels(result="changed").inc(changed)
+    reanalysis_rate_gauge.set(rate)
+
+
+def record_ws_clients(count: int):
+    ws_clients_gauge.set(count)
+
+
+def record_ws_client_dropped():
+    ws_dropped_counter.inc()
+
+
+def record_stage(stage: str, seconds: float):
+    stage_hist.labels(stage=stage).observe(seconds)
+
+
+def record_queue_wait(queue: str, seconds: float):
+    queue_wait_hist.labels(queue=queue).observe(seconds)
+
+
+def record_batch_size(size: int):
+    batch_size_hist.observe(size)
+
+
+def record_frame_dropped(camera_id: str, reason: str):
+    frames_dropped_counter.labels(camera_id=camera_id, reason=reason).inc()
+
+
+class FrameTrace:
+    """
+    Tempos de um frame pelo pipeline. `mark(stage)` fecha a etapa corrente
+    (tempo desde a marca anterior); `finish()` publica as etapas no
+    `pipeline_stage_seconds` e o total no `pipeline_latency_seconds`.
+    """
+
+    __slots__ = ("camera_id", "started", "_last", "stages")
+
+    def __init__(self, camera_id: str):
+        self.camera_id = camera_id
+        self.started = self._last = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def mark(self, stage: str) -> float:
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+        self._last = now
+        return elapsed
+
+    def skip(self):
+        """Descarta o tempo desde a última marca (ex.: espera da agenda)."""
+        self._last = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+
+    def finish(self) -> Dict[str, float]:
+        for stage, seconds in self.stages.items():
+            record_stage(stage, seconds)
+        record_latency(self.camera_id, self.total)
+        return self.stages
+
+
+def histogram_series(hist) -> Dict[str, Dict[str, Any]]:
+    """Buckets acumulados, contagem e soma de um Histogram por combinação de labels."""
+    series: Dict[str, Dict[str, Any]] = {}
+    for metric in hist.collect():
+        for sample in metric.samples:
+            labels = {k: v for k, v in sample.labels.items() if k != "le"}
+            key = ",".join(labels.values()) or "all"
+            entry = series.setdefault(key, {"buckets": {}, "count": 0, "sum": 0.0})
+            if sample.name.endswith("_bucket"):
+                entry["buckets"][float(sample.labels["le"])] = sample.value
+            elif sample.name.endswith("_count"):
+                entry["count"] = int(sample.value)
+            elif sample.name.endswith("_sum"):
+                entry["sum"] = sample.value
+    return series
+
+
+def diff_series(after: Dict[str, Dict[str, Any]], before: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Observações feitas entre duas leituras de `histogram_series`."""
+    out = {}
+    for key, entry in after.items():
+        prev = before.get(key, {"buckets": {}, "count": 0, "sum": 0.0})
+        out[key] = {
+            "buckets": {le: n - prev["buckets"].get(le, 0) for le, n in entry["buckets"].items()},
+            "count": entry["count"] - prev["count"],
+            "sum": entry["sum"] - prev["sum"],
+        }
+    return out
+
+
+def _bucket_quantile(buckets, count: int, q: float) -> float:
+    rank = q * count
+    prev_le, prev_count = 0.0, 0.0
+    for le, cum in buckets:
+        if cum >= rank:
+            if le == float("inf"):
+                return prev_le
+            span = cum - prev_count
+            return prev_le + (le - prev_le) * ((rank - prev_count) / span if span else 0.0)
+        prev_le, prev_count = le, cum
+    return prev_le
+
+
+def summarize_series(series: Dict[str, Dict[str, Any]], quantiles=(0.5, 0.95)) -> Dict[str, Dict[str, Any]]:
+    """
+    Contagem, média e quantis estimados pelos buckets (interpolação linear,
+    como o histogram_quantile do Prometheus).
+    """
+    out = {}
+    for key, entry in series.items():
+        count = entry["count"]
+        if not count:
+            continue
+        buckets = sorted(entry["buckets"].items())
+        out[key] = {"count": count, "mean": entry["sum"] / count}
+        for q in quantiles:
+            out[key][f"p{int(q * 100)}"] = _bucket_quantile(buckets, count, q)
+    return out
+
+
+def histogram_summary(hist) -> Dict[str, Dict[str, Any]]:
+    """Resumo (contagem, média, p50, p95) de um Histogram por combinação de labels."""
+    return summarize_series(histogram_series(hist))
+
+
+def sample_values(collector) -> Dict[str, float]:
+    """Valores de um Gauge/Counter por combinação de labels (ignora `_created`)."""
+    return {
+        ",".join(sample.labels.values()) or "all": sample.value
+        for metric in collector.collect()
+        for sample in metric.samples
+        if not sample.name.endswith("_created")
+    }
+
+
+class Metrics:
+    """
+    Fachada usada pelos workers: coletores por câmera, `trace()` para medir
+    as etapas de um frame e o último trace de cada câmera (para /stats).
+    """
+
+    fps = fps_gauge
+    latency = latency_hist
+    rtsp_errors = rtsp_error_counter
+    debounce = debounce_hits_counter
+    dedupe = dedupe_hits_counter
+
+    def __init__(self):
+        self._last_traces: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def trace(self, camera_id) -> FrameTrace:
+        return FrameTrace(str(camera_id))
+
+    def finish(self, trace: FrameTrace):
+        stages = trace.finish()
+        if trace.total > 0:
+            record_fps(trace.camera_id, 1.0 / trace.total)
+        with self._lock:
+            self._last_traces[trace.camera_id] = {**{k: round(v, 4) for k, v in stages.items()}, "total": round(trace.total, 4)}
+
+    def frame_dropped(self, camera_id, reason: str):
+        record_frame_dropped(str(camera_id), reason)
+
+    def last_traces(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return dict(self._last_traces)
+
+    def summary(self) -> Dict[str, Any]:
+        fps = sample_values(fps_gauge)
+        return {
+            "fps_total": round(sum(fps.values()), 3),
+            "fps": fps,
+            "stages": histogram_summary(stage_hist),
+            "queue_wait": histogram_summary(queue_wait_hist),
+            "batch_size": histogram_summary(batch_size_hist).get("all"),
+            "latency": histogram_summary(latency_hist),
+            "frames_dropped": sample_values(frames_dropped_counter),
+            "last_traces": self.last_traces(),
+        }
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    """Fachada de métricas compartilhada do processo."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import psutil
+
+from app.services import metrics
+
+
+class _ModelEntry:
+    def __init__(self, path: str, detector, mtime: float, load_seconds: float, memory_bytes: int):
+        self.path = path
+        self.detector = detector
+        self.mtime = mtime
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+        self.checked_at = time.monotonic()
+
+
+class ModelRegistry:
+    """
+    Registro de modelos do processo, indexado pelo caminho do arquivo.
+
+    - Cada arquivo é carregado uma única vez, no primeiro `get()`; câmeras com
+      o mesmo `ai_model_path` compartilham o detector.
+    - `retain()`/`release()` contam quantas câmeras usam cada modelo. Modelos
+      sem referências são descarregados (LRU) quando a memória estimada passa
+      de `memory_budget_mb` (0 = sem limite).
+    - Se o mtime do arquivo mudar, o modelo é recarregado no próximo `get()`
+      (verificação no máximo a cada `check_interval` segundos), permitindo
+      trocar o modelo retreinado sem reiniciar. A carga acontece fora do lock
+      do registro e a nova entrada só substitui a antiga quando está pronta.
+    - No backend `process` os modelos são carregados nos processos filhos;
+      `record_worker_stats()` guarda o último relatório de cada filho e
+      `stats()` os inclui (campo `workers`), somando a memória de todos.
+    """
+
+    def __init__(self, memory_budget_mb: float = 0.0, check_interval: float = 5.0, loader=None):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.check_interval = check_interval
+        self._loader = loader
+        self._entries: "OrderedDict[str, _ModelEntry]" = OrderedDict()
+        self._refs: Dict[str, int] = {}
+        self._workers: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def _load(self, key: str) -> _ModelEntry:
+        loader = self._loader
+        if loader is None:
+            from app.services.detectors import create_detector
+            loader = create_detector
+        mtime = os.path.getmtime(key)
+        rss_before = psutil.Process().memory_info().rss
+        t0 = time.perf_counter()
+        detector = loader(key)
+        load_seconds = time.perf_counter() - t0
+        # Estimativa: crescimento do RSS na carga (ou tamanho do arquivo)
+        memory = psutil.Process().memory_info().rss - rss_before
+        if memory <= 0:
+            memory = os.path.getsize(key)
+        metrics.record_model_loaded(key, load_seconds, memory)
+        return _ModelEntry(key, detector, mtime, load_seconds, memory)
+
+    def get(self, path: str):
+        """Retorna o detector do arquivo, carregando ou recarregando se preciso."""
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._changed(entry):
+                return self._use(key, entry)
+            loading = self._loading.setdefault(key, threading.Lock())
+        # A carga roda fora do lock do registro: os demais modelos (e o modelo
+        # antigo, numa recarga) continuam atendendo enquanto o arquivo carrega.
+        with loading:
+            with self._lock:
+                current = self._entries.get(key)
+                if current is not None and current is not entry:
+                    return self._use(key, current)  # outra thread já carregou
+            fresh = self._load(key)
+            with self._lock:
+                self._entries[key] = fresh
+                return self._use(key, fresh)
+
+    def _changed(self, entry: _ModelEntry) -> bool:
+        if time.monotonic() - entry.checked_at < self.check_interval:
+            return False
+        entry.checked_at = time.monotonic()
+        try:
+            return os.path.getmtime(entry.path) != entry.mtime
+        except OSError:
+            return False  # arquivo sendo substituído; mantém o atual
+
+    def _use(self, key: str, entry: _ModelEntry):
+        self._entries.move_to_end(key)
+        self._evict(keep=key)
+        return entry.detector
+
+    def retain(self, path: str):
+        key = self._key(path)
+        with self._lock:
+            self._refs[key] = self._refs.get(key, 0) + 1
+            metrics.record_model_refs(key, self._refs[key])
+
+    def release(self, path: str):
+        key = self._key(path)
+        with self._lock:
+            refs = max(0, self._refs.get(key, 0) - 1)
+            if refs:
+                self._refs[key] = refs
+            else:
+                self._refs.pop(key, None)
+            metrics.record_model_refs(key, refs)
+            self._evict()
+
+    def _evict(self, keep: Optional[str] = None):
+        if self.memory_budget <= 0:
+            return
+        total = sum(e.memory_bytes for e in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.memory_budget:
+                break
+            if key == keep or self._refs.get(key):
+                continue
+            total -= self._entries.pop(key).memory_bytes
+            metrics.record_model_evicted(key)
+
+    def record_worker_stats(self, worker: int, entries: List[Dict[str, Any]]):
+        """Guarda o relatório do registro de um processo filho (backend `process`)."""
+        with self._lock:
+            self._workers[worker] = {e["path"]: e for e in entries if e.get("loaded")}
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            keys = list(self._entries) + [k for k in self._refs if k not in self._entries]
+            for reports in self._workers.values():
+                keys += [k for k in reports if k not in keys]
+            out = []
+            for key in keys:
+                entry = self._entries.get(key)
+                remote = [
+                    {"worker": worker, **{f: reports[key][f] for f in ("load_seconds", "memory_bytes", "loaded_at")}}
+                    for worker, reports in self._workers.items() if key in reports
+                ]
+                item = {
+                    "path": key,
+                    "loaded": entry is not None,
+                    "backend": getattr(entry.detector, "backend", "") if entry else None,
+                    "refs": self._refs.get(key, 0),
+                    "load_seconds": entry.load_seconds if entry else None,
+                    "memory_bytes": entry.memory_bytes if entry else None,
+                    "loaded_at": entry.loaded_at if entry else None,
+                }
+                if remote:
+                    item["workers"] = remote
+                    if entry is None:
+                        item.update(
+                            loaded=True,
+                            backend=self._workers[remote[0]["worker"]][key]["backend"],
+                            load_seconds=max(r["load_seconds"] for r in remote),
+                            memory_bytes=sum(r["memory_bytes"] for r in remote),
+                            loaded_at=min(r["loaded_at"] for r in remote),
+                        )
+                out.append(item)
+            return out
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                metrics.record_model_evicted(key)
+            self._entries.clear()
+            self._workers.clear()
+
+
+_registry: Optional[ModelRegistry] = None
+
+
+def get_model_registry() -> ModelRegistry:
+    """Registro de modelos compartilhado do processo."""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(
+            memory_budget_mb=float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0")),
+            check_interval=float(os.getenv("MODEL_RELOAD_CHECK_SEC", "5")),
+        )
+    return _registry
@@ -0,0 +1,112 @@
+import os
+import ast
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from app.services.detections import Detections, names_tuple
+from app.services.detectors import BaseDetector
+from app.services.preprocess import INPUT_SIZE, PreparedFrame, letterbox
+
+
+class OnnxDetector(BaseDetector):
+    """
+    Detector servido pelo ONNX Runtime (CPUExecutionProvider).
+
+    Espera um modelo exportado por `python -m app.services.export_onnx`
+    (saída YOLOv5: B x N x (5 + classes), xywh + objectness + scores por
+    classe; nomes das classes nos metadados). Mantém o mesmo contrato de
+    `detect()` / `detect_batch()` do detector PyTorch, com NMS feito aqui.
+    """
+
+    backend = "onnx"
+
+    def __init__(self, model_path: str, conf_threshold: float = 0.4, input_size: int = INPUT_SIZE,
+                 iou_threshold: float = 0.45, max_det: int = 300):
+        import onnxruntime as ort
+
+        super().__init__(model_path, conf_threshold=conf_threshold, input_size=input_size)
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(self.model_path), sess_options=opts, providers=["CPUExecutionProvider"])
+
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # Modelos exportados com lote fixo rodam um frame por vez
+        self.dynamic_batch = not isinstance(inp.shape[0], int)
+        # Os frames chegam já em letterbox de `input_size` (FrameDecoder e a
+        # reanálise usam INFER_INPUT_SIZE); um modelo de entrada fixa diferente
+        # falharia só no primeiro batch, então a divergência é recusada aqui.
+        if isinstance(inp.shape[2], int) and inp.shape[2] != self.input_size:
+            raise ValueError(
+                f"Modelo ONNX {self.model_path} tem entrada fixa {inp.shape[2]}x{inp.shape[3]}, "
+                f"mas INFER_INPUT_SIZE={self.input_size}: ajuste INFER_INPUT_SIZE ou exporte com "
+                f"--imgsz {self.input_size} (ou sem tamanho fixo)"
+            )
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        names = ast.literal_eval(meta["names"]) if "names" in meta else {}
+        self.names = names_tuple(names)
+
+    def _to_tensor(self, frames: List[PreparedFrame]) -> np.ndarray:
+        batch = np.stack([f.image for f in frames])  # B x H x W x 3, RGB
+        return np.ascontiguousarray(batch.transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+    def _postprocess(self, pred: np.ndarray, conf: float) -> Detections:
+        """Filtra por confiança, converte xywh->xyxy e aplica NMS por classe."""
+        obj = pred[:, 4]
+        pred = pred[obj >= conf]
+        if not len(pred):
+            return Detections.empty(self.names)
+        cls_scores = pred[:, 5:] * pred[:, 4:5]
+        class_ids = cls_scores.argmax(axis=1)
+        scores = cls_scores[np.arange(len(pred)), class_ids]
+        keep = scores >= conf
+        pred, class_ids, scores = pred[keep], class_ids[keep], scores[keep]
+        if not len(pred):
+            return Detections.empty(self.names)
+
+        boxes = np.empty((len(pred), 4), dtype=np.float32)
+        boxes[:, 0] = pred[:, 0] - pred[:, 2] / 2
+        boxes[:, 1] = pred[:, 1] - pred[:, 3] / 2
+        boxes[:, 2] = pred[:, 0] + pred[:, 2] / 2
+        boxes[:, 3] = pred[:, 1] + pred[:, 3] / 2
+
+        xywh = np.column_stack([boxes[:, :2], pred[:, 2:4]]).tolist()
+        idx = cv2.dnn.NMSBoxesBatched(xywh, scores.tolist(), class_ids.tolist(), conf, self.iou_threshold)
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)[: self.max_det]
+        return Detections(boxes[idx], scores[idx].astype(np.float32), class_ids[idx].astype(np.int32), self.names)
+
+    def detect_batch(self, images, conf_threshold: Optional[float] = None) -> List[Detections]:
+        """Mesmo contrato de `YoloDetector.detect_batch` (BGR ou PreparedFrame)."""
+        conf = self.conf_threshold if conf_threshold is None else conf_threshold
+        outputs: List[Detections] = [Detections.empty(self.names) for _ in images]
+
+        valid_idx = [i for i, img in enumerate(images) if img is not None and img.size > 0]
+        if not valid_idx:
+            return outputs
+        frames = [
+            images[i] if isinstance(images[i], PreparedFrame) else letterbox(images[i], self.input_size)
+            for i in valid_idx
+        ]
+
+        if self.dynamic_batch:
+            preds = self.session.run(None, {self.input_name: self._to_tensor(frames)})[0]
+        else:
+            preds = np.concatenate(
+                [self.session.run(None, {self.input_name: self._to_tensor([f])})[0] for f in frames]
+            )
+
+        for i, frame, pred in zip(valid_idx, frames, preds):
+            dets = self._postprocess(pred, conf)
+            if len(dets):
+                dets.boxes = frame.to_original(dets.boxes)
+            outputs[i] = dets
+        return outputs
@@ -0,0 +1,57 @@
+import os
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Tamanho da página pedido, limitado a [1, PAGE_SIZE_MAX]."""
+    if not limit:
+        limit = PAGE_SIZE_DEFAULT
+    return max(1, min(int(limit), PAGE_SIZE_MAX))
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverso de `encode_cursor`; ValueError se o cursor for inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as exc:
+        raise ValueError("cursor inválido") from exc
+
+
+def keyset_page(query, model, cursor: Optional[str], limit: Optional[int]) -> Tuple[List[Any], Optional[str]]:
+    """
+    Página de `query` em ordem decrescente de (created_at, id).
+
+    O cursor guarda a chave da última linha entregue; a próxima página começa
+    logo depois dela, então o custo não cresce com a profundidade (ao
+    contrário de OFFSET) e linhas novas não deslocam as páginas seguintes.
+    Retorna os itens e o cursor da próxima página (None na última).
+    """
+    size = page_size(limit)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # `created_at <= x` primeiro para o índice de created_at delimitar a faixa
+        query = query.filter(
+            model.created_at <= created_at,
+            or_(model.created_at < created_at, and_(model.created_at == created_at, model.id < row_id)),
+        )
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(size + 1).all()
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
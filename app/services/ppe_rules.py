@@ -1,4 +1,17 @@
-from typing import List, Dict, Any
+import os
+import logging
+from typing import List, Dict, Any, Optional, Union
+
+import numpy as np
+
+from app.services.detections import Detections
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # sem scipy (instalação mínima) "hungarian" cai no guloso, com aviso
+    linear_sum_assignment = None
+
+logger = logging.getLogger(__name__)
 
 # Classes previstas no modelo YOLO
 # Ajuste conforme as labels usadas no seu treinamento
@@ -8,50 +21,157 @@ PPE_CLASSES = {
     "mask": "Máscara"
 }
 
+ASSIGNMENT_MODES = ("any", "greedy", "hungarian")
+
+
+def _areas(boxes: np.ndarray) -> np.ndarray:
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def _intersections(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Área de interseção de cada par (len(a) x len(b))."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    return np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+
+def pairwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Matriz de IoU entre todas as caixas de `a` e de `b` (xyxy)."""
+    inter = _intersections(a, b)
+    union = _areas(a)[:, None] + _areas(b)[None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(inter > 0, inter / union, 0.0)
+
+
+def pairwise_containment(regions: np.ndarray, items: np.ndarray) -> np.ndarray:
+    """Fração da área de cada item (ex.: capacete) que cai dentro de cada região."""
+    inter = _intersections(regions, items)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(inter > 0, inter / _areas(items)[None, :], 0.0)
+
+
+def head_regions(persons: np.ndarray, ratio: float = 0.3) -> np.ndarray:
+    """Faixa superior (`ratio` da altura) de cada caixa de pessoa."""
+    heads = persons.astype(np.float64, copy=True)
+    heads[:, 3] = persons[:, 1] + (persons[:, 3] - persons[:, 1]) * ratio
+    return heads
+
+
+def assign(scores: np.ndarray, threshold: float, mode: str = "any") -> np.ndarray:
+    """
+    Retorna, para cada pessoa (linha), se ela foi associada a algum item.
+
+    - any: basta um item acima do limiar (um item pode valer para várias pessoas)
+    - greedy: pares de maior score primeiro, cada item usado uma única vez
+    - hungarian: atribuição ótima um-para-um (requer scipy; senão usa greedy)
+    """
+    n_rows, n_cols = scores.shape
+    matched = np.zeros(n_rows, dtype=bool)
+    if n_rows == 0 or n_cols == 0:
+        return matched
+    valid = scores > threshold
+    if mode == "any":
+        return valid.any(axis=1)
+
+    if mode == "hungarian" and linear_sum_assignment is not None:
+        # Maximiza o número de pares válidos; o score (<= 1) só desempata.
+        # Com o bônus maior que a soma de todos os scores possíveis, trocar um
+        # par válido por IoU maior nunca compensa perder outro par.
+        bonus = float(min(n_rows, n_cols) + 1)
+        rows, cols = linear_sum_assignment(np.where(valid, bonus + scores, 0.0), maximize=True)
+        matched[rows[valid[rows, cols]]] = True
+        return matched
+
+    used_cols = np.zeros(n_cols, dtype=bool)
+    rows, cols = np.nonzero(valid)
+    for k in np.argsort(-scores[rows, cols], kind="stable"):
+        r, c = rows[k], cols[k]
+        if not matched[r] and not used_cols[c]:
+            matched[r] = True
+            used_cols[c] = True
+    return matched
+
+
 class PPEAnalyzer:
-    def __init__(self, iou_threshold: float = 0.3):
+    """
+    Associa capacetes/máscaras às pessoas detectadas.
+
+    Por padrão usa IoU entre a caixa da pessoa e a do EPI (`iou_threshold`).
+    Com `head_region=True` compara o EPI com a faixa superior da pessoa
+    (`head_ratio` da altura) pela fração da caixa do EPI contida nela
+    (`containment_threshold`), já que o IoU entre corpo inteiro e capacete é
+    estruturalmente pequeno. `assignment` define se um mesmo EPI pode valer
+    para mais de uma pessoa (ver `assign`).
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        assignment: str = "any",
+        head_region: bool = False,
+        head_ratio: float = 0.3,
+        containment_threshold: float = 0.5,
+    ):
+        if assignment not in ASSIGNMENT_MODES:
+            raise ValueError(f"Modo de associação inválido: {assignment}")
+        if assignment == "hungarian" and linear_sum_assignment is None:
+            logger.warning("scipy não instalado: associação 'hungarian' usará o modo 'greedy'")
         self.iou_threshold = iou_threshold
+        self.assignment = assignment
+        self.head_region = head_region
+        self.head_ratio = head_ratio
+        self.containment_threshold = containment_threshold
+
+    def _match(self, persons: np.ndarray, items: np.ndarray) -> np.ndarray:
+        """Vetor booleano: pessoa associada a algum item da classe."""
+        if len(persons) == 0 or len(items) == 0:
+            return np.zeros(len(persons), dtype=bool)
+        if self.head_region:
+            scores = pairwise_containment(head_regions(persons, self.head_ratio), items)
+            return assign(scores, self.containment_threshold, self.assignment)
+        return assign(pairwise_iou(persons, items), self.iou_threshold, self.assignment)
 
-    def _iou(self, boxA, boxB) -> float:
-        """Calcula Intersection over Union (IoU) entre dois bounding boxes."""
-        xA = max(boxA[0], boxB[0])
-        yA = max(boxA[1], boxB[1])
-        xB = min(boxA[2], boxB[2])
-        yB = min(boxA[3], boxB[3])
-        interW = max(0, xB - xA)
-        interH = max(0, yB - yA)
-        interArea = interW * interH
-        if interArea == 0:
-            return 0.0
-        boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
-        boxBArea = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
-        iou = interArea / float(boxAArea + boxBArea - interArea)
-        return iou
-
-    def analyze(self, detections: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def analyze(self, detections: Union[List[Dict[str, Any]], Detections]) -> Dict[str, Any]:
         """Analisa detecções e retorna regras de uso de EPI violadas."""
-        persons = [d for d in detections if d["class"] == "person"]
-        helmets = [d for d in detections if d["class"] == "helmet"]
-        masks = [d for d in detections if d["class"] == "mask"]
+        if not isinstance(detections, Detections):
+            detections = Detections.from_dicts(detections)
+        return self.analyze_detections(detections)
+
+    def analyze_detections(self, detections: Detections, person: bool = True, helmet: bool = True,
+                           mask: bool = True) -> Dict[str, Any]:
+        """
+        Mesma análise de `analyze`, consumindo diretamente os arrays do detector.
+        `person`/`helmet`/`mask` são as flags de detecção da câmera: EPI
+        desligado não gera violação (fica `None` no detalhe) e sem `person`
+        nenhuma pessoa é avaliada.
+        """
+        persons = detections.boxes_of("person")
+        if not person:
+            persons = persons[:0]
+
+        helmet_ok = self._match(persons, detections.boxes_of("helmet")) if helmet else None
+        mask_ok = self._match(persons, detections.boxes_of("mask")) if mask else None
+        checked_helmet = helmet_ok.tolist() if helmet_ok is not None else [None] * len(persons)
+        checked_mask = mask_ok.tolist() if mask_ok is not None else [None] * len(persons)
 
         results = []
         count_ok = 0
         count_violation = 0
 
-        for person in persons:
-            has_helmet = any(self._iou(person["bbox"], helmet["bbox"]) > self.iou_threshold for helmet in helmets)
-            has_mask = any(self._iou(person["bbox"], mask["bbox"]) > self.iou_threshold for mask in masks)
+        for box, has_helmet, has_mask in zip(persons, checked_helmet, checked_mask):
 
-            if has_helmet and has_mask:
+            if has_helmet is not False and has_mask is not False:
                 status = "OK"
                 count_ok += 1
-            elif not has_helmet and not has_mask:
+            elif has_helmet is False and has_mask is False:
                 status = "Sem capacete e máscara"
                 count_violation += 1
-            elif not has_helmet:
+            elif has_helmet is False:
                 status = "Sem capacete"
                 count_violation += 1
-            elif not has_mask:
+            elif has_mask is False:
                 status = "Sem máscara"
                 count_violation += 1
             else:
@@ -59,7 +179,7 @@ class PPEAnalyzer:
                 count_violation += 1
 
             results.append({
-                "person_bbox": person["bbox"],
+                "person_bbox": [float(v) for v in box],
                 "helmet": has_helmet,
                 "mask": has_mask,
                 "status": status
@@ -73,7 +193,41 @@ class PPEAnalyzer:
         }
 
 
-def evaluate(detections: List[Dict[str, Any]]) -> Dict[str, Any]:
+def create_analyzer(**overrides) -> PPEAnalyzer:
+    """Analisador com a configuração do ambiente (PPE_ASSIGNMENT, PPE_HEAD_REGION)."""
+    options = {
+        "iou_threshold": 0.15,
+        "assignment": os.getenv("PPE_ASSIGNMENT", "any"),
+        "head_region": os.getenv("PPE_HEAD_REGION", "0") == "1",
+    }
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return PPEAnalyzer(**options)
+
+
+def camera_rules(camera) -> Dict[str, bool]:
+    """Flags de detecção da câmera para `analyze_detections` (None = ligado)."""
+    return {
+        "person": camera.detect_person is not False,
+        "helmet": camera.detect_helmet is not False,
+        "mask": camera.detect_mask is not False,
+    }
+
+
+def event_type(summary: Dict[str, Any]) -> Optional[str]:
+    """Tipo de evento (Event.ppe_status) de uma análise; None se não houver violação."""
+    if summary.get("total_violations", 0) <= 0:
+        return None
+    statuses = {d["status"] for d in summary["details"]}
+    if "Sem capacete e máscara" in statuses:
+        return "no_helmet_no_mask"
+    if "Sem capacete" in statuses:
+        return "no_helmet"
+    if "Sem máscara" in statuses:
+        return "no_mask"
+    return None
+
+
+def evaluate(detections: Union[List[Dict[str, Any]], Detections]) -> Dict[str, Any]:
     analyzer = PPEAnalyzer()
     analysis = analyzer.analyze(detections)
     status = "OK" if analysis["total_violations"] == 0 else "Violação"
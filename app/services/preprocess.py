@@ -0,0 +1,152 @@
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+INPUT_SIZE = int(os.getenv("INFER_INPUT_SIZE", "640"))
+
+# Cor de preenchimento do letterbox usada no treinamento do YOLO
+PAD_VALUE = 114
+
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Marcadores SOF (start of frame) que trazem as dimensões da imagem
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(jpg: bytes) -> Optional[Tuple[int, int]]:
+    """Lê (largura, altura) do cabeçalho JPEG sem decodificar a imagem."""
+    if len(jpg) < 4 or jpg[0] != 0xFF or jpg[1] != 0xD8:
+        return None
+    i = 2
+    n = len(jpg)
+    while i + 9 < n:
+        if jpg[i] != 0xFF:
+            i += 1
+            continue
+        marker = jpg[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = (jpg[i + 2] << 8) | jpg[i + 3]
+        if marker in _SOF_MARKERS:
+            h = (jpg[i + 5] << 8) | jpg[i + 6]
+            w = (jpg[i + 7] << 8) | jpg[i + 8]
+            return (w, h) if w and h else None
+        i += 2 + length
+    return None
+
+
+def reduced_decode_flag(width: int, height: int, target: int = INPUT_SIZE) -> int:
+    """Maior redução no domínio DCT que ainda mantém o lado maior >= target."""
+    longest = max(width, height)
+    for factor, flag in _REDUCED_FLAGS:
+        if longest // factor >= target:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+@dataclass
+class PreparedFrame:
+    """Frame pronto para a inferência: RGB, letterbox `size`x`size`."""
+
+    image: np.ndarray
+    scale_x: float
+    scale_y: float
+    pad_x: int
+    pad_y: int
+    orig_w: int
+    orig_h: int
+
+    @property
+    def size(self) -> int:
+        return self.image.size
+
+    def to_original(self, boxes: np.ndarray) -> np.ndarray:
+        """Converte caixas xyxy do espaço do letterbox para a resolução original."""
+        out = np.empty_like(boxes, dtype=np.float32)
+        out[:, [0, 2]] = (boxes[:, [0, 2]] - self.pad_x) * self.scale_x
+        out[:, [1, 3]] = (boxes[:, [1, 3]] - self.pad_y) * self.scale_y
+        # Fatias (views): índice por lista criaria uma cópia e o clip se perderia
+        np.clip(out[:, 0::2], 0, self.orig_w, out=out[:, 0::2])
+        np.clip(out[:, 1::2], 0, self.orig_h, out=out[:, 1::2])
+        return out
+
+    def meta(self) -> tuple:
+        return (self.scale_x, self.scale_y, self.pad_x, self.pad_y, self.orig_w, self.orig_h)
+
+
+def letterbox(img: np.ndarray, size: int = INPUT_SIZE, buf: Optional[np.ndarray] = None,
+              orig_size: Optional[Tuple[int, int]] = None, fill: bool = True) -> PreparedFrame:
+    """
+    Redimensiona uma imagem BGR para `size`x`size` com letterbox, copiando já
+    em RGB para `buf` (alocado se não informado). `orig_size` é a resolução
+    real quando `img` veio de uma decodificação reduzida.
+    """
+    dec_h, dec_w = img.shape[:2]
+    orig_w, orig_h = orig_size if orig_size else (dec_w, dec_h)
+    if buf is None:
+        buf = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+    elif fill:
+        buf[...] = PAD_VALUE
+
+    r = size / max(dec_w, dec_h)
+    new_w, new_h = max(1, round(dec_w * r)), max(1, round(dec_h * r))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    if (new_w, new_h) != (dec_w, dec_h):
+        interp = cv2.INTER_AREA if r < 1 else cv2.INTER_LINEAR
+        img = cv2.resize(img, (new_w, new_h), interpolation=interp)
+
+    # Letterbox + BGR->RGB numa única cópia para o buffer
+    np.copyto(buf[pad_y:pad_y + new_h, pad_x:pad_x + new_w], img[..., ::-1])
+
+    return PreparedFrame(
+        image=buf,
+        scale_x=orig_w / new_w,
+        scale_y=orig_h / new_h,
+        pad_x=pad_x,
+        pad_y=pad_y,
+        orig_w=orig_w,
+        orig_h=orig_h,
+    )
+
+
+class FrameDecoder:
+    """
+    Decodifica snapshots direto para a entrada do modelo.
+
+    O JPEG é decodificado já reduzido (IMREAD_REDUCED_COLOR_2/4/8, escolhido
+    pelo tamanho de entrada do modelo), redimensionado e copiado com a troca
+    BGR->RGB para dentro de um buffer letterbox pré-alocado. Cada worker tem o
+    seu decoder: o buffer é reaproveitado, então só pode haver um frame do
+    decoder em uso por vez.
+    """
+
+    def __init__(self, size: int = INPUT_SIZE):
+        self.size = size
+        self._buf = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+        self._geometry: Optional[tuple] = None
+
+    def decode(self, jpg: bytes) -> Optional[PreparedFrame]:
+        if not jpg:
+            return None
+        dims = jpeg_size(jpg)
+        flag = reduced_decode_flag(*dims, target=self.size) if dims else cv2.IMREAD_COLOR
+        img = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), flag)
+        if img is None:
+            return None
+
+        # Só repinta o fundo quando a geometria do letterbox muda
+        geometry = img.shape[:2]
+        fill = geometry != self._geometry
+        self._geometry = geometry
+        return letterbox(img, self.size, buf=self._buf, orig_size=dims, fill=fill)
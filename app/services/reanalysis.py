@@ -0,0 +1,588 @@
+"""
+Reanálise em lote das imagens arquivadas.
+
+Depois de retreinar o modelo ou mudar limiares, reprocessa as imagens dos
+eventos (ou de uma pasta) e grava o novo resultado em `reanalysis_results`,
+sem alterar os eventos originais.
+
+Uso:
+    python -m app.services.reanalysis --start 2024-01-01 --model ./model/ppe_v2.pt
+    python -m app.services.reanalysis --directory ./data/images --threshold 0.5
+    python -m app.services.reanalysis --resume 3 --max-minutes 240
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import asyncio
+import argparse
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from sqlalchemy import insert, update
+
+from app.models import SessionLocal, Camera, Event, ReanalysisJob, ReanalysisResult
+from app.services import metrics
+from app.services.executor import create_backend
+from app.services.ppe_rules import create_analyzer, event_type
+from app.services.preprocess import INPUT_SIZE, jpeg_size, letterbox, reduced_decode_flag
+
+SOURCES = ("events", "directory")
+ACTIVE = ("pending", "running")
+# Estados gravados pela API que interrompem um job em execução
+STOP_STATUSES = ("paused", "cancelled")
+# Estados que `--resume` pode retomar ("running" = processo interrompido)
+RESUMABLE = ("paused", "failed", "running")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg")
+
+# (chave do checkpoint, event_id, caminho, camera_id, status anterior)
+Item = Tuple[str, Optional[int], str, Optional[int], Optional[str]]
+
+
+def prepare_image(path: str, size: int = INPUT_SIZE, buf: Optional[np.ndarray] = None):
+    """
+    Lê o JPEG e decodifica já reduzido para a entrada do modelo (None se
+    inválido). Com `buf` o letterbox é escrito nele em vez de alocar um novo.
+    """
+    try:
+        with open(path, "rb") as f:
+            jpg = f.read()
+    except OSError:
+        return None
+    dims = jpeg_size(jpg)
+    flag = reduced_decode_flag(*dims, target=size) if dims else cv2.IMREAD_COLOR
+    img = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), flag)
+    if img is None:
+        return None
+    return letterbox(img, size, buf=buf, orig_size=dims)
+
+
+class DirectorySource:
+    """Arquivos JPEG de uma pasta (recursivo), em ordem de caminho relativo."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        paths = []
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.relpath(os.path.join(folder, name), self.root))
+        self.paths = sorted(paths)
+
+    def count(self) -> int:
+        return len(self.paths)
+
+    def page(self, after: Optional[str], limit: int) -> List[Item]:
+        start = bisect.bisect_right(self.paths, after) if after else 0
+        return [(p, None, os.path.join(self.root, p), None, None) for p in self.paths[start:start + limit]]
+
+
+class EventSource:
+    """Imagens de `Event` (filtros do job), em ordem de id."""
+
+    def __init__(self, job: ReanalysisJob, session_factory=SessionLocal):
+        self.job = job
+        self.session_factory = session_factory
+
+    def _query(self, db, *columns):
+        query = db.query(*columns)
+        if self.job.camera_id:
+            query = query.filter(Event.camera_id == self.job.camera_id)
+        if self.job.start_date:
+            query = query.filter(Event.created_at >= self.job.start_date)
+        if self.job.end_date:
+            query = query.filter(Event.created_at <= self.job.end_date)
+        return query
+
+    def count(self) -> int:
+        db = self.session_factory()
+        try:
+            return self._query(db, Event.id).count()
+        finally:
+            db.close()
+
+    def page(self, after: Optional[str], limit: int) -> List[Item]:
+        db = self.session_factory()
+        try:
+            query = self._query(db, Event.id, Event.image_path, Event.camera_id, Event.ppe_status)
+            if after:
+                query = query.filter(Event.id > int(after))
+            rows = query.order_by(Event.id).limit(limit).all()
+            return [(str(i), i, path, cam, status) for i, path, cam, status in rows]
+        finally:
+            db.close()
+
+
+class Reanalyzer:
+    """
+    Executa jobs de reanálise.
+
+    Cada bloco de `chunk_size` imagens é lido e decodificado em paralelo
+    (`decode_workers` threads, decodificação reduzida direto para o letterbox
+    do modelo) enquanto o bloco anterior está na inferência; os letterboxes
+    vêm de dois conjuntos fixos de buffers (bloco em inferência e bloco
+    seguinte), então a memória não cresce com o job. A inferência usa
+    o backend de `app.services.executor` (REANALYSIS_BACKEND, padrão
+    `process`, um modelo por processo em todos os núcleos), em batches de
+    `batch_size`. Os resultados do bloco e o checkpoint do job (posição e
+    contadores) são gravados na mesma transação: interrompido, o job continua
+    do último bloco gravado sem duplicar linhas. Pausar/cancelar pela API
+    (status no banco) encerra o job ao fim do bloco corrente.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        batch_size: int = 16,
+        chunk_size: int = 64,
+        decode_workers: int = 0,
+        backend: str = "process",
+        infer_workers: int = 0,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.chunk_size = max(self.batch_size, chunk_size)
+        self.decode_workers = decode_workers or (os.cpu_count() or 1)
+        self.backend_mode = backend
+        self.infer_workers = infer_workers or None
+        self._db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ppe-reanalysis-db")
+        # Buffers de letterbox por bloco: [0] e [1] se alternam entre o bloco
+        # em inferência e o que está sendo decodificado
+        self._buffers: List[List[Optional[np.ndarray]]] = [[None] * self.chunk_size for _ in range(2)]
+
+    # ------------------------
+    # Banco (rodam na thread do _db_pool)
+    # ------------------------
+    def _load_job(self, job_id: int) -> ReanalysisJob:
+        db = self.session_factory()
+        try:
+            job = db.get(ReanalysisJob, job_id)
+            if job is None:
+                raise ValueError(f"Job de reanálise {job_id} não encontrado")
+            db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def _claim(self, job_id: int, **values) -> bool:
+        """Marca o job como `running` só se ainda estiver pendente/rodando (pausa da API vence)."""
+        db = self.session_factory()
+        try:
+            claimed = db.execute(
+                update(ReanalysisJob)
+                .where(ReanalysisJob.id == job_id, ReanalysisJob.status.in_(ACTIVE))
+                .values(status="running", **values)
+            ).rowcount
+            db.commit()
+            return claimed == 1
+        finally:
+            db.close()
+
+    def _reopen(self, job_id: int) -> bool:
+        """Volta o job para `pending` só se ele estiver em RESUMABLE."""
+        db = self.session_factory()
+        try:
+            reopened = db.execute(
+                update(ReanalysisJob)
+                .where(ReanalysisJob.id == job_id, ReanalysisJob.status.in_(RESUMABLE))
+                .values(status="pending")
+            ).rowcount
+            db.commit()
+            return reopened == 1
+        finally:
+            db.close()
+
+    def _set_job(self, job_id: int, **values):
+        db = self.session_factory()
+        try:
+            db.execute(update(ReanalysisJob).where(ReanalysisJob.id == job_id).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+    def _camera_thresholds(self) -> Dict[int, float]:
+        db = self.session_factory()
+        try:
+            return {cid: t for cid, t in db.query(Camera.id, Camera.threshold).all() if t is not None}
+        finally:
+            db.close()
+
+    def _write_chunk(self, job_id: int, rows: List[Dict[str, Any]], checkpoint: Dict[str, Any]) -> str:
+        """Grava resultados + checkpoint numa transação; retorna o status atual do job."""
+        db = self.session_factory()
+        try:
+            if rows:
+                db.execute(insert(ReanalysisResult), rows)
+            db.execute(update(ReanalysisJob).where(ReanalysisJob.id == job_id).values(**checkpoint))
+            status = db.query(ReanalysisJob.status).filter(ReanalysisJob.id == job_id).scalar()
+            db.commit()
+            return status
+        finally:
+            db.close()
+
+    async def _db(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._db_pool, lambda: fn(*args, **kwargs))
+
+    # ------------------------
+    # Pipeline
+    # ------------------------
+    def _buffer(self, slot: int, i: int) -> np.ndarray:
+        buf = self._buffers[slot][i]
+        if buf is None:
+            buf = self._buffers[slot][i] = np.empty((INPUT_SIZE, INPUT_SIZE, 3), dtype=np.uint8)
+        return buf
+
+    async def _load_chunk(self, source, after: Optional[str], decode_pool: ThreadPoolExecutor, slot: int):
+        loop = asyncio.get_running_loop()
+        items = await loop.run_in_executor(self._db_pool, source.page, after, self.chunk_size)
+        frames = await asyncio.gather(*(
+            loop.run_in_executor(decode_pool, prepare_image, item[2], INPUT_SIZE, self._buffer(slot, i))
+            for i, item in enumerate(items)
+        ))
+        return items, frames
+
+    async def _infer(self, backend, frames: List[Any], conf: float, model_path: Optional[str]) -> List[Any]:
+        """Detecções por frame (None para os que não decodificaram)."""
+        valid = [i for i, f in enumerate(frames) if f is not None]
+        batches = [valid[i:i + self.batch_size] for i in range(0, len(valid), self.batch_size)]
+        limit = asyncio.Semaphore(max(1, getattr(backend, "max_concurrency", 1)))
+
+        async def run(idx):
+            async with limit:
+                return await backend.detect_batch([frames[i] for i in idx], conf, model_path)
+
+        out: List[Any] = [None] * len(frames)
+        for idx, dets in zip(batches, await asyncio.gather(*(run(b) for b in batches))):
+            for i, d in zip(idx, dets):
+                out[i] = d
+        return out
+
+    async def run(self, job_id: int, time_budget: Optional[float] = None, progress=None) -> Dict[str, Any]:
+        """
+        Executa (ou continua) um job até terminar, ser pausado/cancelado ou
+        estourar `time_budget` segundos (fica `paused`, retomável).
+        `progress(job_dict)` é chamado a cada bloco gravado.
+        """
+        job = await self._db(self._load_job, job_id)
+        if job.status not in ACTIVE:
+            return job_dict(job)
+        started_at = job.started_at or dt.datetime.utcnow()
+        # Pausado/cancelado pela API entre a leitura e aqui: não roda
+        if not await self._db(self._claim, job_id, started_at=started_at, error=None):
+            return job_dict(await self._db(self._load_job, job_id))
+        model_path = job.model_path or os.getenv("MODEL_PATH", "./model/ppe.pt")
+        source = DirectorySource(job.directory) if job.source == "directory" else EventSource(job, self.session_factory)
+
+        started = time.monotonic()
+        total = await asyncio.get_running_loop().run_in_executor(self._db_pool, source.count)
+        state = {"status": "running", "total": total, "started_at": started_at, "error": None}
+        await self._db(self._set_job, job_id, total=total)
+
+        thresholds = {} if job.threshold is not None else await self._db(self._camera_thresholds)
+        default_conf = job.threshold if job.threshold is not None else float(os.getenv("REANALYSIS_THRESHOLD", "0.4"))
+        conf = min([default_conf, *thresholds.values()])
+        analyzer = create_analyzer()
+
+        checkpoint = {
+            "position": job.position,
+            "processed": job.processed or 0,
+            "failed": job.failed or 0,
+            "changed": job.changed or 0,
+        }
+        backend = create_backend(self.backend_mode, model_path, self.infer_workers)
+        decode_pool = ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix="ppe-reanalysis-decode")
+        status = "running"
+        stopped_by_api = False
+        done_in_run = 0
+        slot = 0
+        pending = asyncio.create_task(self._load_chunk(source, checkpoint["position"], decode_pool, slot))
+        try:
+            while True:
+                items, frames = await pending
+                if not items:
+                    status = "done"
+                    break
+                # O próximo bloco decodifica no outro conjunto de buffers
+                slot ^= 1
+                pending = asyncio.create_task(self._load_chunk(source, items[-1][0], decode_pool, slot))
+
+                dets = await self._infer(backend, frames, conf, model_path)
+                rows, failed, changed = [], 0, 0
+                for (key, event_id, path, camera_id, previous), frame_dets in zip(items, dets):
+                    row = {
+                        "job_id": job_id,
+                        "event_id": event_id,
+                        "camera_id": camera_id,
+                        "image_path": path,
+                        "previous_status": previous,
+                        "ppe_status": None,
+                        "persons": 0,
+                        "violations": 0,
+                        "changed": False,
+                        "summary": None,
+                        "error": None,
+                    }
+                    if frame_dets is None:
+                        failed += 1
+                        row["error"] = "imagem ausente ou inválida"
+                    else:
+                        summary = analyzer.analyze_detections(frame_dets.filter(thresholds.get(camera_id, default_conf)))
+                        new_status = event_type(summary)
+                        is_changed = event_id is not None and new_status != previous
+                        changed += is_changed
+                        row.update(
+                            ppe_status=new_status,
+                            persons=summary["total_persons"],
+                            violations=summary["total_violations"],
+                            changed=is_changed,
+                            summary=json.dumps(summary, ensure_ascii=False),
+                        )
+                    rows.append(row)
+
+                done_in_run += len(items)
+                rate = done_in_run / max(1e-6, time.monotonic() - started)
+                checkpoint.update(
+                    position=items[-1][0],
+                    processed=checkpoint["processed"] + len(items),
+                    failed=checkpoint["failed"] + failed,
+                    changed=checkpoint["changed"] + changed,
+                    rate=round(rate, 2),
+                )
+                current = await self._db(self._write_chunk, job_id, rows, dict(checkpoint))
+                metrics.record_reanalysis_chunk(len(items) - failed, failed, changed, rate)
+                if progress is not None:
+                    progress({**state, **checkpoint, "id": job_id})
+                if current in STOP_STATUSES:
+                    status, stopped_by_api = current, True
+                    break
+                if time_budget is not None and time.monotonic() - started >= time_budget:
+                    status = "paused"
+                    break
+        except Exception as exc:
+            status = "failed"
+            await self._db(self._set_job, job_id, status=status, error=str(exc))
+            raise
+        finally:
+            pending.cancel()
+            try:
+                await pending
+            except BaseException:
+                pass
+            decode_pool.shutdown(wait=False, cancel_futures=True)
+            backend.close()
+            metrics.reanalysis_rate_gauge.set(0)
+
+        if status == "done":
+            await self._db(self._set_job, job_id, status=status, finished_at=dt.datetime.utcnow())
+        elif not stopped_by_api:
+            # Limite de tempo; pausa/cancelamento da API já estão gravados
+            await self._db(self._set_job, job_id, status=status)
+        return job_dict(await self._db(self._load_job, job_id))
+
+    def close(self):
+        self._db_pool.shutdown(wait=False)
+
+
+def job_dict(job: ReanalysisJob) -> Dict[str, Any]:
+    """Estado do job com percentual e previsão de término."""
+    total = job.total or 0
+    processed = job.processed or 0
+    remaining = max(0, total - processed)
+    return {
+        "id": job.id,
+        "source": job.source,
+        "directory": job.directory,
+        "camera_id": job.camera_id,
+        "start_date": job.start_date,
+        "end_date": job.end_date,
+        "model_path": job.model_path,
+        "threshold": job.threshold,
+        "status": job.status,
+        "total": total,
+        "processed": processed,
+        "failed": job.failed or 0,
+        "changed": job.changed or 0,
+        "rate": job.rate or 0.0,
+        "percent": round(100.0 * processed / total, 2) if total else 0.0,
+        "eta_sec": round(remaining / job.rate) if job.rate and job.status == "running" else None,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "error": job.error,
+    }
+
+
+def create_job(db, source: str = "events", directory: Optional[str] = None, camera_id: Optional[int] = None,
+               start_date: Optional[dt.datetime] = None, end_date: Optional[dt.datetime] = None,
+               model_path: Optional[str] = None, threshold: Optional[float] = None) -> ReanalysisJob:
+    if source not in SOURCES:
+        raise ValueError(f"Origem inválida: {source} (use {', '.join(SOURCES)})")
+    if source == "directory" and (not directory or not os.path.isdir(directory)):
+        raise ValueError(f"Pasta não encontrada: {directory}")
+    if model_path and not os.path.exists(model_path):
+        raise ValueError(f"Modelo não encontrado: {model_path}")
+    job = ReanalysisJob(
+        source=source,
+        directory=os.path.abspath(directory) if directory else None,
+        camera_id=camera_id,
+        start_date=start_date,
+        end_date=end_date,
+        model_path=model_path,
+        threshold=threshold,
+        status="pending",
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def create_reanalyzer(background: bool = False) -> Reanalyzer:
+    """
+    Cria o executor com a configuração do ambiente (REANALYSIS_BATCH etc.).
+    `background=True` (jobs da API, dentro do servidor) limita decodificação e
+    inferência a REANALYSIS_API_WORKERS (padrão 2) para não disputar CPU com
+    as câmeras ao vivo.
+    """
+    decode_workers = int(os.getenv("REANALYSIS_DECODE_WORKERS", "0"))
+    infer_workers = int(os.getenv("REANALYSIS_WORKERS", "0"))
+    if background:
+        cap = max(1, int(os.getenv("REANALYSIS_API_WORKERS", "2")))
+        decode_workers = min(decode_workers or cap, cap)
+        infer_workers = min(infer_workers or cap, cap)
+    return Reanalyzer(
+        batch_size=int(os.getenv("REANALYSIS_BATCH", "16")),
+        chunk_size=int(os.getenv("REANALYSIS_CHUNK", "64")),
+        decode_workers=decode_workers,
+        backend=os.getenv("REANALYSIS_BACKEND", "process"),
+        infer_workers=infer_workers,
+    )
+
+
+class ReanalysisRunner:
+    """Roda os jobs da API um por vez, em background no event loop do servidor."""
+
+    def __init__(self, reanalyzer: Optional[Reanalyzer] = None):
+        self.reanalyzer = reanalyzer or create_reanalyzer(background=True)
+        self._queue: List[int] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, job_id: int):
+        if job_id not in self._queue:
+            self._queue.append(job_id)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def resume_interrupted(self):
+        """Recoloca na fila os jobs que estavam rodando quando o processo parou."""
+        db = self.reanalyzer.session_factory()
+        try:
+            ids = [i for (i,) in db.query(ReanalysisJob.id).filter(ReanalysisJob.status.in_(ACTIVE)).order_by(ReanalysisJob.id)]
+        finally:
+            db.close()
+        for job_id in ids:
+            self.submit(job_id)
+
+    async def _run(self):
+        while self._queue:
+            job_id = self._queue[0]
+            try:
+                await self.reanalyzer.run(job_id)
+            except Exception:
+                pass  # erro gravado no job
+            finally:
+                self._queue.pop(0)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.reanalyzer.close()
+
+
+_runner: Optional[ReanalysisRunner] = None
+
+
+def get_reanalysis_runner() -> ReanalysisRunner:
+    global _runner
+    if _runner is None:
+        _runner = ReanalysisRunner()
+    return _runner
+
+
+def _parse_date(text: Optional[str]) -> Optional[dt.datetime]:
+    return dt.datetime.fromisoformat(text) if text else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reanálise em lote das imagens arquivadas")
+    parser.add_argument("--resume", type=int, default=None, help="Continua o job com este id")
+    parser.add_argument("--directory", default=None, help="Pasta de JPEGs (padrão: imagens dos eventos)")
+    parser.add_argument("--camera", type=int, default=None)
+    parser.add_argument("--start", default=None, help="Data inicial (ISO) dos eventos")
+    parser.add_argument("--end", default=None, help="Data final (ISO) dos eventos")
+    parser.add_argument("--model", default=None, help="Modelo (padrão: MODEL_PATH)")
+    parser.add_argument("--threshold", type=float, default=None, help="Limiar único (padrão: o de cada câmera)")
+    parser.add_argument("--max-minutes", type=float, default=None, help="Pausa o job ao fim deste tempo")
+    args = parser.parse_args(argv)
+
+    from app.models import init_db
+    init_db()
+
+    if args.resume is not None:
+        job_id = args.resume
+        reanalyzer = create_reanalyzer()
+        if not reanalyzer._reopen(job_id):
+            reanalyzer.close()
+            try:
+                status = reanalyzer._load_job(job_id).status
+            except ValueError as exc:
+                raise SystemExit(str(exc))
+            raise SystemExit(f"Job {job_id} está {status}; só jobs {', '.join(RESUMABLE)} podem ser retomados")
+    else:
+        db = SessionLocal()
+        try:
+            job = create_job(
+                db,
+                source="directory" if args.directory else "events",
+                directory=args.directory,
+                camera_id=args.camera,
+                start_date=_parse_date(args.start),
+                end_date=_parse_date(args.end),
+                model_path=args.model,
+                threshold=args.threshold,
+            )
+            job_id = job.id
+        except ValueError as exc:
+            raise SystemExit(str(exc))
+        finally:
+            db.close()
+        reanalyzer = create_reanalyzer()
+
+    def progress(state):
+        total = state["total"] or 0
+        pct = 100.0 * state["processed"] / total if total else 0.0
+        print(
+            f"\rjob {job_id}: {state['processed']}/{total} ({pct:.1f}%) "
+            f"{state['rate']:.1f} img/s, {state['failed']} falhas, {state['changed']} alterados",
+            end="", file=sys.stderr, flush=True,
+        )
+
+    budget = args.max_minutes * 60 if args.max_minutes else None
+    try:
+        result = asyncio.run(reanalyzer.run(job_id, time_budget=budget, progress=progress))
+    finally:
+        reanalyzer.close()
+    print(file=sys.stderr)
+    print(json.dumps(result, indent=2, default=str, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import asyncio
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import delete
+
+from app.models import SessionLocal, Event, Setting
+from app.services import metrics, rollups
+from app.services.thumbnails import get_image_cache, variant_paths
+from app.services.utils import cleanup_old_files
+
+CHECKPOINT_KEY = "retention_checkpoint"
+
+
+class RetentionSweeper:
+    """
+    Limpeza incremental de eventos expirados.
+
+    Percorre os eventos com `created_at` anterior ao corte em blocos de
+    `chunk_size`, pela ordem do índice `ix_events_created_at`. Para cada bloco
+    apaga primeiro os arquivos (imagem e miniatura) num pool de threads e
+    depois as linhas num único DELETE por chave primária. O progresso
+    (corte, posição e totais) fica gravado em `Setting[retention_checkpoint]`,
+    então um restart continua a mesma varredura. Cada execução respeita
+    `time_budget` segundos; o que faltar fica para a próxima. Ao terminar uma
+    varredura, arquivos órfãos em images/thumbs também são removidos e os
+    agregados de `event_rollups` são podados (ROLLUP_*_DAYS), independente da
+    retenção dos eventos brutos.
+    """
+
+    def __init__(self, session_factory=SessionLocal, chunk_size: int = 1000, time_budget: float = 30.0, file_workers: int = 4):
+        self.session_factory = session_factory
+        self.chunk_size = max(1, chunk_size)
+        self.time_budget = time_budget
+        self._file_pool = ThreadPoolExecutor(max_workers=file_workers, thread_name_prefix="ppe-retention-io")
+        self._db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ppe-retention-db")
+
+    # ------------------------
+    # Banco (rodam na thread do _db_pool)
+    # ------------------------
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            s = db.query(Setting).filter(Setting.key == CHECKPOINT_KEY).first()
+            return json.loads(s.value) if s else None
+        finally:
+            db.close()
+
+    def _save_checkpoint(self, checkpoint: Optional[Dict[str, Any]]):
+        db = self.session_factory()
+        try:
+            s = db.query(Setting).filter(Setting.key == CHECKPOINT_KEY).first()
+            if checkpoint is None:
+                if s:
+                    db.delete(s)
+            elif s:
+                s.value = json.dumps(checkpoint)
+            else:
+                db.add(Setting(key=CHECKPOINT_KEY, value=json.dumps(checkpoint)))
+            db.commit()
+        finally:
+            db.close()
+
+    def _next_chunk(self, cutoff: dt.datetime) -> List[Tuple[int, Optional[dt.datetime], str, Optional[str]]]:
+        db = self.session_factory()
+        try:
+            return (
+                db.query(Event.id, Event.created_at, Event.image_path, Event.thumb_path)
+                .filter(Event.created_at < cutoff)
+                .order_by(Event.created_at, Event.id)
+                .limit(self.chunk_size)
+                .all()
+            )
+        finally:
+            db.close()
+
+    def _prune_rollups(self):
+        db = self.session_factory()
+        try:
+            rollups.prune(db)
+        finally:
+            db.close()
+
+    def _delete_rows(self, ids: List[int], checkpoint: Dict[str, Any]):
+        db = self.session_factory()
+        try:
+            db.execute(delete(Event).where(Event.id.in_(ids)))
+            s = db.query(Setting).filter(Setting.key == CHECKPOINT_KEY).first()
+            if s:
+                s.value = json.dumps(checkpoint)
+            else:
+                db.add(Setting(key=CHECKPOINT_KEY, value=json.dumps(checkpoint)))
+            db.commit()
+        finally:
+            db.close()
+
+    # ------------------------
+    # Arquivos (rodam no _file_pool)
+    # ------------------------
+    @staticmethod
+    def _remove_files(paths: List[str]) -> int:
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:  # inclui arquivo já removido
+                pass
+        return removed
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_pool, fn, *args)
+
+    async def run(self, retention_days: int) -> Dict[str, Any]:
+        """Executa (ou continua) uma varredura dentro do orçamento de tempo."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+
+        checkpoint = await self._db(self._load_checkpoint)
+        if not checkpoint:
+            cutoff = dt.datetime.utcnow() - dt.timedelta(days=retention_days)
+            checkpoint = {"cutoff": cutoff.isoformat(), "position": None, "events": 0, "files": 0}
+            await self._db(self._save_checkpoint, checkpoint)
+        cutoff = dt.datetime.fromisoformat(checkpoint["cutoff"])
+
+        done = False
+        while time.monotonic() - started < self.time_budget:
+            rows = await self._db(self._next_chunk, cutoff)
+            if not rows:
+                done = True
+                break
+            paths = [p for _, _, image, thumb in rows for p in [image, *variant_paths(thumb)] if p]
+            # Arquivos antes das linhas: se cair no meio, o evento ainda aponta para eles
+            files = await loop.run_in_executor(self._file_pool, self._remove_files, paths)
+            last_created = rows[-1][1]
+            checkpoint.update(
+                position=last_created.isoformat() if last_created else checkpoint["position"],
+                events=checkpoint["events"] + len(rows),
+                files=checkpoint["files"] + files,
+            )
+            ids = [r[0] for r in rows]
+            await self._db(self._delete_rows, ids, dict(checkpoint))
+            # Sem isso o cache de imagens seguiria respondendo 304 para eventos apagados
+            get_image_cache().discard_many(ids)
+            metrics.record_retention_deleted(len(rows), files)
+
+        if done:
+            # Órfãos (miniaturas/imagens sem evento) pela data do arquivo
+            await loop.run_in_executor(self._file_pool, cleanup_old_files, retention_days)
+            await self._db(self._prune_rollups)
+            await self._db(self._save_checkpoint, None)
+
+        elapsed = time.monotonic() - started
+        metrics.record_retention_run(elapsed, done)
+        return {**checkpoint, "finished": done, "seconds": elapsed}
+
+    def close(self):
+        self._file_pool.shutdown(wait=False)
+        self._db_pool.shutdown(wait=False)
+
+
+def create_retention_sweeper() -> RetentionSweeper:
+    """Cria o sweeper com a configuração do ambiente (RETENTION_CHUNK etc.)."""
+    return RetentionSweeper(
+        chunk_size=int(os.getenv("RETENTION_CHUNK", "1000")),
+        time_budget=float(os.getenv("RETENTION_TIME_BUDGET_SEC", "30")),
+    )
@@ -0,0 +1,269 @@
+"""
+Agregados de eventos por câmera, tipo e intervalo (tabela `event_rollups`).
+
+Os contadores são atualizados na mesma transação que insere os eventos
+(`EventSink._insert`), então nunca divergem das linhas gravadas. Como os
+agregados sobrevivem à retenção dos eventos brutos, os gráficos de tendência
+cobrem períodos maiores que RETENTION_DAYS.
+
+Reconstrução a partir dos eventos brutos (ex.: após importar um banco antigo):
+    python -m app.services.rollups --days 90
+    python -m app.services.rollups --start 2024-01-01
+
+Por padrão só dias completos são recalculados: do primeiro dia inteiro ainda
+coberto pela retenção até ontem (o dia corrente continua com o EventSink).
+"""
+import os
+import argparse
+import datetime as dt
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+
+from app.models import SessionLocal, Event, EventRollup, dialect_insert
+
+BUCKETS = ("minute", "hour", "day")
+
+# Eventos ainda na fila do EventSink podem cair no dia anterior logo após a meia-noite
+LIVE_GRACE = dt.timedelta(minutes=10)
+
+# Dias mantidos por granularidade (0 = sem limite)
+ROLLUP_KEEP_DAYS = {
+    "minute": int(os.getenv("ROLLUP_MINUTE_DAYS", "7")),
+    "hour": int(os.getenv("ROLLUP_HOUR_DAYS", "120")),
+    "day": int(os.getenv("ROLLUP_DAY_DAYS", "0")),
+}
+
+RollupKey = Tuple[int, str, dt.datetime, str]
+
+
+def bucket_start(ts: dt.datetime, bucket: str) -> dt.datetime:
+    if bucket == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if bucket == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if bucket == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"intervalo inválido: {bucket}")
+
+
+def count_rows(rows: Iterable[Tuple[int, Optional[str], dt.datetime]]) -> Dict[RollupKey, int]:
+    """Conta (camera_id, event_type, created_at) em todos os intervalos."""
+    counts: Dict[RollupKey, int] = Counter()
+    for camera_id, event_type, created_at in rows:
+        for bucket in BUCKETS:
+            counts[(camera_id, bucket, bucket_start(created_at, bucket), event_type or "")] += 1
+    return counts
+
+
+def apply_counts(db, counts: Dict[RollupKey, int]):
+    """Soma `counts` aos agregados (upsert); não faz commit."""
+    if not counts:
+        return
+    insert = dialect_insert(db)
+    stmt = insert(EventRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["camera_id", "bucket", "bucket_start", "event_type"],
+        set_={"count": EventRollup.count + stmt.excluded.count},
+    )
+    db.execute(stmt, [
+        {"camera_id": cam, "bucket": bucket, "bucket_start": start, "event_type": etype, "count": n}
+        for (cam, bucket, start, etype), n in counts.items()
+    ])
+
+
+def record_events(db, events: Iterable[Event]):
+    """Atualiza os agregados com eventos recém-inseridos (mesma transação)."""
+    apply_counts(db, count_rows((e.camera_id, e.ppe_status, e.created_at) for e in events))
+
+
+def forget_events(db, events: Iterable[Event]):
+    """
+    Desconta dos agregados eventos excluídos manualmente (mesma transação).
+
+    Só atualiza intervalos existentes: os que já foram podados por
+    ROLLUP_KEEP_DAYS não são recriados com contagem negativa. A retenção não
+    usa isto, porque os agregados devem sobreviver aos eventos brutos.
+    """
+    counts = count_rows((e.camera_id, e.ppe_status, e.created_at) for e in events)
+    for (cam, bucket, start, etype), n in counts.items():
+        db.execute(
+            update(EventRollup)
+            .where(
+                EventRollup.camera_id == cam,
+                EventRollup.bucket == bucket,
+                EventRollup.bucket_start == start,
+                EventRollup.event_type == etype,
+            )
+            .values(count=EventRollup.count - n)
+        )
+
+
+def total_count(db) -> int:
+    """Total de eventos registrados, somado dos agregados diários."""
+    return int(
+        db.query(func.coalesce(func.sum(EventRollup.count), 0)).filter(EventRollup.bucket == "day").scalar()
+    )
+
+
+def count_since(db, since: dt.datetime) -> int:
+    """
+    Eventos a partir de `since`: horas completas pelos agregados por hora e
+    o trecho inicial, antes da primeira hora cheia, pelos agregados por minuto.
+    """
+    first_hour = bucket_start(since, "hour")
+    if first_hour < since:
+        first_hour += dt.timedelta(hours=1)
+    hours = (
+        db.query(func.coalesce(func.sum(EventRollup.count), 0))
+        .filter(EventRollup.bucket == "hour", EventRollup.bucket_start >= first_hour)
+        .scalar()
+    )
+    minutes = (
+        db.query(func.coalesce(func.sum(EventRollup.count), 0))
+        .filter(
+            EventRollup.bucket == "minute",
+            EventRollup.bucket_start >= bucket_start(since, "minute"),
+            EventRollup.bucket_start < first_hour,
+        )
+        .scalar()
+    )
+    return int(hours) + int(minutes)
+
+
+def rebuild(db, start: dt.datetime, end: dt.datetime, chunk_size: int = 5000) -> int:
+    """
+    Recalcula os agregados de [start, end) a partir dos eventos brutos.
+
+    O intervalo é alinhado ao dia para não deixar intervalos parciais. Só faz
+    sentido para dias completos, ainda cobertos pela retenção e fora do dia
+    corrente (ver `rebuild_window`). Retorna quantos eventos foram contados.
+    """
+    start = bucket_start(start, "day")
+    end = bucket_start(end - dt.timedelta(microseconds=1), "day") + dt.timedelta(days=1)
+    db.execute(delete(EventRollup).where(EventRollup.bucket_start >= start, EventRollup.bucket_start < end))
+    stmt = (
+        select(Event.camera_id, Event.ppe_status, Event.created_at)
+        .where(Event.created_at >= start, Event.created_at < end)
+        .execution_options(yield_per=chunk_size)
+    )
+    total = 0
+    counts: Dict[RollupKey, int] = Counter()
+    for part in db.execute(stmt).partitions():
+        counts.update(count_rows(part))
+        total += len(part)
+    apply_counts(db, counts)
+    db.commit()
+    return total
+
+
+def rebuild_window(db, days: int, now: Optional[dt.datetime] = None,
+                   start: Optional[dt.datetime] = None) -> Tuple[dt.datetime, dt.datetime]:
+    """
+    Intervalo seguro para `rebuild`: [start, end) em dias completos.
+
+    O início é o primeiro dia inteiro depois do corte da retenção (`days`) e
+    do evento mais antigo ainda no banco, porque o dia em que o corte cai já
+    foi parcialmente apagado e seria recontado para menos. O fim exclui o dia
+    corrente, cujos agregados o EventSink está atualizando ao mesmo tempo.
+    """
+    now = now or dt.datetime.utcnow()
+    end = bucket_start(now - LIVE_GRACE, "day")
+    if start is None:
+        floor = now - dt.timedelta(days=days)
+        oldest = db.query(func.min(Event.created_at)).scalar()
+        if oldest is not None and oldest > floor:
+            floor = oldest
+        start = bucket_start(floor, "day")
+        if start < floor:
+            start += dt.timedelta(days=1)
+    return bucket_start(start, "day"), end
+
+
+def prune(db, now: Optional[dt.datetime] = None) -> int:
+    """Remove agregados mais velhos que ROLLUP_KEEP_DAYS de cada granularidade."""
+    now = now or dt.datetime.utcnow()
+    removed = 0
+    for bucket, days in ROLLUP_KEEP_DAYS.items():
+        if days <= 0:
+            continue
+        result = db.execute(
+            delete(EventRollup).where(
+                EventRollup.bucket == bucket,
+                EventRollup.bucket_start < now - dt.timedelta(days=days),
+            )
+        )
+        removed += result.rowcount or 0
+    db.commit()
+    return removed
+
+
+def trend(
+    db,
+    bucket: str,
+    start: dt.datetime,
+    end: dt.datetime,
+    camera_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    group_by: Optional[str] = None,
+) -> List[dict]:
+    """Série de contagens por intervalo, opcionalmente por câmera ou tipo."""
+    if bucket not in BUCKETS:
+        raise ValueError(f"intervalo inválido: {bucket}")
+    cols = [EventRollup.bucket_start]
+    if group_by == "camera":
+        cols.append(EventRollup.camera_id)
+    elif group_by == "event_type":
+        cols.append(EventRollup.event_type)
+    elif group_by:
+        raise ValueError(f"agrupamento inválido: {group_by}")
+
+    stmt = select(*cols, func.sum(EventRollup.count)).where(
+        EventRollup.bucket == bucket,
+        EventRollup.bucket_start >= bucket_start(start, bucket),
+        EventRollup.bucket_start < end,
+    )
+    if camera_id:
+        stmt = stmt.where(EventRollup.camera_id == camera_id)
+    if event_type:
+        stmt = stmt.where(EventRollup.event_type == event_type)
+    stmt = stmt.group_by(*cols).order_by(*cols)
+
+    out = []
+    for row in db.execute(stmt):
+        item = {"bucket_start": row[0], "count": int(row[-1])}
+        if group_by == "camera":
+            item["camera_id"] = row[1]
+        elif group_by == "event_type":
+            item["event_type"] = row[1]
+        out.append(item)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstrói os agregados de eventos a partir dos eventos brutos")
+    parser.add_argument("--days", type=int, default=None, help="Retenção em dias (padrão: a configurada)")
+    parser.add_argument("--start", default=None, help="Primeiro dia (ISO) a recalcular, se os eventos dele estão completos")
+    args = parser.parse_args(argv)
+
+    from app.models import init_db, Setting
+    init_db()
+    db = SessionLocal()
+    try:
+        days = args.days
+        if days is None:
+            setting = db.query(Setting).filter(Setting.key == "retention_days").first()
+            days = int(setting.value) if setting else int(os.getenv("RETENTION_DAYS", "15"))
+        start, end = rebuild_window(db, days, start=dt.datetime.fromisoformat(args.start) if args.start else None)
+        if start >= end:
+            print("Nenhum dia completo para recalcular")
+            return
+        total = rebuild(db, start, end)
+    finally:
+        db.close()
+    print(f"Agregados de {start:%Y-%m-%d} a {end - dt.timedelta(days=1):%Y-%m-%d} recalculados a partir de {total} eventos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.services.detections import Detections
+from app.services.preprocess import jpeg_size, reduced_decode_flag
+
+PREVIEW_WIDTHS = (320, 480, 640, 960)
+
+# Cores BGR por classe; demais classes usam cinza
+BOX_COLORS = {"person": (255, 160, 0), "helmet": (0, 200, 0), "mask": (0, 200, 200)}
+
+
+def render_preview(jpg: bytes, dets: Optional[Detections], width: int, quality: int) -> bytes:
+    """Reduz o snapshot para `width` (redução DCT na decodificação) e desenha as caixas."""
+    size = jpeg_size(jpg)
+    flag = reduced_decode_flag(size[0], size[1], width) if size else cv2.IMREAD_COLOR
+    img = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), flag)
+    if img is None:
+        raise ValueError("snapshot inválido")
+    orig_w = size[0] if size else img.shape[1]
+    if img.shape[1] != width:
+        height = max(1, round(img.shape[0] * width / img.shape[1]))
+        img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+    if dets is not None and len(dets):
+        scale = width / orig_w
+        for (x1, y1, x2, y2), cid in zip((dets.boxes * scale).astype(int), dets.class_ids):
+            name = dets.names[int(cid)] if int(cid) < len(dets.names) else str(cid)
+            color = BOX_COLORS.get(name, (160, 160, 160))
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(img, name, (x1, max(12, y1 - 4)), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1, cv2.LINE_AA)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("falha ao codificar a prévia")
+    return buf.tobytes()
+
+
+class Snapshot:
+    __slots__ = ("seq", "ts", "jpg", "dets", "previews")
+
+    def __init__(self, seq: int, jpg: bytes, dets: Optional[Detections]):
+        self.seq = seq
+        self.ts = time.time()
+        self.jpg = jpg
+        self.dets = dets
+        self.previews: Dict[Tuple[int, bool], asyncio.Future] = {}
+
+
+class SnapshotCache:
+    """
+    Últimos snapshots de cada câmera, alimentados pelo `PictureWorker`.
+
+    Guarda os `depth` frames mais recentes por câmera (JPEG original + as
+    detecções). As prévias reduzidas são codificadas sob demanda, uma única
+    vez por frame e por (largura, caixas), num pool de threads, e o mesmo
+    resultado é entregue a todos os clientes; sem ninguém assistindo nada é
+    codificado. Assim a tela de monitoramento não faz requisições extras ao
+    NVR, independente do número de operadores.
+    """
+
+    def __init__(self, depth: int = 2, quality: int = 70, encode_workers: int = 2):
+        self.depth = max(1, depth)
+        self.quality = quality
+        self._frames: Dict[int, Deque[Snapshot]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix="ppe-preview")
+
+    def put(self, camera_id: int, jpg: bytes, dets: Optional[Detections] = None):
+        with self._lock:
+            self._seq += 1
+            ring = self._frames.get(camera_id)
+            if ring is None:
+                ring = self._frames[camera_id] = deque(maxlen=self.depth)
+            ring.append(Snapshot(self._seq, jpg, dets))
+
+    def latest(self, camera_id: int) -> Optional[Snapshot]:
+        ring = self._frames.get(camera_id)
+        return ring[-1] if ring else None
+
+    def drop(self, camera_id: int):
+        with self._lock:
+            self._frames.pop(camera_id, None)
+
+    @staticmethod
+    def preview_width(width: Optional[int]) -> int:
+        """Larguras fixas para que clientes diferentes compartilhem a mesma codificação."""
+        if not width:
+            return PREVIEW_WIDTHS[0]
+        return min(PREVIEW_WIDTHS, key=lambda w: abs(w - width))
+
+    async def preview(self, snap: Snapshot, width: int, boxes: bool = False) -> bytes:
+        key = (width, boxes)
+        fut = snap.previews.get(key)
+        if fut is None:
+            fut = snap.previews[key] = asyncio.get_running_loop().run_in_executor(
+                self._pool, render_preview, snap.jpg, snap.dets if boxes else None, width, self.quality
+            )
+        return await fut
+
+    async def wait_newer(self, camera_id: int, after_seq: int, timeout: float, poll: float = 0.1) -> Optional[Snapshot]:
+        """Espera um frame com seq > `after_seq` (None se não chegar em `timeout`)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            snap = self.latest(camera_id)
+            if snap is not None and snap.seq > after_seq:
+                return snap
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(poll)
+
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        now = time.time()
+        return {
+            cam: {"seq": ring[-1].seq, "age_sec": round(now - ring[-1].ts, 3), "bytes": len(ring[-1].jpg)}
+            for cam, ring in list(self._frames.items()) if ring
+        }
+
+
+_cache: Optional[SnapshotCache] = None
+
+
+def get_snapshot_cache() -> SnapshotCache:
+    """Cache de snapshots compartilhado do processo (SNAPSHOT_DEPTH, PREVIEW_QUALITY)."""
+    global _cache
+    if _cache is None:
+        _cache = SnapshotCache(
+            depth=int(os.getenv("SNAPSHOT_DEPTH", "2")),
+            quality=int(os.getenv("PREVIEW_QUALITY", "70")),
+            encode_workers=int(os.getenv("PREVIEW_WORKERS", "2")),
+        )
+    return _cache
@@ -0,0 +1,166 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from PIL import Image
+
+THUMB_SIZES = tuple(sorted(int(s) for s in os.getenv("THUMB_SIZES", "160,320,640").split(",") if s.strip()))
+DEFAULT_THUMB_SIZE = 320 if 320 in THUMB_SIZES else THUMB_SIZES[len(THUMB_SIZES) // 2]
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+
+# Imagens de evento nunca mudam: o navegador pode guardar por um ano
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def variant_path(thumb_path: str, size: int) -> str:
+    """Caminho da miniatura de `size` a partir de `Event.thumb_path` (tamanho padrão)."""
+    base, ext = os.path.splitext(thumb_path)
+    return f"{base.rsplit('_', 1)[0]}_{size}{ext}"
+
+
+def variant_paths(thumb_path: Optional[str]) -> List[str]:
+    return [variant_path(thumb_path, s) for s in THUMB_SIZES] if thumb_path else []
+
+
+def make_thumbnails(image_bytes: bytes, thumbs_dir: str, stem: str) -> str:
+    """
+    Gera as miniaturas (lado maior = cada tamanho de THUMB_SIZES) e retorna o
+    caminho da miniatura padrão. O JPEG é decodificado uma vez, já reduzido
+    pelo DCT (`draft`), e cada tamanho sai do anterior, do maior ao menor.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("RGB", (THUMB_SIZES[-1], THUMB_SIZES[-1]))
+    image = image.convert("RGB")
+    paths = {}
+    for size in reversed(THUMB_SIZES):
+        image.thumbnail((size, size), Image.BILINEAR)
+        path = os.path.join(thumbs_dir, f"{stem}_{size}.jpg")
+        image.save(path, "JPEG", quality=THUMB_QUALITY, optimize=False)
+        paths[size] = path
+    return paths[DEFAULT_THUMB_SIZE]
+
+
+class ThumbnailGenerator:
+    """
+    Pool de threads que gera miniaturas fora do caminho de detecção. O pool é
+    criado no primeiro `submit`, então o gerador volta a funcionar depois de
+    `close()` (EventSink parado e iniciado de novo).
+    """
+
+    def __init__(self, thumbs_dir: str = "./data/thumbs", workers: int = 2):
+        self.thumbs_dir = thumbs_dir
+        self.workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, image_bytes: bytes, image_path: str):
+        os.makedirs(self.thumbs_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ppe-thumbs")
+        return self._pool.submit(make_thumbnails, image_bytes, self.thumbs_dir, stem)
+
+    def close(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def create_thumbnail_generator() -> ThumbnailGenerator:
+    return ThumbnailGenerator(workers=int(os.getenv("THUMB_WORKERS", "2")))
+
+
+class ImageCache:
+    """
+    Cache LRU (id do evento, tamanho) -> (caminho, ETag, Last-Modified).
+
+    Depois da primeira consulta, pedidos condicionais (If-None-Match /
+    If-Modified-Since) são respondidos com 304 sem buscar o evento no banco.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[str, str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[int, int]) -> Optional[Tuple[str, str, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple[int, int], path: str) -> Optional[Tuple[str, str, str]]:
+        """Registra o arquivo; None se ele não existir."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry = (path, f'"{key[0]:x}-{key[1]}-{st.st_mtime_ns:x}-{st.st_size:x}"', formatdate(st.st_mtime, usegmt=True))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def discard(self, event_id: int):
+        self.discard_many([event_id])
+
+    def discard_many(self, event_ids):
+        """Remove as entradas dos eventos (ex.: apagados pela retenção)."""
+        ids = set(event_ids)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] in ids]:
+                del self._entries[key]
+
+
+def not_modified(headers, etag: str, last_modified: str) -> bool:
+    inm = headers.get("if-none-match")
+    if inm is not None:
+        return etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*"
+    return headers.get("if-modified-since") == last_modified
+
+
+def cache_headers(etag: str, last_modified: str) -> Dict[str, str]:
+    return {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": CACHE_CONTROL}
+
+
+_image_cache: Optional[ImageCache] = None
+
+
+def get_image_cache() -> ImageCache:
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = ImageCache(int(os.getenv("IMAGE_CACHE_ENTRIES", "4096")))
+    return _image_cache
+
+
+def image_response(request: Request, event_id: int, size: int, lookup: Callable[[], Optional[str]]) -> Response:
+    """
+    Resposta de imagem de evento com ETag/Last-Modified e cache longo.
+
+    `lookup` (consulta ao banco) só é chamado quando o par (evento, tamanho)
+    ainda não está no cache; `size=0` é a imagem original.
+    """
+    cache = get_image_cache()
+    entry = cache.get((event_id, size))
+    if entry is None:
+        path = lookup()
+        entry = cache.put((event_id, size), path) if path else None
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Imagem não encontrada")
+    path, etag, last_modified = entry
+    # Confere o arquivo antes do 304: a retenção de outro nó pode tê-lo apagado
+    if not os.path.exists(path):
+        cache.discard(event_id)
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+    headers = cache_headers(etag, last_modified)
+    if not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
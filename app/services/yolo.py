@@ -1,16 +1,26 @@
 import os
+import time
+import asyncio
 import cv2
-import torch
-from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-class YoloDetector:
-    def __init__(self, model_path: str, device: str = None, conf_threshold: float = 0.4):
-        self.model_path = Path(model_path)
+from app.services import metrics
+from app.services.detections import Detections, names_tuple
+from app.services.detectors import BaseDetector
+from app.services.executor import create_backend
+from app.services.model_registry import get_model_registry
+from app.services.preprocess import INPUT_SIZE, PreparedFrame
+
+class YoloDetector(BaseDetector):
+    """Detector PyTorch: carrega o `.pt` via torch.hub (ultralytics/yolov5)."""
+
+    backend = "torch"
+
+    def __init__(self, model_path: str, device: str = None, conf_threshold: float = 0.4, input_size: int = INPUT_SIZE):
+        import torch
+
+        super().__init__(model_path, conf_threshold=conf_threshold, input_size=input_size)
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.conf_threshold = conf_threshold
-        if not self.model_path.exists():
-            raise FileNotFoundError(f"Modelo YOLO não encontrado: {self.model_path}")
         self.model = torch.hub.load(
             "ultralytics/yolov5",
             "custom",
@@ -18,36 +28,207 @@ class YoloDetector:
             force_reload=False
         ).to(self.device)
         self.model.conf = self.conf_threshold
+        self.names = names_tuple(self.model.names)
 
-    def detect(self, bgr_image) -> List[Dict[str, Any]]:
-        """Recebe imagem BGR (OpenCV) e retorna lista de detecções."""
-        if bgr_image is None or bgr_image.size == 0:
-            return []
+    def detect_batch(self, images, conf_threshold: Optional[float] = None) -> List[Detections]:
+        """
+        Roda uma única inferência para várias imagens e retorna as detecções de cada uma.
 
-        # Converte para RGB
-        rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+        Aceita imagens BGR (OpenCV) ou `PreparedFrame` (já em RGB/letterbox);
+        para estes as caixas são devolvidas na resolução original do snapshot.
+        """
+        conf = self.conf_threshold if conf_threshold is None else conf_threshold
+        outputs: List[Detections] = [Detections.empty(self.names) for _ in images]
+
+        # Converte para RGB, ignorando imagens vazias
+        valid_idx = [i for i, img in enumerate(images) if img is not None and img.size > 0]
+        if not valid_idx:
+            return outputs
+        inputs = [
+            images[i].image if isinstance(images[i], PreparedFrame) else cv2.cvtColor(images[i], cv2.COLOR_BGR2RGB)
+            for i in valid_idx
+        ]
 
         # Inference
-        results = self.model(rgb_image, size=640)
-        detections = results.pandas().xyxy[0].to_dict(orient="records")
-
-        output = []
-        for det in detections:
-            if det["confidence"] < self.conf_threshold:
-                continue
-            output.append({
-                "class": det["name"],
-                "confidence": float(det["confidence"]),
-                "bbox": [float(det["xmin"]), float(det["ymin"]), float(det["xmax"]), float(det["ymax"])]
-            })
-        return output
-
-    def detect_from_path(self, image_path: str) -> List[Dict[str, Any]]:
-        """Recebe caminho de imagem e retorna detecções."""
-        if not os.path.exists(image_path):
-            return []
-        bgr_image = cv2.imread(image_path)
-        return self.detect(bgr_image)
+        self.model.conf = conf
+        results = self.model(inputs, size=self.input_size)
+
+        for i, pred in zip(valid_idx, results.xyxy):
+            dets = Detections.from_xyxy(pred.cpu().numpy(), self.names).filter(conf)
+            if len(dets) and isinstance(images[i], PreparedFrame):
+                dets.boxes = images[i].to_original(dets.boxes)
+            outputs[i] = dets
+        return outputs
+
+
+class InferenceEngine:
+    """
+    Serviço de inferência compartilhado entre todos os workers.
+
+    Os workers enviam frames já decodificados via `detect()` e o engine os
+    agrupa em micro-batches de até `max_batch_size` imagens, esperando no
+    máximo `max_wait_ms` pelo batch encher. O limiar de confiança de cada
+    câmera é aplicado depois da inferência, sobre as detecções daquele frame.
+
+    A execução fica a cargo de um backend (inline, thread ou process, ver
+    `app.services.executor`); até `backend.max_concurrency` batches rodam em
+    paralelo. Cada worker aguarda o resultado antes de buscar o próximo
+    frame, então uma câmera tem no máximo um frame na fila; frames de quem
+    desistiu de esperar (worker cancelado) são ignorados.
+    """
+
+    def __init__(self, backend, max_batch_size: int = 8, max_wait_ms: float = 25.0):
+        self.backend = backend
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        # Uma fila (e um coletor) por modelo; os batches nunca misturam modelos
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _queue_for(self, model_path: str) -> asyncio.Queue:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(getattr(self.backend, "max_concurrency", 1))
+        task = self._tasks.get(model_path)
+        if task is None or task.done():
+            self._queues[model_path] = asyncio.Queue()
+            self._tasks[model_path] = asyncio.get_running_loop().create_task(self._run(model_path))
+        return self._queues[model_path]
+
+    async def decode(self, jpg: bytes, decoder=None):
+        """
+        Decodifica um JPEG no backend configurado. Com um `FrameDecoder`
+        devolve o `PreparedFrame` reduzido; sem ele, a imagem BGR completa.
+        """
+        if decoder is not None:
+            return await self.backend.call(decoder.decode, jpg)
+        return await self.backend.decode(jpg)
+
+    async def preprocess(self, fn, *args):
+        """Roda uma etapa leve antes da inferência no pool de decodificação."""
+        return await self.backend.call(fn, *args)
+
+    async def detect(self, image, threshold: float, camera_id: Any = None, model_path: Optional[str] = None) -> Detections:
+        """
+        Enfileira um frame (BGR ou PreparedFrame) e aguarda as detecções com
+        confiança >= threshold. `model_path` escolhe o modelo (padrão: MODEL_PATH).
+        """
+        if image is None or image.size == 0:
+            return Detections.empty()
+        queue = self._queue_for(model_path or self.backend.model_path)
+        fut = asyncio.get_running_loop().create_future()
+        await queue.put((image, threshold, camera_id, fut, time.perf_counter()))
+        return await fut
+
+    def retain_model(self, model_path: Optional[str] = None):
+        """Registra que uma câmera passou a usar o modelo (padrão: MODEL_PATH)."""
+        get_model_registry().retain(model_path or self.backend.model_path)
+
+    def release_model(self, model_path: Optional[str] = None):
+        get_model_registry().release(model_path or self.backend.model_path)
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        self._queues.clear()
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.backend.close()
+
+    async def _next_item(self, queue: asyncio.Queue, timeout: Optional[float] = None):
+        """Próximo item ainda válido da fila (ignora frames de quem desistiu)."""
+        while True:
+            if timeout is None:
+                item = await queue.get()
+            else:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            if not item[3].done():
+                return item
+
+    async def _collect_batch(self, queue: asyncio.Queue, first) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [first]
+        # Primeiro o que já acumulou na fila, depois espera até max_wait
+        while len(batch) < self.max_batch_size and not queue.empty():
+            item = queue.get_nowait()
+            if not item[3].done():
+                batch.append(item)
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await self._next_item(queue, timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, model_path: str):
+        queue = self._queues[model_path]
+        while True:
+            first = await self._next_item(queue)
+            # Só ocupa um slot do backend quando já há trabalho para este modelo
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch(queue, first)
+            except BaseException:
+                self._slots.release()
+                raise
+            asyncio.get_running_loop().create_task(self._run_batch(model_path, batch))
+
+    async def _run_batch(self, model_path: str, batch: list):
+        try:
+            batch = [item for item in batch if not item[3].done()]
+            if not batch:
+                return
+            started = time.perf_counter()
+            for item in batch:
+                metrics.record_queue_wait("inference", started - item[4])
+            metrics.record_batch_size(len(batch))
+            # Roda com o menor limiar do batch; cada câmera filtra o seu depois
+            conf = min(item[1] for item in batch)
+            try:
+                results = await self.backend.detect_batch([item[0] for item in batch], conf, model_path)
+            except Exception as exc:
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_exception(exc)
+                return
+
+            for item, dets in zip(batch, results):
+                if not item[3].done():
+                    item[3].set_result(dets.filter(item[1]))
+        finally:
+            self._slots.release()
+
+
+_engine: Optional[InferenceEngine] = None
+
+
+def get_inference_engine() -> InferenceEngine:
+    """Retorna o engine de inferência compartilhado do processo."""
+    global _engine
+    if _engine is None:
+        _engine = InferenceEngine(
+            backend=create_backend(),
+            max_batch_size=int(os.getenv("INFER_MAX_BATCH", "8")),
+            max_wait_ms=float(os.getenv("INFER_MAX_WAIT_MS", "25")),
+        )
+    return _engine
+
+
+async def shutdown_inference_engine():
+    """Para os coletores e fecha os pools do engine (o próximo uso cria outro)."""
+    global _engine
+    engine, _engine = _engine, None
+    if engine is not None:
+        await engine.stop()
 
 # Exemplo de uso direto (debug)
 if __name__ == "__main__":
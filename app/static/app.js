@@ -5,20 +5,41 @@ document.addEventListener("DOMContentLoaded", function () {
     const eventsList = document.getElementById("events-list");
     if (eventsList) {
         const wsProtocol = window.location.protocol === "https:" ? "wss:" : "ws:";
-        const wsUrl = `${wsProtocol}//${window.location.host}/ws/events`;
-        const socket = new WebSocket(wsUrl);
+        // data-cameras="1,2" no elemento limita o feed a essas câmeras
+        const cameras = eventsList.dataset.cameras || "";
+        let lastEventId = null;
+        let retryMs = 1000;
 
-        socket.onmessage = function (event) {
-            const msg = JSON.parse(event.data);
-            if (msg && msg.kind === "event" && msg.data) {
-                addEventToList(msg.data);
-            }
-        };
+        function connect() {
+            const params = new URLSearchParams();
+            if (cameras) params.set("camera_id", cameras);
+            if (lastEventId !== null) params.set("last_event_id", lastEventId);
+            const query = params.toString();
+            const socket = new WebSocket(`${wsProtocol}//${window.location.host}/ws/events${query ? "?" + query : ""}`);
+
+            socket.onopen = function () {
+                retryMs = 1000;
+            };
+
+            socket.onmessage = function (event) {
+                const msg = JSON.parse(event.data);
+                if (msg && msg.kind === "event" && msg.data) {
+                    lastEventId = msg.data.id;
+                    addEventToList(msg.data);
+                } else if (msg && msg.kind === "gap") {
+                    console.warn("Feed perdeu eventos durante a desconexão; recarregue para a lista completa.");
+                }
+            };
+
+            socket.onclose = function () {
+                // Reconecta retomando do último evento recebido (sem recarregar a página)
+                console.warn(`Conexão WebSocket fechada. Reconectando em ${retryMs / 1000}s...`);
+                setTimeout(connect, retryMs);
+                retryMs = Math.min(retryMs * 2, 30000);
+            };
+        }
 
-        socket.onclose = function () {
-            console.warn("Conexão WebSocket fechada. Tentando reconectar em 5s...");
-            setTimeout(() => location.reload(), 5000);
-        };
+        connect();
     }
 
     function addEventToList(ev) {
@@ -44,6 +65,30 @@ document.addEventListener("DOMContentLoaded", function () {
         }
     }
 
+    // Prévias da grade: um GET condicional por quadro (304 enquanto o frame não muda).
+    // Com muitas câmeras evita abrir um MJPEG por quadro (limite de conexões do navegador).
+    const previews = document.querySelectorAll("img[data-preview]");
+    if (previews.length) {
+        const etags = new Map();
+        async function refreshPreview(img) {
+            try {
+                const resp = await fetch(img.dataset.preview, { cache: "no-cache" });
+                const etag = resp.headers.get("ETag");
+                if (!resp.ok || (etag && etags.get(img) === etag)) return;
+                etags.set(img, etag);
+                const url = URL.createObjectURL(await resp.blob());
+                const old = img.src;
+                img.src = url;
+                if (old && old.startsWith("blob:")) URL.revokeObjectURL(old);
+            } catch (e) {
+                // NVR/worker indisponível: mantém o último quadro
+            }
+        }
+        const refreshAll = () => previews.forEach(refreshPreview);
+        refreshAll();
+        setInterval(refreshAll, 2000);
+    }
+
     // Botão de exportar relatório (se existir)
     const exportBtn = document.getElementById("export-report");
     if (exportBtn) {
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import asyncio
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import update
+
+from app.models import SessionLocal, Event
+from app.services import metrics, rollups
+from app.services.event_hub import EventHub, get_event_hub
+from app.services.thumbnails import ThumbnailGenerator, create_thumbnail_generator
+
+# Marca de fim de fila enviada por stop()
+_STOP = object()
+
+
+@dataclass
+class EventRecord:
+    """Evento detectado pelo worker, ainda não persistido."""
+
+    camera_id: int
+    event_type: str
+    image_bytes: bytes
+    summary: Dict[str, Any]
+    score: float = 1.0
+    timestamp: dt.datetime = field(default_factory=dt.datetime.utcnow)
+    image_path: Optional[str] = None
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class EventSink:
+    """
+    Estágio de persistência de eventos, separado da detecção.
+
+    Os workers chamam `submit()`, que só enfileira (fila limitada a
+    `max_queue`). Um consumidor agrupa os eventos até `batch_size` itens ou
+    `flush_interval` segundos, grava os JPEGs num pool de threads e insere as
+    linhas de `Event` (e os agregados de `event_rollups`) numa única
+    transação, numa thread dedicada de escrita.
+
+    Backpressure: com a fila cheia, `submit()` espera até `put_timeout`
+    segundos; se ainda não houver espaço o evento é descartado e contado em
+    `events_dropped_total`, para que uma tempestade de alarmes não trave a
+    detecção.
+
+    Depois do commit, cada evento é publicado em `hub` (feed ao vivo do
+    /ws/events) já com o id gravado, e as miniaturas são geradas em segundo
+    plano por `thumbnails`, que depois preenche `Event.thumb_path`.
+
+    `stop()` avisa o consumidor, que grava o lote em andamento e esvazia a
+    fila antes de sair; só depois de `stop_timeout` segundos a task é
+    cancelada.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        put_timeout: float = 0.5,
+        io_workers: int = 4,
+        images_dir: str = "./data/images",
+        session_factory=SessionLocal,
+        hub: Optional[EventHub] = None,
+        thumbnails: Optional[ThumbnailGenerator] = None,
+        stop_timeout: float = 10.0,
+    ):
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.images_dir = images_dir
+        self.session_factory = session_factory
+        self.hub = hub
+        self.thumbnails = thumbnails
+        self.stop_timeout = stop_timeout
+        self._thumb_tasks = set()
+        self.io_workers = io_workers
+        # Criados em start() e encerrados em stop(): o sink pode ser reiniciado
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._db_pool: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._pending: Dict[int, int] = {}
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            os.makedirs(self.images_dir, exist_ok=True)
+            self._stopping = False
+            if self._io_pool is None:
+                self._io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="ppe-event-io")
+                self._db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ppe-event-db")
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Para o consumidor e grava o que ainda estiver na fila."""
+        if self._task is not None:
+            self._stopping = True
+            try:
+                self._queue.put_nowait(_STOP)
+            except asyncio.QueueFull:
+                pass  # fila cheia: o consumidor vê `_stopping` ao esvaziá-la
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), self.stop_timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+            self._task = None
+        if self._queue is not None:
+            remaining = []
+            while not self._queue.empty():
+                record = self._queue.get_nowait()
+                if record is not _STOP:
+                    remaining.append(record)
+            for i in range(0, len(remaining), self.batch_size):
+                await self._flush(remaining[i:i + self.batch_size])
+        if self._thumb_tasks:
+            await asyncio.gather(*self._thumb_tasks, return_exceptions=True)
+        if self.thumbnails is not None:
+            self.thumbnails.close()
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=True)
+            self._db_pool.shutdown(wait=True)
+            self._io_pool = self._db_pool = None
+
+    def _track(self, camera_id: int, delta: int):
+        count = max(0, self._pending.get(camera_id, 0) + delta)
+        self._pending[camera_id] = count
+        metrics.record_queue_size(str(camera_id), count)
+
+    async def submit(self, record: EventRecord) -> bool:
+        """Enfileira um evento. Retorna False se foi descartado por fila cheia."""
+        if self._queue is None:
+            await self.start()
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(record), self.put_timeout)
+            except asyncio.TimeoutError:
+                metrics.record_event_dropped(str(record.camera_id))
+                return False
+        self._track(record.camera_id, 1)
+        return True
+
+    async def _collect(self) -> List[EventRecord]:
+        loop = asyncio.get_running_loop()
+        batch: List[EventRecord] = []
+        record = await self._queue.get()
+        deadline = loop.time() + self.flush_interval
+        while record is not _STOP:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                break
+            try:
+                if self._stopping:
+                    # Encerrando: não espera o flush_interval, só esvazia a fila
+                    record = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._collect()
+            if not batch:
+                continue
+            try:
+                await self._flush(batch)
+            except Exception:
+                # Falha de gravação não pode derrubar o consumidor
+                for record in batch:
+                    metrics.record_event_dropped(str(record.camera_id))
+
+    def _write_image(self, record: EventRecord) -> str:
+        ts = record.timestamp.strftime("%Y%m%d_%H%M%S_%f")
+        path = os.path.join(self.images_dir, f"cam{record.camera_id}_{ts}.jpg")
+        with open(path, "wb") as f:
+            f.write(record.image_bytes)
+        return path
+
+    def _insert(self, batch: List[EventRecord]) -> List[int]:
+        db = self.session_factory()
+        try:
+            rows = [
+                Event(
+                    camera_id=r.camera_id,
+                    timestamp=r.timestamp,
+                    created_at=r.timestamp,
+                    image_path=r.image_path,
+                    ppe_status=r.event_type,
+                    summary=json.dumps(r.summary, ensure_ascii=False, default=str),
+                )
+                for r in batch
+            ]
+            db.add_all(rows)
+            rollups.record_events(db, rows)
+            db.commit()
+            return [row.id for row in rows]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _set_thumbs(self, rows: List[Dict[str, Any]]):
+        db = self.session_factory()
+        try:
+            db.execute(update(Event), rows)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _make_thumbs(self, batch: List[EventRecord], ids: List[int]):
+        results = await asyncio.gather(
+            *(asyncio.wrap_future(self.thumbnails.submit(r.image_bytes, r.image_path)) for r in batch),
+            return_exceptions=True,
+        )
+        rows = [{"id": i, "thumb_path": p} for i, p in zip(ids, results) if isinstance(p, str)]
+        if rows:
+            await asyncio.get_running_loop().run_in_executor(self._db_pool, self._set_thumbs, rows)
+
+    async def _flush(self, batch: List[EventRecord]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        for record in batch:
+            metrics.record_queue_wait("events", started - record.queued_at)
+        try:
+            paths = await asyncio.gather(
+                *(loop.run_in_executor(self._io_pool, self._write_image, r) for r in batch)
+            )
+            for record, path in zip(batch, paths):
+                record.image_path = path
+            ids = await loop.run_in_executor(self._db_pool, self._insert, batch)
+            metrics.record_stage("persist", time.perf_counter() - started)
+            if self.thumbnails is not None:
+                task = loop.create_task(self._make_thumbs(batch, ids))
+                self._thumb_tasks.add(task)
+                task.add_done_callback(self._thumb_tasks.discard)
+            if self.hub is not None:
+                for record, event_id in zip(batch, ids):
+                    self.hub.publish(event_id, record.camera_id, {
+                        "id": event_id,
+                        "camera_id": record.camera_id,
+                        "ts": record.timestamp.isoformat() + "Z",
+                        "event_type": record.event_type,
+                        "persons": record.summary.get("total_persons", 0),
+                        "violations": record.summary.get("total_violations", 0),
+                    })
+        finally:
+            for record in batch:
+                self._track(record.camera_id, -1)
+
+
+def create_event_sink() -> EventSink:
+    """Cria o sink com a configuração do ambiente (EVENT_QUEUE_MAX etc.)."""
+    return EventSink(
+        max_queue=int(os.getenv("EVENT_QUEUE_MAX", "1000")),
+        batch_size=int(os.getenv("EVENT_BATCH_SIZE", "50")),
+        flush_interval=float(os.getenv("EVENT_FLUSH_SEC", "1.0")),
+        put_timeout=float(os.getenv("EVENT_PUT_TIMEOUT_SEC", "0.5")),
+        stop_timeout=float(os.getenv("EVENT_STOP_TIMEOUT_SEC", "10")),
+        hub=get_event_hub(),
+        thumbnails=create_thumbnail_generator(),
+    )
@@ -1,81 +1,532 @@
+import os
+import time
+import logging
+import random
+import asyncio
 import threading
-from typing import Dict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
 from sqlalchemy.orm import Session
 
 from app.models import SessionLocal, Camera
+from app.services import metrics
+from app.services.camera_feed import CameraChange, get_camera_feed
+from app.services.isapi import create_nvr_pool
+from app.services.metrics import get_metrics
+from app.services.snapshots import get_snapshot_cache
+from app.workers.event_sink import create_event_sink
 from app.workers.picture_worker import PictureWorker
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CameraSchedule:
+    nvr: str
+    base_interval: float
+    factor: float = 1.0
+    idle_streak: int = 0
+    errors: int = 0
+    next_due: float = 0.0
+    last_start: float = 0.0
+
+
+class PollScheduler:
+    """
+    Agenda central das consultas de snapshot.
+
+    - Intervalo base de cada câmera vem de `Camera.polling_interval`.
+    - Câmeras do mesmo NVR recebem horários espaçados (intervalo / nº de canais)
+      em vez de chegarem em rajada.
+    - Depois de detecção ou violação a câmera é consultada mais vezes
+      (`min_factor`); cenas vazias ou sem mudança por `idle_after` ciclos vão
+      espaçando até `max_factor` vezes o intervalo base.
+    - `budget_fps` limita o total de frames por segundo enviados à inferência
+      (0 = sem limite). O worker pede a ficha (`acquire_budget`) só quando o
+      frame vai de fato para o modelo; frames pulados pelo FrameGate não gastam.
+    - Falhas de consulta (`report(..., error=True)`) dobram o intervalo a cada
+      erro seguido, até `max_factor` vezes o intervalo base.
+    """
+
+    def __init__(self, budget_fps: float = 0.0, min_factor: float = 0.5, max_factor: float = 4.0, idle_after: int = 3):
+        self.budget_fps = max(0.0, budget_fps)
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.idle_after = idle_after
+        self._cams: Dict[int, _CameraSchedule] = {}
+        self._nvr_last: Dict[str, float] = {}  # último slot concedido por NVR
+        self._tokens = max(1.0, self.budget_fps)
+        self._tokens_ts: Optional[float] = None
+        self._budget_lock: Optional[asyncio.Lock] = None
+
+    def register(self, camera: Camera, default_interval: float = 2.0):
+        interval = float(camera.polling_interval or default_interval)
+        sched = self._cams.get(camera.id)
+        if sched is None:
+            self._cams[camera.id] = _CameraSchedule(nvr=camera.nvr_base_url.rstrip("/"), base_interval=interval)
+        else:
+            sched.nvr = camera.nvr_base_url.rstrip("/")
+            sched.base_interval = interval
+
+    def unregister(self, camera_id: int):
+        self._cams.pop(camera_id, None)
+
+    def _nvr_spacing(self, nvr: str) -> float:
+        intervals = [c.base_interval * c.factor for c in self._cams.values() if c.nvr == nvr]
+        if not intervals:
+            return 0.0
+        return min(intervals) / len(intervals)
+
+    async def wait_turn(self, camera_id: int):
+        """Aguarda até o próximo horário de consulta da câmera."""
+        sched = self._cams.get(camera_id)
+        if sched is None:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if sched.next_due > now:
+            await asyncio.sleep(sched.next_due - now)
+            now = loop.time()
+        # Só quem já está na hora reserva slot no NVR: uma câmera ociosa, com
+        # horário distante, não empurra as que estão devidas antes dela
+        last = self._nvr_last.get(sched.nvr)
+        slot = now if last is None else max(now, last + self._nvr_spacing(sched.nvr))
+        self._nvr_last[sched.nvr] = slot
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        sched.last_start = loop.time()
+
+    async def acquire_budget(self):
+        """Aguarda a ficha do orçamento global de inferência (`budget_fps`)."""
+        if self.budget_fps <= 0:
+            return
+        if self._budget_lock is None:
+            self._budget_lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        async with self._budget_lock:
+            while True:
+                now = loop.time()
+                if self._tokens_ts is not None:
+                    self._tokens = min(max(1.0, self.budget_fps), self._tokens + (now - self._tokens_ts) * self.budget_fps)
+                self._tokens_ts = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.budget_fps)
+
+    def report(self, camera_id: int, persons: int = 0, violation: bool = False, changed: bool = True,
+               error: bool = False):
+        """Informa o resultado do ciclo para ajustar o intervalo da câmera."""
+        sched = self._cams.get(camera_id)
+        if sched is None:
+            return
+        if error:
+            sched.errors += 1
+            sched.next_due = sched.last_start + sched.base_interval * min(self.max_factor, 2.0 ** sched.errors)
+            return
+        sched.errors = 0
+        if violation or persons > 0:
+            sched.factor = self.min_factor
+            sched.idle_streak = 0
+        else:
+            sched.idle_streak += 1
+            if sched.factor < 1.0:
+                sched.factor = 1.0
+            elif sched.idle_streak >= self.idle_after or not changed:
+                sched.factor = min(self.max_factor, sched.factor * 1.5)
+        sched.next_due = sched.last_start + sched.base_interval * sched.factor
+
+    def reset(self, camera_id: int):
+        """Agenda a câmera para consulta imediata (após erro ou reconfiguração)."""
+        sched = self._cams.get(camera_id)
+        if sched is not None:
+            sched.next_due = 0.0
+
+
+def create_poll_scheduler() -> PollScheduler:
+    """Cria o agendador com a configuração do ambiente (POLL_BUDGET_FPS etc.)."""
+    return PollScheduler(
+        budget_fps=float(os.getenv("POLL_BUDGET_FPS", "0")),
+        min_factor=float(os.getenv("POLL_MIN_FACTOR", "0.5")),
+        max_factor=float(os.getenv("POLL_MAX_FACTOR", "4")),
+        idle_after=int(os.getenv("POLL_IDLE_AFTER", "3")),
+    )
+
+
+# Mudam a conexão com o NVR: o cliente HTTP (e a autenticação em cache) é recriado
+CONNECTION_FIELDS = ("nvr_base_url", "username", "password")
+CAMERA_FIELDS = tuple(col.key for col in Camera.__table__.columns if col.key not in ("created_at", "updated_at"))
+
+
+@dataclass
+class _Supervised:
+    """Estado de supervisão de uma câmera."""
+
+    camera: Camera
+    worker: Optional[PictureWorker] = None
+    task: Optional[asyncio.Task] = None
+    state: str = "pending"  # pending | running | backoff | stopped
+    started_at: float = 0.0
+    restarts: int = 0
+    failures: int = 0  # falhas seguidas (zera após `stable_after` s rodando)
+    last_exit: Optional[str] = None
+    next_start: float = 0.0
+
+
 class WorkerManager:
-    def __init__(self):
-        self.workers: Dict[int, PictureWorker] = {}
-        self.stop_events: Dict[int, threading.Event] = {}
-        self.lock = threading.Lock()
+    """
+    Supervisor dos workers de câmera.
 
-    def start_all(self):
-        """Inicia workers para todas as câmeras ativas."""
-        with self.lock:
-            db: Session = SessionLocal()
+    Cada câmera roda como uma task no event loop do servidor. Uma task que
+    termina com exceção (ou sai sem ter sido parada) é reiniciada com backoff
+    exponencial com jitter (`backoff_base` .. `backoff_max` s). O watchdog
+    roda a cada `watchdog_interval` s e cancela e reinicia workers cujo
+    heartbeat está parado há mais que `stall_after` s (ou 3 ciclos do maior
+    intervalo da câmera, o que for maior). Depois de `stable_after` s rodando
+    sem falhas o backoff volta ao início. Erros de um NVR ficam restritos às
+    suas câmeras: o fetch tem timeout e nenhuma câmera espera por outra.
+
+    Os métodos públicos podem ser chamados de rotas síncronas (threads do
+    FastAPI): a alteração é repassada ao event loop.
+
+    Alterações de câmera chegam pelo `CameraFeed`: só a diferença é aplicada
+    ao worker em execução (`PictureWorker.update_config`), e a conexão com o
+    NVR só é recriada quando URL ou credenciais mudam.
+
+    Com vários nós (`app.services.cluster`), `owns` restringe os workers às
+    câmeras com lease deste nó e o coordenador chama `assign`.
+    """
+
+    def __init__(
+        self,
+        watchdog_interval: float = 5.0,
+        stall_after: float = 60.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        stable_after: float = 120.0,
+    ):
+        self.watchdog_interval = watchdog_interval
+        self.stall_after = stall_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self._cams: Dict[int, _Supervised] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watchdog: Optional[asyncio.Task] = None
+        self.owns: Optional[Callable[[int], bool]] = None
+        # Clientes HTTP compartilhados pelos workers, um por NVR
+        self.http_pool = create_nvr_pool()
+        # Agenda central de consultas (espalha por NVR e segue a atividade)
+        self.scheduler = create_poll_scheduler()
+        # Persistência de eventos em lote, compartilhada pelos workers
+        self.event_sink = create_event_sink()
+
+    @property
+    def workers(self) -> Dict[int, PictureWorker]:
+        return {cam_id: sup.worker for cam_id, sup in self._cams.items() if sup.worker is not None}
+
+    # ------------------------
+    # Ciclo de vida (event loop)
+    # ------------------------
+    async def start(self):
+        """Inicia o sink, os workers das câmeras ativas e o watchdog."""
+        self._loop = asyncio.get_running_loop()
+        await self.event_sink.start()
+        get_camera_feed().subscribe(self._on_change)
+        self.start_all()
+        for sup in self._cams.values():
+            if sup.state == "pending":
+                self._launch(sup)
+        self._watchdog = self._loop.create_task(self._watch())
+
+    async def stop(self):
+        """Para o watchdog e os workers e fecha sink e conexões."""
+        get_camera_feed().unsubscribe(self._on_change)
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        tasks = [sup.task for sup in self._cams.values() if sup.task is not None]
+        for cam_id in list(self._cams):
+            self._remove(cam_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.event_sink.stop()
+        await self.http_pool.aclose()
+        self._loop = None
+
+    def _dispatch(self, fn, *args):
+        """Executa `fn` no event loop (direto se já estiver nele ou se ainda não iniciou)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return fn(*args)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return fn(*args)
+        loop.call_soon_threadsafe(fn, *args)
+
+    def _launch(self, sup: _Supervised):
+        cam = sup.camera
+        self.scheduler.register(cam)
+        self.scheduler.reset(cam.id)
+        worker = PictureWorker(
+            cam,
+            get_metrics(),
+            self.event_sink,
+            http_pool=self.http_pool,
+            scheduler=self.scheduler,
+        )
+        sup.worker = worker
+        sup.state = "running"
+        sup.started_at = time.monotonic()
+        sup.task = self._loop.create_task(worker.run(), name=f"camera-{cam.id}")
+        sup.task.add_done_callback(lambda task, sup=sup: self._on_exit(sup, task))
+
+    def _on_exit(self, sup: _Supervised, task: asyncio.Task):
+        if sup.task is not task or sup.state != "running" or self._cams.get(sup.camera.id) is not sup:
+            return  # parado, substituído ou já tratado pelo watchdog
+        if task.cancelled():
+            reason, detail = "cancelled", "task cancelada"
+        elif task.exception() is not None:
+            reason, detail = "crash", repr(task.exception())
+        else:
+            reason, detail = "exited", "worker encerrou sem ser parado"
+        self._schedule_restart(sup, reason, detail)
+
+    def _schedule_restart(self, sup: _Supervised, reason: str, detail: str):
+        sup.failures += 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (sup.failures - 1))
+        # Jitter: câmeras de um NVR que caiu não voltam todas ao mesmo tempo
+        delay *= random.uniform(0.5, 1.5)
+        sup.state = "backoff"
+        sup.last_exit = f"{reason}: {detail}"
+        sup.next_start = time.monotonic() + delay
+        if sup.worker is not None:
+            sup.worker.stop()
+        metrics.record_worker_restart(str(sup.camera.id), reason)
+
+    def _stall_limit(self, camera: Camera) -> float:
+        interval = float(camera.polling_interval or 2) * self.scheduler.max_factor
+        return max(self.stall_after, 3 * interval)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watchdog_interval)
             try:
-                cameras = db.query(Camera).filter(Camera.enabled == True).all()
-                for cam in cameras:
-                    self._start_worker(cam)
-            finally:
-                db.close()
-
-    def _start_worker(self, camera: Camera):
-        if camera.id in self.workers:
+                self._check()
+            except Exception:
+                # O watchdog não pode morrer, mas a falha tem que aparecer
+                logger.exception("Falha no watchdog dos workers")
+                metrics.record_watchdog_error()
+
+    def _check(self):
+        now = time.monotonic()
+        for sup in list(self._cams.values()):
+            cam_label = str(sup.camera.id)
+            if sup.state == "backoff" and now >= sup.next_start:
+                sup.restarts += 1
+                self._launch(sup)
+            elif sup.state == "running" and sup.worker is not None:
+                age = now - sup.worker.heartbeat
+                metrics.record_worker_heartbeat(cam_label, age)
+                if age > self._stall_limit(sup.camera):
+                    task = sup.task
+                    self._schedule_restart(sup, "stalled", f"sem heartbeat há {age:.0f}s")
+                    task.cancel()
+                elif sup.failures and now - sup.started_at >= self.stable_after:
+                    sup.failures = 0
+
+    def _add(self, camera: Camera):
+        if camera.id in self._cams or (self.owns is not None and not self.owns(camera.id)):
+            return
+        sup = self._cams[camera.id] = _Supervised(camera=camera)
+        if self._loop is not None:
+            self._launch(sup)
+
+    def _remove(self, camera_id: int) -> Optional[asyncio.Task]:
+        """Para o worker; retorna a task cancelada (ainda pode estar terminando)."""
+        sup = self._cams.pop(camera_id, None)
+        if sup is None:
+            return None
+        sup.state = "stopped"
+        if sup.worker is not None:
+            sup.worker.stop()
+        if sup.task is not None:
+            sup.task.cancel()
+        self.scheduler.unregister(camera_id)
+        get_snapshot_cache().drop(camera_id)
+        metrics.remove_worker(str(camera_id))
+        return sup.task
+
+    def _replace(self, camera: Camera):
+        self._remove(camera.id)
+        self._add(camera)
+
+    def _upsert(self, camera: Camera):
+        """Inicia o worker ou aplica só os campos alterados ao que já roda."""
+        sup = self._cams.get(camera.id)
+        if sup is None:
+            self._add(camera)
+            return
+        old = sup.camera
+        changed = {f for f in CAMERA_FIELDS if getattr(old, f) != getattr(camera, f)}
+        if not changed:
             return
-        stop_event = threading.Event()
-        worker = PictureWorker(camera, stop_event, debounce_seconds=camera.debounce_sec or 10)
-        worker.start()
-        self.workers[camera.id] = worker
-        self.stop_events[camera.id] = stop_event
+        sup.camera = camera
+        self.scheduler.register(camera)
+        if sup.worker is not None:
+            sup.worker.update_config(camera)
+        if changed & set(CONNECTION_FIELDS):
+            # NVR ou credenciais novos: recomeça a agenda e recicla a conexão
+            # antiga, a menos que outra câmera ainda use o mesmo NVR
+            self.scheduler.reset(camera.id)
+            old_url = old.nvr_base_url.rstrip("/")
+            shared = any(
+                s.camera.nvr_base_url.rstrip("/") == old_url
+                for cid, s in self._cams.items() if cid != camera.id
+            )
+            if not shared and self._loop is not None:
+                self._loop.create_task(self.http_pool.close_nvr(old_url))
+            metrics.record_camera_config_change("connection")
+        else:
+            metrics.record_camera_config_change("hot")
+
+    def _apply(self, change: CameraChange):
+        if change.deleted or not change.camera.enabled:
+            self._remove(change.camera_id)
+        else:
+            self._upsert(change.camera)
+
+    def _on_change(self, change: CameraChange):
+        self._dispatch(self._apply, change)
+
+    def _sync(self, active_cameras: Dict[int, Camera]) -> Dict[int, asyncio.Task]:
+        # Parar workers de câmeras removidas ou desativadas
+        stopped = {}
+        for cam_id in list(self._cams):
+            if cam_id not in active_cameras:
+                task = self._remove(cam_id)
+                if task is not None and not task.done():
+                    stopped[cam_id] = task
+        # Iniciar workers para novas câmeras e aplicar alterações nas demais
+        for cam in active_cameras.values():
+            self._upsert(cam)
+        return stopped
+
+    # ------------------------
+    # API pública (qualquer thread)
+    # ------------------------
+    def start_all(self):
+        """Inicia workers para todas as câmeras ativas."""
+        db: Session = SessionLocal()
+        try:
+            cameras = db.query(Camera).filter(Camera.enabled == True).all()
+        finally:
+            db.close()
+        for cam in cameras:
+            self._dispatch(self._add, cam)
+
+    def start_worker(self, camera: Camera):
+        self._dispatch(self._add, camera)
 
     def stop_worker(self, camera_id: int):
         """Interrompe um worker específico."""
-        with self.lock:
-            if camera_id in self.stop_events:
-                self.stop_events[camera_id].set()
-                self.workers[camera_id].join(timeout=5)
-                del self.workers[camera_id]
-                del self.stop_events[camera_id]
+        self._dispatch(self._remove, camera_id)
 
     def restart_worker(self, camera_id: int):
-        """Reinicia um worker específico."""
-        self.stop_worker(camera_id)
+        """Reinicia um worker específico com a configuração atual do banco."""
         db: Session = SessionLocal()
         try:
             cam = db.query(Camera).filter(Camera.id == camera_id, Camera.enabled == True).first()
-            if cam:
-                self._start_worker(cam)
         finally:
             db.close()
+        if cam:
+            self._dispatch(self._replace, cam)
+        else:
+            self._dispatch(self._remove, camera_id)
 
     def stop_all(self):
         """Para todos os workers."""
-        with self.lock:
-            for cam_id, event in list(self.stop_events.items()):
-                event.set()
-            for cam_id, worker in list(self.workers.items()):
-                worker.join(timeout=5)
-            self.workers.clear()
-            self.stop_events.clear()
+        for cam_id in list(self._cams):
+            self._dispatch(self._remove, cam_id)
 
     def reload_config(self):
-        """Recarrega configuração de câmeras e reinicia workers conforme necessário."""
-        with self.lock:
-            db: Session = SessionLocal()
-            try:
-                active_cameras = {cam.id: cam for cam in db.query(Camera).filter(Camera.enabled == True).all()}
-
-                # Parar workers de câmeras removidas ou desativadas
-                for cam_id in list(self.workers.keys()):
-                    if cam_id not in active_cameras:
-                        self.stop_worker(cam_id)
-
-                # Iniciar workers para novas câmeras
-                for cam_id, cam in active_cameras.items():
-                    if cam_id not in self.workers:
-                        self._start_worker(cam)
-            finally:
-                db.close()
+        """Recarrega configuração de câmeras e inicia/para workers conforme necessário."""
+        db: Session = SessionLocal()
+        try:
+            active_cameras = {cam.id: cam for cam in db.query(Camera).filter(Camera.enabled == True).all()}
+        finally:
+            db.close()
+        self._dispatch(self._sync, active_cameras)
+
+    async def assign(self, cameras: Dict[int, Camera], timeout: float = 10.0) -> Set[int]:
+        """
+        Define o conjunto exato de câmeras deste nó (modo com vários nós) e
+        espera as tasks dos workers removidos terminarem. Chamado no event
+        loop; retorna as câmeras cujo worker ainda não terminou após `timeout`.
+        """
+        stopped = self._sync(cameras)
+        if not stopped:
+            return set()
+        await asyncio.wait(list(stopped.values()), timeout=timeout)
+        return {cam_id for cam_id, task in stopped.items() if not task.done()}
+
+    def health(self, camera_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Saúde de cada câmera supervisionada (estado, heartbeat, erros, reinícios)."""
+        now = time.monotonic()
+        wall = time.time()
+        out = []
+        for cam_id, sup in sorted(self._cams.items()):
+            if camera_id is not None and cam_id != camera_id:
+                continue
+            worker = sup.worker
+            running = sup.state == "running" and worker is not None
+            heartbeat_age = now - worker.heartbeat if running else None
+            last_frame_age = wall - worker.last_frame_at if worker is not None and worker.last_frame_at else None
+            errors = worker.consecutive_errors if worker is not None else 0
+            if not running:
+                status = "down" if sup.state == "backoff" else sup.state
+            elif errors >= 3 or (last_frame_age is not None and last_frame_age > self._stall_limit(sup.camera)):
+                status = "degraded"
+            else:
+                status = "ok"
+            out.append({
+                "camera_id": cam_id,
+                "name": sup.camera.name,
+                "status": status,
+                "state": sup.state,
+                "heartbeat_age_sec": round(heartbeat_age, 1) if heartbeat_age is not None else None,
+                "last_frame_age_sec": round(last_frame_age, 1) if last_frame_age is not None else None,
+                "consecutive_errors": errors,
+                "last_error": worker.last_error if worker is not None else None,
+                "restarts": sup.restarts,
+                "last_exit": sup.last_exit,
+                "uptime_sec": round(now - sup.started_at, 1) if running else None,
+                "restart_in_sec": round(max(0.0, sup.next_start - now), 1) if sup.state == "backoff" else None,
+            })
+        return out
+
+
+def create_worker_manager() -> WorkerManager:
+    """Cria o supervisor com a configuração do ambiente (WATCHDOG_* / RESTART_*)."""
+    return WorkerManager(
+        watchdog_interval=float(os.getenv("WATCHDOG_INTERVAL_SEC", "5")),
+        stall_after=float(os.getenv("WATCHDOG_STALL_SEC", "60")),
+        backoff_base=float(os.getenv("RESTART_BACKOFF_BASE_SEC", "1")),
+        backoff_max=float(os.getenv("RESTART_BACKOFF_MAX_SEC", "60")),
+        stable_after=float(os.getenv("RESTART_STABLE_SEC", "120")),
+    )
+
+
+_manager: Optional[WorkerManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_worker_manager() -> WorkerManager:
+    """Supervisor compartilhado do processo (main e rotas usam a mesma instância)."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = create_worker_manager()
+        return _manager
@@ -1,136 +1,242 @@
 import asyncio
 import time
 import hashlib
-import datetime as dt
-import os
-
-import httpx
-import cv2
-import numpy as np
 
 from app.models import Camera
-from app.services.yolo import YoloDetector
-from app.services.ppe_rules import PPEAnalyzer
-from app.services.metrics import Metrics
+from app.services.yolo import InferenceEngine, get_inference_engine
+from app.services.ppe_rules import camera_rules, create_analyzer, event_type
+from app.services.isapi import NvrClientPool
+from app.services.frame_gate import FrameGate
+from app.services.preprocess import INPUT_SIZE, FrameDecoder
+from app.services.snapshots import SnapshotCache, get_snapshot_cache
+from app.services import metrics as prom
+from app.services.metrics import Metrics, get_metrics
+from app.workers.event_sink import EventSink, EventRecord
+
+# Campos que mudam a origem das imagens: a cena anterior deixa de valer
+SOURCE_FIELDS = ("nvr_base_url", "channel_no", "username", "password")
 
 
 class PictureWorker:
     """
     Worker assíncrono que captura snapshots via ISAPI (/picture),
-    roda YOLO, aplica regras de EPI e dispara callback de evento.
+    roda YOLO, aplica regras de EPI e envia os eventos ao EventSink.
     """
 
     def __init__(
         self,
         camera: Camera,
         metrics: Metrics,
-        on_event,
+        sink: EventSink,
         interval_sec: int = 2,
         timeout: float = 5.0,
+        engine: InferenceEngine | None = None,
+        http_pool: NvrClientPool | None = None,
+        scheduler=None,
+        snapshots: SnapshotCache | None = None,
     ):
         self.camera = camera
-        self.metrics = metrics
-        self.on_event = on_event
-        self.interval_sec = interval_sec
+        self.metrics = metrics or get_metrics()
+        self.sink = sink
+        self.interval_sec = camera.polling_interval or interval_sec
         self.timeout = timeout
         self._stop = False
 
-        self._detector = YoloDetector(
-            model_path=os.getenv("MODEL_PATH", "./model/ppe.pt"),
-            conf_threshold=camera.threshold or 0.4,
-        )
-        self._ppe = PPEAnalyzer(iou_threshold=0.15)
+        # Modelo compartilhado entre todas as câmeras (micro-batches)
+        self._engine = engine or get_inference_engine()
+        # Conexões HTTP persistentes por NVR (normalmente do WorkerManager)
+        self._http = http_pool or NvrClientPool(timeout=timeout)
+        # Agenda central (PollScheduler); sem ela usa intervalo fixo
+        self._scheduler = scheduler
+        # Último frame de cada câmera para as prévias do monitoramento
+        self._snapshots = snapshots or get_snapshot_cache()
+        self._ppe = create_analyzer()
+        self._rules = camera_rules(camera)
+        # Pula a inferência quando o snapshot não mudou
+        self._gate = FrameGate(sensitivity=self._sensitivity(camera))
+        self._last_dets = None
+        # Decodificação reduzida direto para o buffer de entrada do modelo
+        # (INFER_INPUT_SIZE; o detector recusa modelos de entrada fixa diferente)
+        self._decoder = FrameDecoder(INPUT_SIZE)
 
         self._last_event_ts = 0.0
         self._last_sig = None
 
+        # Estado lido pelo watchdog do WorkerManager
+        self.heartbeat = time.monotonic()
+        self.last_frame_at: float | None = None
+        self.consecutive_errors = 0
+        self.last_error: str | None = None
+        # Modelo retido no registro enquanto o worker roda (ver run/update_config)
+        self._model_path: str | None = None
+        self._running = False
+
+    @staticmethod
+    def _sensitivity(camera: Camera) -> float:
+        return camera.change_sensitivity if camera.change_sensitivity is not None else 0.02
+
     def update_config(self, camera: Camera):
+        """
+        Aplica a nova configuração no worker em execução, sem reiniciá-lo.
+        Limiar, debounce, flags de detecção (`camera_rules`) e intervalo valem
+        a partir do próximo frame; troca de modelo só ajusta as referências no
+        registro; troca de NVR, canal ou credenciais descarta o estado da cena
+        anterior.
+        """
+        old = self.camera
         self.camera = camera
+        self.interval_sec = camera.polling_interval or self.interval_sec
+        self._gate.sensitivity = self._sensitivity(camera)
+        rules = camera_rules(camera)
+        if rules != self._rules:
+            self._rules = rules
+            self._last_sig = None  # outra regra: o próximo evento não é duplicata
+        new_model = camera.ai_model_path or None
+        if self._running and new_model != self._model_path:
+            self._engine.retain_model(new_model)
+            self._engine.release_model(self._model_path)
+            self._model_path = new_model
+        if any(getattr(old, f) != getattr(camera, f) for f in SOURCE_FIELDS):
+            self._gate.reset()
+            self._last_dets = None
+            self._last_sig = None
 
     def stop(self):
         self._stop = True
 
+    def _beat(self):
+        self.heartbeat = time.monotonic()
+
+    def _failed(self, reason: str):
+        self.consecutive_errors += 1
+        self.last_error = reason
+
+    async def _retry_later(self, backoff: float):
+        """Depois de uma falha: a agenda central espaça a câmera, ou dorme `backoff`."""
+        if self._scheduler is not None:
+            self._scheduler.report(self.camera.id, error=True)
+        else:
+            await asyncio.sleep(backoff)
+
+    async def _pace(self, t0: float, persons: int = 0, violation: bool = False, changed: bool = True):
+        """Encerra o ciclo: informa a agenda central ou dorme o intervalo fixo."""
+        if self._scheduler is not None:
+            self._scheduler.report(self.camera.id, persons=persons, violation=violation, changed=changed)
+        else:
+            await asyncio.sleep(max(0.0, self.interval_sec - (time.time() - t0)))
+
     async def run(self):
+        self._model_path = self.camera.ai_model_path or None
+        self._engine.retain_model(self._model_path)
+        self._running = True
+        try:
+            await self._loop()
+        finally:
+            self._running = False
+            self._engine.release_model(self._model_path)
+
+    async def _loop(self):
         backoff = 1.0
-        while not self._stop and self.camera.active:
+        cam_label = str(self.camera.id)
+        while not self._stop and self.camera.enabled:
+            self._beat()
+            if self._scheduler is not None:
+                await self._scheduler.wait_turn(self.camera.id)
+                self._beat()
             t0 = time.time()
+            trace = self.metrics.trace(self.camera.id)
             try:
                 jpg = await self._fetch_picture()
+                trace.mark("fetch")
                 if not jpg:
-                    self.metrics.rtsp_errors.labels(str(self.camera.id)).inc()
-                    await asyncio.sleep(backoff)
+                    self.metrics.rtsp_errors.labels(cam_label).inc()
+                    self.metrics.frame_dropped(cam_label, "fetch_error")
+                    self._failed("fetch_error")
+                    await self._retry_later(backoff)
                     backoff = min(backoff * 2, 15)
                     continue
                 backoff = 1.0
 
-                arr = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-                if arr is None:
-                    await asyncio.sleep(self.interval_sec)
-                    continue
-
-                # YOLO
-                t1 = time.time()
-                dets = self._detector.detect(arr)  # [{'class','confidence','bbox':[x1,y1,x2,y2]}]
-                t2 = time.time()
+                changed = await self._engine.preprocess(self._gate.check, jpg)
+                trace.mark("gate")
+                if not changed and self._last_dets is not None:
+                    # Cena estática: reaproveita as últimas detecções
+                    dets = self._last_dets
+                    prom.record_frame_skipped(cam_label)
+                else:
+                    if self._scheduler is not None:
+                        await self._scheduler.acquire_budget()
+                    arr = await self._engine.decode(jpg, self._decoder)
+                    trace.mark("decode")
+                    if arr is None:
+                        self._gate.reset()
+                        self.metrics.frame_dropped(cam_label, "decode_error")
+                        self._failed("decode_error")
+                        await self._pace(t0)
+                        continue
+
+                    # YOLO
+                    dets = await self._engine.detect(
+                        arr,
+                        self.camera.threshold or 0.4,
+                        camera_id=self.camera.id,
+                        model_path=self.camera.ai_model_path or None,
+                    )  # Detections (arrays NumPy)
+                    trace.mark("infer")
+                    self._last_dets = dets
+                    prom.record_frame_inferred(cam_label)
+                self._snapshots.put(self.camera.id, jpg, dets)
 
                 # Regras PPE
-                summary = self._ppe.analyze(dets)
-                ev_type = None
-                if summary.get("total_violations", 0) > 0:
-                    if any(d["status"] == "Sem capacete e máscara" for d in summary["details"]):
-                        ev_type = "no_helmet_no_mask"
-                    elif any(d["status"] == "Sem capacete" for d in summary["details"]):
-                        ev_type = "no_helmet"
-                    elif any(d["status"] == "Sem máscara" for d in summary["details"]):
-                        ev_type = "no_mask"
+                summary = self._ppe.analyze_detections(dets, **self._rules)
+                ev_type = event_type(summary)
 
                 now = time.time()
                 if ev_type:
                     sig = hashlib.sha1(f"{ev_type}:{summary}".encode()).hexdigest()
                     if now - self._last_event_ts < (self.camera.debounce_sec or 5):
-                        self.metrics.debounce.labels(str(self.camera.id)).inc()
+                        self.metrics.debounce.labels(cam_label).inc()
                     elif sig == self._last_sig:
-                        self.metrics.dedupe.labels(str(self.camera.id)).inc()
+                        self.metrics.dedupe.labels(cam_label).inc()
                     else:
-                        ts = dt.datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
-                        img_path = f"./data/images/cam{self.camera.id}_{ts}.jpg"
-                        with open(img_path, "wb") as f:
-                            f.write(jpg)
                         self._last_event_ts = now
                         self._last_sig = sig
-                        # Delega persistência/broadcast ao callback do manager/main.py
-                        await self.on_event(
-                            {
-                                "camera_id": self.camera.id,
-                                "type": ev_type,
-                                "score": 1.0,
-                                "image_path": img_path,
-                                "meta": summary,
-                            }
+                        # Persistência (imagem + linha) fica com o EventSink, fora do loop de detecção
+                        await self.sink.submit(
+                            EventRecord(
+                                camera_id=self.camera.id,
+                                event_type=ev_type,
+                                image_bytes=jpg,
+                                summary=summary,
+                            )
                         )
-
-                # métricas
-                self.metrics.fps.labels(str(self.camera.id)).set(
-                    1.0 / max(1e-3, time.time() - t0)
+                trace.mark("rules")
+                self.metrics.finish(trace)
+                self.last_frame_at = time.time()
+                self.consecutive_errors = 0
+
+                await self._pace(
+                    t0,
+                    persons=summary.get("total_persons", 0),
+                    violation=ev_type is not None,
+                    changed=changed,
                 )
-                self.metrics.latency.labels("detect").observe((t2 - t1) * 1000.0)
-
-                await asyncio.sleep(max(0.0, self.interval_sec - (time.time() - t0)))
-            except Exception:
-                self.metrics.rtsp_errors.labels(str(self.camera.id)).inc()
-                await asyncio.sleep(backoff)
+            except Exception as exc:
+                self.metrics.rtsp_errors.labels(cam_label).inc()
+                self.metrics.frame_dropped(cam_label, "error")
+                self._failed(repr(exc))
+                await self._retry_later(backoff)
                 backoff = min(backoff * 2, 15)
 
     async def _fetch_picture(self) -> bytes | None:
         """Obtém imagem estática via ISAPI."""
         try:
-            base = self.camera.nvr_base_url.rstrip("/")
-            url = f"{base}/ISAPI/Streaming/channels/{self.camera.channel_no}/picture"
-            auth = (self.camera.nvr_username, self.camera.nvr_password)
-            async with httpx.AsyncClient(verify=False, timeout=self.timeout) as cli:
-                r = await cli.get(url, auth=auth)
-            if r.status_code == 200 and r.content:
-                return r.content
-            return None
+            return await self._http.fetch_picture(
+                self.camera.nvr_base_url,
+                self.camera.channel_no,
+                self.camera.username,
+                self.camera.password,
+                timeout=self.timeout,
+            )
         except Exception:
             return None
@@ -0,0 +1,134 @@
+"""
+Benchmark de busca de eventos no SQLite.
+
+Popula um banco temporário com N eventos (padrão 10 milhões) distribuídos
+entre câmeras e dias, aplica o schema/migração do app e mede a latência das
+consultas usadas pela busca de eventos, relatórios, monitoramento e retenção.
+
+Uso:
+    python -m bench.bench_events_db --events 10000000 --cameras 32 --days 90
+    python -m bench.bench_events_db --events 1000000 --no-indexes   # comparação
+
+Imprime um JSON com a mediana e o p95 (ms) de cada consulta.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import datetime as dt
+
+
+def _populate(db_path: str, events: int, cameras: int, days: int, chunk: int = 200_000):
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany(
+        "INSERT INTO cameras (id, name, nvr_base_url, username, password, channel_no, enabled) VALUES (?, ?, ?, ?, ?, ?, 1)",
+        [(c, f"cam{c}", "http://nvr", "u", "p", c) for c in range(1, cameras + 1)],
+    )
+    start = dt.datetime.utcnow() - dt.timedelta(days=days)
+    span = days * 86400
+    rnd = random.Random(42)
+    statuses = ("no_helmet", "no_mask", "no_helmet_no_mask")
+    # Eventos em ordem cronológica, como chegam em produção
+    step = span / events
+    for base in range(0, events, chunk):
+        rows = []
+        for i in range(base, min(events, base + chunk)):
+            ts = (start + dt.timedelta(seconds=i * step)).isoformat(sep=" ")
+            cam = rnd.randint(1, cameras)
+            rows.append((cam, ts, ts, ts, f"./data/images/cam{cam}_{i}.jpg", rnd.choice(statuses)))
+        conn.executemany(
+            "INSERT INTO events (camera_id, timestamp, created_at, updated_at, image_path, ppe_status) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        print(f"  {min(events, base + chunk):,} eventos", file=sys.stderr)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def _time(session, query, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        query(session)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de busca de eventos no SQLite")
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--cameras", type=int, default=32)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", default=None, help="Reutiliza/gera o banco neste caminho")
+    parser.add_argument("--no-indexes", action="store_true", help="Remove os índices de eventos (linha de base)")
+    args = parser.parse_args(argv)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="ppe-bench-"), "bench.db")
+    fresh = not os.path.exists(db_path)
+    os.environ["DB_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import text
+    from app.models import init_db, SessionLocal, Event
+
+    init_db()
+    if fresh:
+        print(f"Populando {db_path} ...", file=sys.stderr)
+        t0 = time.perf_counter()
+        _populate(db_path, args.events, args.cameras, args.days)
+        print(f"  carga: {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    db = SessionLocal()
+    if args.no_indexes:
+        db.execute(text("DROP INDEX IF EXISTS ix_events_camera_created"))
+        db.execute(text("DROP INDEX IF EXISTS ix_events_created_at"))
+        db.commit()
+    else:
+        init_db()
+
+    now = dt.datetime.utcnow()
+    day_start = now - dt.timedelta(days=args.days // 2)
+    day_end = day_start + dt.timedelta(days=1)
+    cutoff = now - dt.timedelta(days=args.days - 1)
+
+    queries = {
+        # /api/events/search?camera_id=&start_date=&end_date= (um dia, uma câmera)
+        "search_camera_day": lambda s: s.query(Event)
+        .filter(Event.camera_id == 7, Event.created_at >= day_start, Event.created_at <= day_end)
+        .order_by(Event.created_at.desc()).limit(100).all(),
+        # /api/reports/search sem câmera (um dia)
+        "search_all_day": lambda s: s.query(Event)
+        .filter(Event.created_at >= day_start, Event.created_at <= day_end)
+        .order_by(Event.created_at.desc()).limit(100).all(),
+        # /api/events (monitoramento: 50 mais recentes)
+        "latest_50": lambda s: s.query(Event).order_by(Event.created_at.desc()).limit(50).all(),
+        # retenção: quantos eventos expiraram
+        "retention_count": lambda s: s.query(Event.id).filter(Event.created_at < cutoff).count(),
+    }
+
+    results = {
+        "events": db.query(Event.id).count(),
+        "indexes": not args.no_indexes,
+        "db": db_path,
+        "queries": {name: _time(db, q, args.repeat) for name, q in queries.items()},
+    }
+    db.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
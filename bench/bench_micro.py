@@ -0,0 +1,164 @@
+"""
+Micro-benchmarks das etapas de CPU do pipeline.
+
+- `PPEAnalyzer.analyze`: detecções aleatórias com N pessoas (e capacetes/
+  máscaras proporcionais), para cada modo de associação;
+- `YoloDetector.detect` / `detect_batch`: o modelo de `--model` (ou
+  MODEL_PATH) sobre frames sintéticos ou JPEGs de `--frames`. Sem modelo ou
+  sem torch/onnxruntime instalados o item sai como "skipped".
+
+Uso:
+    python -m bench.bench_micro --persons 1,5,20,50 --repeat 2000
+    python -m bench.bench_micro --model ./models/ppe.pt --batch 1,4,8 --detect-repeat 50
+
+Imprime um JSON com a mediana, o p95 e o p99 (ms) de cada item.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+def _timings(fn: Callable[[], object], repeat: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    values = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        values.append(time.perf_counter() - t0)
+    values.sort()
+
+    def pct(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000.0, 4)
+
+    return {
+        "count": repeat,
+        "mean_ms": round(statistics.fmean(values) * 1000.0, 4),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def random_detections(persons: int, rnd: np.random.Generator, width: int = 1920, height: int = 1080):
+    """Pessoas espalhadas no frame; ~70% com capacete e ~50% com máscara perto da cabeça."""
+    from app.services.detections import Detections
+
+    names = ("person", "helmet", "mask")
+    w = rnd.uniform(60, 220, persons)
+    h = w * rnd.uniform(2.0, 3.0, persons)
+    x1 = rnd.uniform(0, width - w)
+    y1 = rnd.uniform(0, height - h)
+    boxes = [np.stack([x1, y1, x1 + w, y1 + h], axis=1)]
+    class_ids = [np.zeros(persons, dtype=np.int32)]
+    for cid, share, top in ((1, 0.7, 0.0), (2, 0.5, 0.12)):
+        sel = rnd.random(persons) < share
+        hw = w[sel] * 0.5
+        hx = x1[sel] + w[sel] * 0.25
+        hy = y1[sel] + h[sel] * top
+        boxes.append(np.stack([hx, hy, hx + hw, hy + hw * 0.8], axis=1))
+        class_ids.append(np.full(int(sel.sum()), cid, dtype=np.int32))
+    boxes = np.concatenate(boxes).astype(np.float32)
+    return Detections(boxes, np.full(len(boxes), 0.9, dtype=np.float32), np.concatenate(class_ids), names)
+
+
+def bench_ppe(persons: List[int], repeat: int, warmup: int) -> Dict[str, Dict[str, dict]]:
+    from app.services.ppe_rules import PPEAnalyzer
+
+    analyzers = {
+        "any": PPEAnalyzer(),
+        "greedy": PPEAnalyzer(assignment="greedy"),
+        "hungarian": PPEAnalyzer(assignment="hungarian"),
+        "head_region": PPEAnalyzer(head_region=True, assignment="greedy"),
+    }
+    rnd = np.random.default_rng(0)
+    out: Dict[str, Dict[str, dict]] = {}
+    for n in persons:
+        dets = random_detections(n, rnd)
+        dicts = dets.to_dicts()
+        row = {mode: _timings(lambda a=a: a.analyze(dets), repeat, warmup) for mode, a in analyzers.items()}
+        # Formato antigo (lista de dicts), ainda usado por chamadores externos
+        row["any_dicts"] = _timings(lambda: analyzers["any"].analyze(dicts), repeat, warmup)
+        out[str(n)] = row
+    return out
+
+
+def bench_detector(model_path: str, frames: List[bytes], batches: List[int], repeat: int, warmup: int) -> dict:
+    if not model_path or not os.path.exists(model_path):
+        return {"skipped": f"modelo não encontrado: {model_path or '(MODEL_PATH vazio)'}"}
+    try:
+        from app.services.detectors import create_detector
+        detector = create_detector(model_path)
+    except ImportError as exc:
+        return {"skipped": f"dependência ausente: {exc}"}
+
+    import cv2
+    from app.services.preprocess import FrameDecoder
+
+    bgr = [cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR) for jpg in frames]
+    result = {
+        "backend": getattr(detector, "backend", type(detector).__name__),
+        "model": model_path,
+        "frame_size": [int(bgr[0].shape[1]), int(bgr[0].shape[0])],
+        "detect": _timings(lambda: detector.detect(bgr[0]), repeat, warmup),
+    }
+    # Caminho do worker: JPEG -> PreparedFrame (letterbox) -> batch
+    decoders = [FrameDecoder(detector.input_size) for _ in range(max(batches))]
+    prepared = [decoders[i].decode(frames[i % len(frames)]) for i in range(max(batches))]
+    result["decode"] = _timings(lambda: decoders[0].decode(frames[0]), repeat, warmup)
+    result["detect_batch"] = {}
+    for size in batches:
+        timing = _timings(lambda: detector.detect_batch(prepared[:size]), repeat, warmup)
+        timing["per_frame_ms"] = round(timing["p50_ms"] / size, 4)
+        result["detect_batch"][str(size)] = timing
+    return result
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de PPEAnalyzer e do detector")
+    parser.add_argument("--persons", default="1,5,20,50", help="Pessoas por frame (lista)")
+    parser.add_argument("--repeat", type=int, default=2000, help="Repetições do PPEAnalyzer")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", ""), help="Modelo do detector (padrão: MODEL_PATH)")
+    parser.add_argument("--frames", default=None, help="Pasta de JPEGs (padrão: sintéticos)")
+    parser.add_argument("--batch", default="1,4,8", help="Tamanhos de batch do detector")
+    parser.add_argument("--detect-repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Grava o relatório JSON neste arquivo")
+    args = parser.parse_args(argv)
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if repo not in sys.path:
+        sys.path.insert(0, repo)
+    from bench.fake_nvr import load_frames
+
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        revision = ""
+
+    report = {
+        "revision": revision,
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "ppe_analyze": bench_ppe(_int_list(args.persons), args.repeat, args.warmup),
+        "detector": bench_detector(args.model, load_frames(args.frames), _int_list(args.batch), args.detect_repeat, args.warmup),
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
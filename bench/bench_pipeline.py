@@ -0,0 +1,337 @@
+"""
+Benchmark ponta a ponta do pipeline de câmeras.
+
+Sobe NVRs ISAPI falsos (bench.fake_nvr) e roda o WorkerManager (supervisor e
+PictureWorkers reais) contra N câmeras simuladas, com banco e pasta de imagens temporários.
+Depois do aquecimento mede, na janela de `--duration` segundos:
+
+- frames/s sustentados (total e por câmera), inferidos x pulados pelo FrameGate;
+- p50/p95/p99 por etapa (fetch, gate, decode, infer, rules) e total do frame;
+- espera nas filas (inferência e eventos), tamanho dos batches, persistência;
+- CPU do processo e do sistema, RSS (início, pico, fim);
+- eventos gravados por segundo e frames descartados por motivo.
+
+Uso:
+    python -m bench.bench_pipeline --cameras 32 --duration 60
+    python -m bench.bench_pipeline --cameras 32 --frames ./gravacoes --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+    python -m bench.bench_pipeline --cameras 64 --simulate-infer-ms 40 --output report.json
+
+Sem `--simulate-infer-ms` usa o modelo real de MODEL_PATH (e o backend de
+INFER_BACKEND). O relatório JSON traz a configuração e o commit, para comparar
+versões.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import statistics
+from typing import Dict, List
+
+import psutil
+
+STAGES = ("fetch", "gate", "decode", "infer", "rules")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pct(q):
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000.0
+
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.fmean(values) * 1000.0, 3),
+        "p50_ms": round(pct(0.50), 3),
+        "p95_ms": round(pct(0.95), 3),
+        "p99_ms": round(pct(0.99), 3),
+    }
+
+
+def _to_ms(summary):
+    """Converte um resumo de histograma (segundos) para ms, como os percentis exatos."""
+    if summary is None:
+        return None
+    if "count" not in summary:
+        return {k: _to_ms(v) for k, v in summary.items()}
+    return {k if k == "count" else f"{k}_ms": v if k == "count" else round(v * 1000.0, 3) for k, v in summary.items()}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return ""
+
+
+class SimulatedDetector:
+    """
+    Detector de custo fixo para medir o resto do pipeline sem GPU/modelo.
+    Devolve uma pessoa por frame (deslocada a cada chamada, para não cair no
+    dedupe de eventos) e, em frames alternados, um capacete.
+    """
+
+    backend = "simulated"
+
+    def __init__(self, infer_ms: float):
+        from app.services.detections import Detections
+
+        self._detections = Detections
+        self.infer_ms = infer_ms
+        self.names = ("person", "helmet", "mask")
+        self._calls = 0
+
+    def detect_batch(self, images, conf_threshold=None):
+        import numpy as np
+
+        # Custo do batch cresce menos que linear, como na GPU/CPU com lote
+        time.sleep(self.infer_ms / 1000.0 * (1 + 0.25 * (len(images) - 1)))
+        out = []
+        for frame in images:
+            self._calls += 1
+            w = getattr(frame, "orig_w", 1920)
+            h = getattr(frame, "orig_h", 1080)
+            dx = w * 0.01 * (self._calls % 20)
+            boxes = [[w * 0.3 + dx, h * 0.3, w * 0.45 + dx, h * 0.9]]
+            classes = [0]
+            if self._calls % 2:
+                boxes.append([w * 0.32 + dx, h * 0.3, w * 0.42 + dx, h * 0.4])
+                classes.append(1)
+            out.append(self._detections(
+                np.asarray(boxes, dtype=np.float32),
+                np.full(len(boxes), 0.9, dtype=np.float32),
+                np.asarray(classes, dtype=np.int32),
+                self.names,
+            ))
+        return out
+
+
+def _recording_metrics():
+    from app.services import metrics
+
+    class RecordingMetrics(metrics.Metrics):
+        """Guarda as etapas de cada frame para percentis exatos na janela medida."""
+
+        def __init__(self):
+            super().__init__()
+            self.samples: Dict[str, List[float]] = {stage: [] for stage in (*STAGES, "total")}
+
+        def finish(self, trace):
+            super().finish(trace)
+            for stage, seconds in trace.stages.items():
+                self.samples.setdefault(stage, []).append(seconds)
+            self.samples["total"].append(trace.total)
+
+        def reset(self):
+            for values in self.samples.values():
+                values.clear()
+
+    return RecordingMetrics()
+
+
+def _counter_total(counter) -> float:
+    from app.services.metrics import sample_values
+
+    return sum(v for k, v in sample_values(counter).items())
+
+
+async def run(args) -> dict:
+    from app.models import init_db, SessionLocal, Camera, Event
+    from app.services import metrics, model_registry
+    from app.services.yolo import get_inference_engine
+    from app.workers.manager import create_worker_manager
+    from bench.fake_nvr import FakeNvr, ServerThread, load_frames
+
+    init_db()
+
+    if args.simulate_infer_ms is not None:
+        model_registry._registry = model_registry.ModelRegistry(
+            loader=lambda path: SimulatedDetector(args.simulate_infer_ms)
+        )
+    recorder = _recording_metrics()
+    metrics._metrics = recorder
+
+    frames = load_frames(args.frames)
+    nvrs, servers = [], []
+    for _ in range(args.nvrs):
+        nvr = FakeNvr(frames, args.latency_ms, args.jitter_ms, args.error_rate, seed=len(nvrs))
+        servers.append(ServerThread(nvr.app, port=_free_port()).start())
+        nvrs.append(nvr)
+
+    db = SessionLocal()
+    for i in range(args.cameras):
+        db.add(Camera(
+            name=f"bench-{i + 1}",
+            nvr_base_url=servers[i % len(servers)].url,
+            username="admin",
+            password="admin",
+            channel_no=i // len(servers) + 1,
+            threshold=0.4,
+            debounce_sec=args.debounce,
+            polling_interval=args.interval,
+            enabled=True,
+        ))
+    db.commit()
+    db.close()
+
+    # Supervisor real: um worker por câmera ativa, com watchdog
+    manager = create_worker_manager()
+    await manager.start()
+
+    proc = psutil.Process()
+    print(f"Aquecimento {args.warmup}s com {args.cameras} câmeras...", file=sys.stderr)
+    await asyncio.sleep(args.warmup)
+
+    # Início da janela medida
+    recorder.reset()
+    hists_before = {name: metrics.histogram_series(h) for name, h in (
+        ("queue_wait", metrics.queue_wait_hist),
+        ("batch_size", metrics.batch_size_hist),
+        ("stage", metrics.stage_hist),
+    )}
+    dropped_before = metrics.sample_values(metrics.frames_dropped_counter)
+    inferred_before = _counter_total(metrics.frames_inferred_counter)
+    skipped_before = _counter_total(metrics.frames_skipped_counter)
+    requests_before = sum(n.requests for n in nvrs)
+    errors_before = sum(n.errors for n in nvrs)
+    db = SessionLocal()
+    events_before = db.query(Event.id).count()
+    db.close()
+    cpu_before = proc.cpu_times()
+    psutil.cpu_percent(interval=None)
+    rss_start = proc.memory_info().rss
+    rss_peak = rss_start
+    t_start = time.perf_counter()
+
+    print(f"Medindo {args.duration}s...", file=sys.stderr)
+    while time.perf_counter() - t_start < args.duration:
+        await asyncio.sleep(0.5)
+        rss_peak = max(rss_peak, proc.memory_info().rss)
+
+    elapsed = time.perf_counter() - t_start
+    cpu_after = proc.cpu_times()
+    system_cpu = psutil.cpu_percent(interval=None)
+    rss_end = proc.memory_info().rss
+    db = SessionLocal()
+    events_after = db.query(Event.id).count()
+    db.close()
+
+    frames_done = len(recorder.samples["total"])
+    hists = {name: metrics.diff_series(metrics.histogram_series(h), hists_before[name]) for name, h in (
+        ("queue_wait", metrics.queue_wait_hist),
+        ("batch_size", metrics.batch_size_hist),
+        ("stage", metrics.stage_hist),
+    )}
+    dropped = {
+        k: v - dropped_before.get(k, 0.0)
+        for k, v in metrics.sample_values(metrics.frames_dropped_counter).items()
+        if v - dropped_before.get(k, 0.0) > 0
+    }
+    dropped_by_reason: Dict[str, float] = {}
+    for key, n in dropped.items():
+        reason = key.rsplit(",", 1)[-1]
+        dropped_by_reason[reason] = dropped_by_reason.get(reason, 0) + n
+
+    report = {
+        "label": args.label,
+        "revision": _git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output",)},
+        "env": {k: os.environ[k] for k in sorted(os.environ) if k.startswith(("INFER_", "POLL_", "EVENT_", "NVR_", "DETECTOR_"))},
+        "duration_sec": round(elapsed, 3),
+        "frames": frames_done,
+        "fps": round(frames_done / elapsed, 3),
+        "fps_per_camera": round(frames_done / elapsed / max(1, args.cameras), 3),
+        "frames_inferred": int(_counter_total(metrics.frames_inferred_counter) - inferred_before),
+        "frames_skipped": int(_counter_total(metrics.frames_skipped_counter) - skipped_before),
+        "frames_dropped": dropped_by_reason,
+        "stages": {stage: _percentiles(values) for stage, values in recorder.samples.items() if values},
+        "persist": _to_ms(metrics.summarize_series(hists["stage"], (0.5, 0.95, 0.99)).get("persist")),
+        "queue_wait": _to_ms(metrics.summarize_series(hists["queue_wait"], (0.5, 0.95, 0.99))),
+        "batch_size": metrics.summarize_series(hists["batch_size"], (0.5, 0.95)).get("all"),
+        "events_written": events_after - events_before,
+        "events_per_sec": round((events_after - events_before) / elapsed, 3),
+        "nvr": {
+            "requests": sum(n.requests for n in nvrs) - requests_before,
+            "errors": sum(n.errors for n in nvrs) - errors_before,
+        },
+        "cpu": {
+            "process_percent": round(
+                ((cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)) / elapsed * 100.0, 1
+            ),
+            "system_percent": system_cpu,
+            "cores": psutil.cpu_count(),
+        },
+        "rss_mb": {
+            "start": round(rss_start / 2**20, 1),
+            "peak": round(rss_peak / 2**20, 1),
+            "end": round(rss_end / 2**20, 1),
+        },
+    }
+
+    health = manager.health()
+    report["workers"] = {status: sum(h["status"] == status for h in health) for status in {h["status"] for h in health}}
+    report["worker_restarts"] = sum(h["restarts"] for h in health)
+    await manager.stop()
+    await get_inference_engine().stop()
+    for server in servers:
+        server.stop()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta do pipeline de câmeras")
+    parser.add_argument("--cameras", type=int, default=32)
+    parser.add_argument("--nvrs", type=int, default=2, help="NVRs falsos (câmeras distribuídas entre eles)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Janela medida em segundos")
+    parser.add_argument("--warmup", type=float, default=10.0)
+    parser.add_argument("--interval", type=int, default=1, help="Camera.polling_interval (s)")
+    parser.add_argument("--debounce", type=int, default=5, help="Camera.debounce_sec (s)")
+    parser.add_argument("--frames", default=None, help="Pasta de JPEGs gravados (padrão: sintéticos)")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Latência do NVR falso")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas 503")
+    parser.add_argument("--simulate-infer-ms", type=float, default=None,
+                        help="Usa detector simulado com este custo por frame em vez do modelo real")
+    parser.add_argument("--label", default="", help="Identificação livre do experimento")
+    parser.add_argument("--output", default=None, help="Grava o relatório JSON neste arquivo")
+    parser.add_argument("--workdir", default=None, help="Pasta do banco/imagens (padrão: temporária)")
+    args = parser.parse_args(argv)
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ppe-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    output = os.path.abspath(args.output) if args.output else None
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if repo not in sys.path:
+        sys.path.insert(0, repo)
+    os.environ["DB_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if args.simulate_infer_ms is not None:
+        # O detector simulado vive no processo; o registro ainda exige o arquivo
+        model = os.path.join(workdir, "simulated.pt")
+        open(model, "a").close()
+        os.environ["MODEL_PATH"] = model
+        os.environ.setdefault("INFER_BACKEND", "thread")
+    # EventSink/miniaturas gravam em ./data relativo ao diretório atual
+    os.chdir(workdir)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+NVR ISAPI falso para benchmarks.
+
+Atende `GET /ISAPI/Streaming/channels/{n}/picture` com JPEGs de uma pasta
+(gravados de câmeras reais) ou, sem pasta, com frames sintéticos. Cada canal
+percorre os arquivos a partir de um deslocamento próprio, então câmeras
+diferentes não recebem a mesma imagem ao mesmo tempo. Latência, jitter e
+taxa de erro são configuráveis para simular NVRs lentos ou instáveis.
+
+Uso isolado:
+    python -m bench.fake_nvr --port 8081 --frames ./gravacoes --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+"""
+import os
+import glob
+import random
+import asyncio
+import argparse
+import threading
+from typing import List, Optional
+
+from fastapi import FastAPI, Response
+
+
+def synthetic_frames(count: int = 24, width: int = 1920, height: int = 1080, quality: int = 85) -> List[bytes]:
+    """Frames com ruído e um retângulo em movimento (o FrameGate detecta mudança)."""
+    import cv2
+    import numpy as np
+
+    rnd = np.random.default_rng(0)
+    base = rnd.integers(40, 200, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    base = cv2.resize(base, (width, height), interpolation=cv2.INTER_LINEAR)
+    frames = []
+    for i in range(count):
+        img = base.copy()
+        x = int((i / count) * (width - 300))
+        cv2.rectangle(img, (x, height // 3), (x + 300, height // 3 + 500), (30, 30, 220), -1)
+        cv2.putText(img, f"frame {i}", (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames.append(buf.tobytes())
+    return frames
+
+
+def load_frames(folder: Optional[str]) -> List[bytes]:
+    if not folder:
+        return synthetic_frames()
+    paths = sorted(glob.glob(os.path.join(folder, "*.jpg")) + glob.glob(os.path.join(folder, "*.jpeg")))
+    if not paths:
+        raise SystemExit(f"Nenhum JPEG em {folder}")
+    frames = []
+    for path in paths:
+        with open(path, "rb") as f:
+            frames.append(f.read())
+    return frames
+
+
+class FakeNvr:
+    def __init__(self, frames: List[bytes], latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.frames = frames
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._cursor = {}
+        self._rnd = random.Random(seed)
+        self.app = self._build_app()
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake ISAPI NVR")
+
+        @app.get("/ISAPI/Streaming/channels/{channel}/picture")
+        async def picture(channel: int):
+            self.requests += 1
+            delay = self.latency + self._rnd.uniform(-self.jitter, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._rnd.random() < self.error_rate:
+                self.errors += 1
+                return Response(status_code=503)
+            i = self._cursor.get(channel, channel * 7)
+            self._cursor[channel] = i + 1
+            return Response(self.frames[i % len(self.frames)], media_type="image/jpeg")
+
+        @app.get("/stats")
+        async def stats():
+            return {"requests": self.requests, "errors": self.errors}
+
+        return app
+
+
+class ServerThread:
+    """uvicorn numa thread própria, para rodar ao lado do pipeline no mesmo processo."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 8081):
+        import uvicorn
+
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 10.0):
+        self.thread.start()
+        for _ in range(int(timeout / 0.05)):
+            if self.server.started:
+                return self
+            threading.Event().wait(0.05)
+        raise RuntimeError("NVR falso não iniciou")
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NVR ISAPI falso para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--frames", default=None, help="Pasta com JPEGs (padrão: frames sintéticos)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    nvr = FakeNvr(load_frames(args.frames), args.latency_ms, args.jitter_ms, args.error_rate)
+    uvicorn.run(nvr.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
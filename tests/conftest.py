@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Banco descartável: os módulos de app leem DB_URL na importação
+os.environ.setdefault("DB_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="ppe-tests-"), "app.db"))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,25 @@
+import importlib
+import os
+
+from app.models import Base, SessionLocal, User, engine, Role
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_main_imports_and_registers_routes(monkeypatch):
+    # Com um usuário já cadastrado o bootstrap não precisa gerar hash de senha
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        if not db.query(User).first():
+            db.add(User(email="smoke@example.com", hashed_password="x", role=Role.admin))
+            db.commit()
+    finally:
+        db.close()
+    monkeypatch.chdir(ROOT)  # StaticFiles/templates usam caminhos relativos
+
+    main = importlib.import_module("app.main")
+
+    paths = {route.path for route in main.app.routes}
+    assert "/cameras" in paths
+    assert any(p.startswith("/api/cameras") for p in paths)
@@ -0,0 +1,129 @@
+import asyncio
+import datetime as dt
+
+from app.models import Base, Camera, CameraLease, ClusterNode, SessionLocal, engine
+from app.services.cluster import ClusterCoordinator, rendezvous_owner
+
+
+class FakeManager:
+    def __init__(self, still_running=()):
+        self.owns = None
+        self.assigned = {}
+        self.still_running = set(still_running)
+
+    async def assign(self, cameras, timeout=10.0):
+        self.assigned = dict(cameras)
+        return set(self.still_running)
+
+
+def _reset(cameras: int = 20):
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        for model in (CameraLease, ClusterNode, Camera):
+            db.query(model).delete()
+        db.add_all(Camera(id=i, name=f"cam{i}", nvr_base_url="http://nvr", username="u", password="p", channel_no=101, enabled=True) for i in range(1, cameras + 1))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _leases():
+    db = SessionLocal()
+    try:
+        return {l.camera_id: l.node_id for l in db.query(CameraLease)}
+    finally:
+        db.close()
+
+
+def _age(node_id: str, seconds: float):
+    """Simula um nó parado: heartbeat e leases sem renovação há `seconds`."""
+    past = dt.datetime.utcnow() - dt.timedelta(seconds=seconds)
+    db = SessionLocal()
+    try:
+        db.query(ClusterNode).filter(ClusterNode.node_id == node_id).update({"heartbeat_at": past})
+        db.query(CameraLease).filter(CameraLease.node_id == node_id).update({"renewed_at": past})
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_rendezvous_moves_only_the_joining_or_leaving_share():
+    cameras = range(1, 1001)
+    nodes = {"a": 1.0, "b": 1.0, "c": 1.0}
+    before = {c: rendezvous_owner(c, nodes) for c in cameras}
+
+    joined = {c: rendezvous_owner(c, {**nodes, "d": 1.0}) for c in cameras}
+    moved = {c for c in cameras if joined[c] != before[c]}
+    assert moved and all(joined[c] == "d" for c in moved)
+    assert 150 < len(moved) < 350  # ~1/4 das câmeras
+
+    left = {c: rendezvous_owner(c, {"a": 1.0, "b": 1.0}) for c in cameras}
+    assert all(left[c] == before[c] for c in cameras if before[c] != "c")
+
+    weighted = [rendezvous_owner(c, {"a": 2.0, "b": 1.0}) for c in cameras]
+    assert weighted.count("a") > 1.5 * weighted.count("b")
+
+
+def test_take_is_conditional_on_the_lease_read():
+    _reset(1)
+    a = ClusterCoordinator(FakeManager(), node_id="a", ttl=10)
+    b = ClusterCoordinator(FakeManager(), node_id="b", ttl=10)
+    now = dt.datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.add(CameraLease(camera_id=1, node_id="dead", epoch=3, acquired_at=now, renewed_at=now - dt.timedelta(seconds=60)))
+        db.commit()
+        stale = db.get(CameraLease, 1)
+        db.expunge(stale)
+        # Os dois leram o mesmo lease vencido; só o primeiro UPDATE vale
+        assert a._take(db, 1, stale, now)
+        assert not b._take(db, 1, stale, now)
+        db.commit()
+        lease = db.get(CameraLease, 1)
+        assert (lease.node_id, lease.epoch) == ("a", 4)
+        # Inserção concorrente de lease novo também só vale uma vez
+        db.query(CameraLease).delete()
+        db.commit()
+        assert a._take(db, 1, None, now)
+        assert not b._take(db, 1, None, now)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_failover_after_ttl_and_leader_election():
+    _reset(20)
+    a = ClusterCoordinator(FakeManager(), node_id="a", ttl=5)
+    b = ClusterCoordinator(FakeManager(), node_id="b", ttl=5)
+    asyncio.run(a.step())
+    asyncio.run(b.step())
+    asyncio.run(a.step())
+    asyncio.run(b.step())
+    leases = _leases()
+    assert len(leases) == 20 and set(leases.values()) == {"a", "b"}
+    assert not (a.owned & b.owned) and len(a.owned | b.owned) == 20
+    assert a.is_leader() and not b.is_leader()
+
+    # "a" para de renovar: depois do ttl "b" assume tudo e vira líder
+    _age("a", 30)
+    asyncio.run(b.step())
+    assert b.owned == set(range(1, 21)) and set(_leases().values()) == {"b"}
+    assert b.is_leader()
+
+
+def test_leases_are_released_only_after_workers_stopped():
+    _reset(20)
+    a = ClusterCoordinator(FakeManager(), node_id="a", ttl=5)
+    asyncio.run(a.step())
+    assert len(a.owned) == 20
+    b = ClusterCoordinator(FakeManager(), node_id="b", ttl=5)
+    asyncio.run(b.step())  # "b" entrou; as câmeras de "b" ainda estão com "a"
+
+    moving = {c for c in range(1, 21) if rendezvous_owner(c, {"a": 1.0, "b": 1.0}) == "b"}
+    stuck = min(moving)
+    a.manager = FakeManager(still_running={stuck})
+    asyncio.run(a.step())
+    leases = _leases()
+    assert leases[stuck] == "a"  # worker não terminou: lease mantido
+    assert all(c not in leases for c in moving - {stuck})
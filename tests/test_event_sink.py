@@ -0,0 +1,54 @@
+import asyncio
+import os
+
+import cv2
+import numpy as np
+
+from app.models import Base, Event, SessionLocal, engine
+from app.services.thumbnails import ThumbnailGenerator
+from app.workers.event_sink import EventRecord, EventSink
+
+
+def test_stop_flushes_partial_batch_and_queue(tmp_path):
+    Base.metadata.create_all(engine)
+
+    async def scenario():
+        sink = EventSink(batch_size=50, flush_interval=5.0, images_dir=str(tmp_path))
+        await sink.start()
+        for i in range(10):
+            await sink.submit(EventRecord(camera_id=900 + i % 2, event_type="no_helmet", image_bytes=b"jpeg", summary={}))
+        await asyncio.sleep(0.05)  # o consumidor já tirou o lote da fila
+        await sink.stop()
+
+    asyncio.run(scenario())
+    db = SessionLocal()
+    try:
+        rows = db.query(Event).filter(Event.camera_id.in_([900, 901])).all()
+    finally:
+        db.close()
+    assert len(rows) == 10
+    assert len(os.listdir(tmp_path)) == 10
+    assert all(os.path.exists(r.image_path) for r in rows)
+
+
+def test_sink_can_be_restarted_after_stop(tmp_path):
+    Base.metadata.create_all(engine)
+    thumbs = ThumbnailGenerator(thumbs_dir=str(tmp_path / "thumbs"))
+    ok, jpg = cv2.imencode(".jpg", np.full((240, 320, 3), 80, dtype=np.uint8))
+
+    async def scenario():
+        sink = EventSink(batch_size=5, flush_interval=0.01, images_dir=str(tmp_path / "images"), thumbnails=thumbs)
+        for camera_id in (910, 911):
+            await sink.start()
+            for _ in range(3):
+                await sink.submit(EventRecord(camera_id=camera_id, event_type="no_helmet", image_bytes=jpg.tobytes(), summary={}))
+            await sink.stop()
+
+    asyncio.run(scenario())
+    db = SessionLocal()
+    try:
+        rows = db.query(Event).filter(Event.camera_id.in_([910, 911])).all()
+    finally:
+        db.close()
+    assert sorted(r.camera_id for r in rows) == [910] * 3 + [911] * 3
+    assert all(r.thumb_path and os.path.exists(r.image_path) for r in rows)
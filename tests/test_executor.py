@@ -0,0 +1,141 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from app.services import executor, model_registry
+from app.services.detections import Detections
+
+
+class EchoDetector:
+    """Detector de teste: devolve uma caixa com a soma dos pixels de cada frame."""
+
+    backend = "fake"
+
+    def __init__(self, path):
+        self.fail = path.endswith("broken.pt")
+
+    def detect_batch(self, images, conf):
+        if self.fail:
+            raise RuntimeError("falha na inferência")
+        return [
+            Detections(
+                np.array([[0, 0, img.shape[1], img.shape[0]]], dtype=np.float32),
+                np.array([float(img.sum())], dtype=np.float32),
+                np.zeros(1, dtype=np.int32),
+                ("person",),
+            )
+            for img in images
+        ]
+
+
+def _use_fake_registry():
+    model_registry._registry = model_registry.ModelRegistry(check_interval=3600, loader=EchoDetector)
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "_registry", None)
+    _use_fake_registry()
+    paths = {}
+    for name in ("ok.pt", "broken.pt"):
+        paths[name] = str(tmp_path / name)
+        open(paths[name], "wb").close()
+    return paths
+
+
+def _frames():
+    return [np.full((4, 6, 3), i, dtype=np.uint8) for i in (1, 2, 3)]
+
+
+def test_thread_backend_round_trip_and_clean_close(models):
+    backend = executor.ThreadBackend(models["ok.pt"], workers=2)
+
+    async def go():
+        return await backend.detect_batch(_frames(), 0.5)
+
+    result = asyncio.run(go())
+    assert [float(d.scores[0]) for d in result] == [72.0, 144.0, 216.0]
+    backend.close()
+    with pytest.raises(RuntimeError):
+        backend._infer_pool.submit(int)
+    with pytest.raises(RuntimeError):
+        backend._decode_pool.submit(int)
+
+
+@pytest.fixture
+def process_backend(models):
+    backend = executor.ProcessBackend(models["ok.pt"], workers=1, decode_workers=1)
+    # Troca o pool por um cujos processos usam o detector de teste
+    backend._pool.shutdown(wait=True)
+    backend._pool = ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"), initializer=_use_fake_registry)
+    yield backend
+    backend.close()
+
+
+def _track_shared(monkeypatch):
+    names = []
+    pack = executor._pack_shared
+
+    def tracking(images):
+        shm, layout = pack(images)
+        names.append(shm.name)
+        return shm, layout
+
+    monkeypatch.setattr(executor, "_pack_shared", tracking)
+    return names
+
+
+def _is_unlinked(name):
+    try:
+        SharedMemory(name=name).close()
+    except FileNotFoundError:
+        return True
+    return False
+
+
+def test_process_backend_round_trip_reports_worker_stats(process_backend, models, monkeypatch):
+    names = _track_shared(monkeypatch)
+    result = asyncio.run(process_backend.detect_batch(_frames(), 0.5))
+    assert [float(d.scores[0]) for d in result] == [72.0, 144.0, 216.0]
+    assert names and all(_is_unlinked(n) for n in names)
+
+    # O registro do processo pai não carregou nada, mas expõe o que o filho carregou
+    stats = {s["path"]: s for s in model_registry.get_model_registry().stats()}
+    entry = stats[models["ok.pt"]]
+    assert entry["loaded"] and entry["backend"] == "fake"
+    assert len(entry["workers"]) == 1 and entry["memory_bytes"] == entry["workers"][0]["memory_bytes"]
+
+
+def test_process_backend_unlinks_shared_memory_on_error(process_backend, models, monkeypatch):
+    names = _track_shared(monkeypatch)
+    with pytest.raises(RuntimeError, match="falha na inferência"):
+        asyncio.run(process_backend.detect_batch(_frames(), 0.5, model_path=models["broken.pt"]))
+    assert names and all(_is_unlinked(n) for n in names)
+
+
+def test_pack_shared_unlinks_when_copy_fails(monkeypatch):
+    created = []
+    real = executor.SharedMemory
+
+    def tracking(*args, **kwargs):
+        shm = real(*args, **kwargs)
+        created.append(shm.name)
+        return shm
+
+    monkeypatch.setattr(executor, "SharedMemory", tracking)
+    bad = np.full((2, 2, 3), "x")  # não converte para uint8 na cópia
+    with pytest.raises(ValueError):
+        executor._pack_shared([np.zeros((2, 2, 3), dtype=np.uint8), bad])
+    assert created and all(_is_unlinked(n) for n in created)
+
+
+def test_process_backend_close_stops_pools(process_backend):
+    process_backend.close()
+    with pytest.raises(RuntimeError):
+        process_backend._pool.submit(int)
+    with pytest.raises(RuntimeError):
+        process_backend._decode_pool.submit(int)
@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+
+from app.services.frame_gate import FrameGate
+
+
+def _scene(box=None, noise=0, seed=0):
+    rng = np.random.default_rng(seed)
+    img = np.tile(np.linspace(40, 200, 640, dtype=np.float32), (480, 1))
+    img = np.dstack([img, img, img])
+    if box is not None:
+        x, y = box
+        img[y:y + 200, x:x + 160] = 255
+    if noise:
+        img += rng.integers(-noise, noise + 1, img.shape)
+    ok, jpg = cv2.imencode(".jpg", np.clip(img, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    assert ok
+    return jpg.tobytes()
+
+
+def test_identical_bytes_are_skipped_by_hash():
+    gate = FrameGate(sensitivity=0.02)
+    frame = _scene()
+    assert gate.check(frame)
+    assert not gate.check(frame)
+    assert not gate.check(bytes(frame))
+
+
+def test_small_noise_below_sensitivity_is_skipped():
+    gate = FrameGate(sensitivity=0.02)
+    assert gate.check(_scene())
+    noisy = _scene(noise=3, seed=1)
+    assert noisy != _scene()
+    assert not gate.check(noisy)
+
+
+def test_real_change_runs_inference_and_becomes_the_reference():
+    gate = FrameGate(sensitivity=0.02)
+    assert gate.check(_scene())
+    assert gate.check(_scene(box=(200, 100)))
+    assert not gate.check(_scene(box=(200, 100), noise=3))
+    assert gate.check(_scene())
+
+
+def test_inference_is_forced_after_max_skipped():
+    gate = FrameGate(sensitivity=0.02, max_skipped=3)
+    frame = _scene()
+    assert gate.check(frame)
+    assert [gate.check(frame) for _ in range(4)] == [False, False, False, True]
+    assert not gate.check(frame)
+
+
+def test_zero_sensitivity_disables_the_gate():
+    gate = FrameGate(sensitivity=0)
+    frame = _scene()
+    assert gate.check(frame) and gate.check(frame)
+
+
+def test_each_camera_keeps_its_own_reference():
+    cam1, cam2 = FrameGate(), FrameGate()
+    a, b = _scene(), _scene(box=(300, 200))
+    assert cam1.check(a)
+    assert cam2.check(a)  # a referência da câmera 1 não afeta a 2
+    assert cam2.check(b)
+    assert not cam1.check(a)
+    assert cam1.check(b)
+    assert not cam2.check(b)
@@ -0,0 +1,109 @@
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import deps, schemas
+from app.models import Base, SessionLocal, User, engine
+from app.services import thumbnails
+from app.services.thumbnails import ImageCache, image_response
+
+
+def _request(**headers):
+    raw = [(k.replace("_", "-").lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+@pytest.fixture
+def image(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "_image_cache", ImageCache())
+    path = tmp_path / "1.jpg"
+    path.write_bytes(b"\xff\xd8jpeg\xff\xd9")
+    return str(path)
+
+
+def test_lru_evicts_the_least_recently_used(tmp_path):
+    cache = ImageCache(max_entries=2)
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f"{i}.jpg"))
+        open(paths[-1], "wb").close()
+    cache.put((1, 0), paths[0])
+    cache.put((2, 0), paths[1])
+    cache.get((1, 0))  # 2 passa a ser o menos usado
+    cache.put((3, 0), paths[2])
+    assert cache.get((2, 0)) is None
+    assert cache.get((1, 0)) and cache.get((3, 0))
+
+    cache.put((1, 320), paths[0])
+    cache.discard(1)
+    assert cache.get((1, 0)) is None and cache.get((1, 320)) is None
+    assert cache.put((4, 0), str(tmp_path / "missing.jpg")) is None
+
+
+def test_conditional_requests_skip_the_lookup(image):
+    lookups = []
+
+    def lookup():
+        lookups.append(1)
+        return image
+
+    first = image_response(_request(), 1, 0, lookup)
+    assert first.status_code == 200
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+
+    hit = image_response(_request(if_none_match=etag), 1, 0, lookup)
+    assert hit.status_code == 304 and hit.headers["etag"] == etag
+    assert image_response(_request(if_none_match=f'"other", {etag}'), 1, 0, lookup).status_code == 304
+    assert image_response(_request(if_modified_since=last_modified), 1, 0, lookup).status_code == 304
+    assert image_response(_request(if_none_match='"other"'), 1, 0, lookup).status_code == 200
+    assert len(lookups) == 1
+
+    # Outro tamanho do mesmo evento tem entrada (e ETag) próprias
+    thumb = image_response(_request(), 1, 320, lookup)
+    assert thumb.headers["etag"] != etag and len(lookups) == 2
+
+
+def test_missing_files_return_404_and_leave_the_cache(image):
+    with pytest.raises(HTTPException) as exc:
+        image_response(_request(), 2, 0, lambda: None)
+    assert exc.value.status_code == 404
+
+    image_response(_request(), 1, 0, lambda: image)
+    os.remove(image)
+    with pytest.raises(HTTPException) as exc:
+        image_response(_request(), 1, 0, lambda: image)
+    assert exc.value.status_code == 404
+    assert thumbnails.get_image_cache().get((1, 0)) is None
+
+
+def test_update_user_forgets_the_cached_check_after_commit(monkeypatch):
+    from app.routers.users import update_user
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.query(User).filter(User.email == "cache@example.com").delete()
+    user = User(email="cache@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    assert deps._user_is_active("cache@example.com")
+
+    seen = []
+    forget = deps.forget_user
+
+    def checking(email):
+        other = SessionLocal()
+        try:
+            seen.append(other.query(User.is_active).filter(User.email == email).scalar())
+        finally:
+            other.close()
+        forget(email)
+
+    monkeypatch.setattr(deps, "forget_user", checking)
+    try:
+        update_user(user.id, schemas.UserUpdate(is_active=False), db=db, _=None)
+    finally:
+        db.close()
+    assert seen == [False]  # já gravado quando o cache foi limpo
+    assert not deps._user_is_active("cache@example.com")
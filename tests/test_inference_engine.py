@@ -0,0 +1,131 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.detections import Detections
+from app.services.yolo import InferenceEngine
+
+NAMES = ("person", "helmet", "mask")
+
+
+class FakeBackend:
+    """Backend de teste: registra os batches e devolve 3 pessoas com scores fixos."""
+
+    model_path = "default.pt"
+
+    def __init__(self, max_concurrency=1, delay=0.0, fail=False):
+        self.max_concurrency = max_concurrency
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+
+    async def detect_batch(self, images, conf, model_path):
+        self.calls.append((len(images), conf, model_path))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("modelo indisponível")
+        out = []
+        for _ in images:
+            scores = np.array([0.3, 0.5, 0.9], dtype=np.float32)
+            keep = scores >= conf
+            boxes = np.tile(np.array([[0, 0, 10, 20]], dtype=np.float32), (3, 1))
+            out.append(Detections(boxes[keep], scores[keep], np.zeros(int(keep.sum()), dtype=np.int32), NAMES))
+        return out
+
+    def close(self):
+        pass
+
+
+FRAME = np.zeros((8, 8, 3), dtype=np.uint8)
+
+
+def _run(engine, coro):
+    async def scenario():
+        try:
+            return await coro(engine)
+        finally:
+            await engine.stop()
+    return asyncio.run(scenario())
+
+
+def test_concurrent_frames_are_micro_batched_up_to_max_batch_size():
+    backend = FakeBackend(delay=0.01)
+    engine = InferenceEngine(backend, max_batch_size=4, max_wait_ms=20)
+
+    async def go(e):
+        return await asyncio.gather(*(e.detect(FRAME, 0.4, camera_id=i) for i in range(6)))
+
+    results = _run(engine, go)
+    assert len(results) == 6
+    assert sorted(size for size, _, _ in backend.calls) == [2, 4]
+
+
+def test_max_wait_bounds_how_long_a_batch_waits():
+    backend = FakeBackend()
+    engine = InferenceEngine(backend, max_batch_size=8, max_wait_ms=30)
+
+    async def go(e):
+        async def late(delay, cam):
+            await asyncio.sleep(delay)
+            return await e.detect(FRAME, 0.4, camera_id=cam)
+        # 2º frame chega dentro da janela, 3º bem depois dela
+        await asyncio.gather(late(0, 1), late(0.01, 2), late(0.15, 3))
+
+    _run(engine, go)
+    assert [size for size, _, _ in backend.calls] == [2, 1]
+
+
+def test_each_camera_threshold_is_applied_after_the_shared_batch():
+    backend = FakeBackend()
+    engine = InferenceEngine(backend, max_batch_size=4, max_wait_ms=20)
+
+    async def go(e):
+        return await asyncio.gather(e.detect(FRAME, 0.4, camera_id=1), e.detect(FRAME, 0.8, camera_id=2))
+
+    low, high = _run(engine, go)
+    assert backend.calls == [(2, 0.4, "default.pt")]  # um batch, com o menor limiar
+    assert low.scores.tolist() == pytest.approx([0.5, 0.9])
+    assert high.scores.tolist() == pytest.approx([0.9])
+
+
+def test_batches_never_mix_models():
+    backend = FakeBackend()
+    engine = InferenceEngine(backend, max_batch_size=8, max_wait_ms=20)
+
+    async def go(e):
+        await asyncio.gather(
+            e.detect(FRAME, 0.4, camera_id=1),
+            e.detect(FRAME, 0.4, camera_id=2, model_path="other.pt"),
+            e.detect(FRAME, 0.4, camera_id=3),
+        )
+
+    _run(engine, go)
+    assert sorted((size, model) for size, _, model in backend.calls) == [(1, "other.pt"), (2, "default.pt")]
+
+
+def test_backend_errors_reach_every_frame_of_the_batch():
+    engine = InferenceEngine(FakeBackend(fail=True), max_batch_size=4, max_wait_ms=10)
+
+    async def go(e):
+        return await asyncio.gather(*(e.detect(FRAME, 0.4, camera_id=i) for i in range(3)), return_exceptions=True)
+
+    results = _run(engine, go)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_cancelled_waiters_are_skipped_and_empty_frames_short_circuit():
+    backend = FakeBackend(delay=0.05)
+    engine = InferenceEngine(backend, max_batch_size=1, max_wait_ms=0)
+
+    async def go(e):
+        first = asyncio.ensure_future(e.detect(FRAME, 0.4, camera_id=1))
+        gone = asyncio.ensure_future(e.detect(FRAME, 0.4, camera_id=2))
+        await asyncio.sleep(0.01)
+        gone.cancel()
+        await first
+        empty = await e.detect(np.zeros((0, 0, 3), dtype=np.uint8), 0.4)
+        return empty
+
+    empty = _run(engine, go)
+    assert len(backend.calls) == 1 and len(empty) == 0
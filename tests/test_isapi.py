@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+
+from app.services import metrics
+from app.services.isapi import NvrClientPool
+
+
+def test_close_nvr_waits_for_in_flight_requests():
+    async def slow(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, content=b"jpeg")
+
+    async def scenario():
+        pool = NvrClientPool(timeout=2.0, auth_scheme="basic")
+        old = pool._clients["http://nvr"] = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+        fetch = asyncio.create_task(pool.fetch_picture("http://nvr/", 101, "u", "p"))
+        await asyncio.sleep(0.05)
+        closing = asyncio.create_task(pool.close_nvr("http://nvr"))
+        await asyncio.sleep(0)
+        # O cliente novo já atende enquanto o antigo termina a requisição
+        assert (await pool.get_client("http://nvr")) is not old
+        assert await fetch == b"jpeg"
+        await closing
+        assert old.is_closed
+        await pool.aclose()
+
+    asyncio.run(scenario())
+
+
+def _counter(counter, nvr):
+    return counter.labels(nvr=nvr)._value.get()
+
+
+def test_pool_reuses_one_client_per_nvr():
+    async def scenario():
+        pool = NvrClientPool()
+        hits, misses = _counter(metrics.nvr_pool_hits_counter, "http://pool"), _counter(metrics.nvr_pool_misses_counter, "http://pool")
+        first = await pool.get_client("http://pool/")
+        again = await pool.get_client("http://pool")
+        other = await pool.get_client("http://other")
+        assert first is again and other is not first
+        assert _counter(metrics.nvr_pool_misses_counter, "http://pool") == misses + 1
+        assert _counter(metrics.nvr_pool_hits_counter, "http://pool") == hits + 1
+
+        # Cliente fechado é recriado (miss)
+        await first.aclose()
+        assert (await pool.get_client("http://pool")) is not first
+        assert _counter(metrics.nvr_pool_misses_counter, "http://pool") == misses + 2
+        await pool.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_auth_defaults_to_basic_and_is_cached_per_credentials():
+    pool = NvrClientPool()
+    auth = pool.get_auth("http://nvr/", "u", "p")
+    assert isinstance(auth, httpx.BasicAuth)
+    assert pool.get_auth("http://nvr", "u", "p") is auth
+    assert pool.get_auth("http://nvr", "u", "other") is not auth
+    assert isinstance(NvrClientPool(auth_scheme="digest").get_auth("http://nvr", "u", "p"), httpx.DigestAuth)
+
+
+def test_close_nvr_drops_cached_auth_and_gives_up_after_timeout():
+    started = asyncio.Event()
+
+    async def hang(request):
+        started.set()
+        await asyncio.sleep(10)
+        return httpx.Response(200, content=b"jpeg")
+
+    async def scenario():
+        pool = NvrClientPool(timeout=0.1)
+        old = pool._clients["http://nvr"] = httpx.AsyncClient(transport=httpx.MockTransport(hang))
+        auth = pool.get_auth("http://nvr", "u", "p")
+        fetch = asyncio.create_task(pool.fetch_picture("http://nvr", 101, "u", "p", timeout=10))
+        await started.wait()
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        await pool.close_nvr("http://nvr")
+        # Espera no máximo timeout + 1 s pela requisição presa e fecha assim mesmo
+        assert loop.time() - t0 < 2.0 and old.is_closed
+        assert pool.get_auth("http://nvr", "u", "p") is not auth
+        fetch.cancel()
+        try:
+            await fetch
+        except BaseException:
+            pass
+        await pool.aclose()
+
+    asyncio.run(scenario())
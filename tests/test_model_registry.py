@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.services import model_registry
+from app.services.model_registry import ModelRegistry
+
+
+class FakeProcess:
+    """RSS constante: a memória estimada de cada modelo vira o tamanho do arquivo."""
+
+    def memory_info(self):
+        return type("mem", (), {"rss": 100})()
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry.psutil, "Process", FakeProcess)
+    paths = {}
+    for name in "abc":
+        paths[name] = str(tmp_path / f"{name}.pt")
+        with open(paths[name], "wb") as f:
+            f.write(b"\0" * 400)
+    return paths
+
+
+def _loaded(registry):
+    return [os.path.basename(s["path"]) for s in registry.stats() if s["loaded"]]
+
+
+def _budget(nbytes):
+    return nbytes / (1024 * 1024)
+
+
+def test_lru_eviction_keeps_the_budget(files):
+    registry = ModelRegistry(memory_budget_mb=_budget(1000), loader=lambda path: object())
+    registry.get(files["a"])
+    registry.get(files["b"])
+    registry.get(files["c"])  # 1200 bytes: descarta o menos usado (a)
+    assert _loaded(registry) == ["b.pt", "c.pt"]
+
+    registry.get(files["b"])
+    registry.get(files["a"])  # agora c é o menos usado
+    assert _loaded(registry) == ["b.pt", "a.pt"]
+
+
+def test_models_in_use_are_never_evicted(files):
+    registry = ModelRegistry(memory_budget_mb=_budget(1000), loader=lambda path: object())
+    registry.retain(files["a"])
+    for name in "abc":
+        registry.get(files[name])
+    assert _loaded(registry) == ["a.pt", "c.pt"]
+
+    registry.release(files["a"])
+    registry.retain(files["c"])
+    registry.get(files["b"])
+    assert "c.pt" in _loaded(registry) and "a.pt" not in _loaded(registry)
+
+
+def test_changed_mtime_reloads_the_model(files):
+    registry = ModelRegistry(check_interval=0, loader=lambda path: object())
+    first = registry.get(files["a"])
+    assert registry.get(files["a"]) is first
+
+    stat = os.stat(files["a"])
+    os.utime(files["a"], (stat.st_atime, stat.st_mtime + 10))
+    second = registry.get(files["a"])
+    assert second is not first
+    assert registry.get(files["a"]) is second
+
+
+def test_reload_runs_outside_the_registry_lock(files):
+    started, proceed = threading.Event(), threading.Event()
+    slow = {"on": False}
+
+    def loader(path):
+        if slow["on"] and path.endswith("a.pt"):
+            started.set()
+            proceed.wait(5)
+        return object()
+
+    registry = ModelRegistry(check_interval=0, loader=loader)
+    old = registry.get(files["a"])
+    slow["on"] = True
+    stat = os.stat(files["a"])
+    os.utime(files["a"], (stat.st_atime, stat.st_mtime + 10))
+
+    result = {}
+    reloader = threading.Thread(target=lambda: result.setdefault("new", registry.get(files["a"])))
+    reloader.start()
+    assert started.wait(5)
+
+    # Durante a recarga o registro segue atendendo: outros modelos carregam
+    # e quem pede o mesmo modelo recebe a versão antiga (mtime já verificado).
+    t0 = time.monotonic()
+    registry.check_interval = 3600
+    assert registry.get(files["b"]) is not None
+    assert registry.get(files["a"]) is old
+    assert registry.stats()
+    assert time.monotonic() - t0 < 1
+
+    proceed.set()
+    reloader.join(5)
+    assert result["new"] is not old
+    assert registry.get(files["a"]) is result["new"]
@@ -0,0 +1,27 @@
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from onnx import TensorProto, helper  # noqa: E402
+
+from app.services.onnx_detector import OnnxDetector  # noqa: E402
+
+
+def _fixed_model(path, size):
+    graph = helper.make_graph(
+        [helper.make_node("Identity", ["images"], ["output"])],
+        "fixed",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, [1, 3, size, size])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, [1, 3, size, size])],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 12)])
+    onnx.save(model, str(path))
+    return str(path)
+
+
+def test_fixed_input_size_must_match_the_decoder(tmp_path):
+    path = _fixed_model(tmp_path / "fixed320.onnx", 320)
+    with pytest.raises(ValueError, match="INFER_INPUT_SIZE=640"):
+        OnnxDetector(path, input_size=640)
+    assert OnnxDetector(path, input_size=320).input_size == 320
@@ -0,0 +1,55 @@
+import datetime as dt
+
+import pytest
+from fastapi import HTTPException
+
+from app import schemas
+from app.models import Base, Camera, Event, EventRollup, SessionLocal, engine
+from app.routers.events import search_events
+from app.routers.reports import search_reports
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    for model in (EventRollup, Event, Camera):
+        session.query(model).delete()
+    session.add(Camera(id=1, name="cam1", nvr_base_url="http://nvr", username="u", password="p", channel_no=101))
+    same = dt.datetime(2026, 5, 1, 12, 0)
+    # 5 eventos no mesmo instante entre dois mais novos e um mais antigo
+    times = [same + dt.timedelta(minutes=2), same + dt.timedelta(minutes=1)] + [same] * 5 + [same - dt.timedelta(minutes=1)]
+    session.add_all(Event(camera_id=1, image_path="", ppe_status="no_helmet", created_at=t) for t in times)
+    session.commit()
+    yield session
+    session.close()
+
+
+def _all_pages(fetch):
+    seen, cursor = [], None
+    while True:
+        page = fetch(cursor)
+        seen.extend((e.created_at, e.id) for e in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return seen
+
+
+def test_keyset_pages_do_not_skip_or_repeat_ties(db):
+    expected = [(e.created_at, e.id) for e in db.query(Event).order_by(Event.created_at.desc(), Event.id.desc())]
+    for limit in (1, 2, 3):
+        events = _all_pages(lambda c: search_events(cursor=c, limit=limit, db=db, _=None))
+        assert events == expected
+        reports = _all_pages(lambda c: search_reports(schemas.ReportFilter(), cursor=c, limit=limit, db=db, _=None))
+        assert reports == expected
+
+
+def test_legacy_switch_returns_the_bare_list(db):
+    items = search_events(limit=3, legacy=True, db=db, _=None)
+    assert isinstance(items, list) and len(items) == 3
+
+
+def test_invalid_cursor_is_a_400(db):
+    with pytest.raises(HTTPException) as exc:
+        search_events(cursor="not-a-cursor", db=db, _=None)
+    assert exc.value.status_code == 400
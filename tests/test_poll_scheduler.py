@@ -0,0 +1,188 @@
+import asyncio
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from app.services.detections import Detections
+from app.workers.manager import PollScheduler
+
+
+def _camera(cam_id: int, interval: float):
+    return SimpleNamespace(id=cam_id, nvr_base_url="http://nvr.local/", polling_interval=interval)
+
+
+async def _poll(scheduler: PollScheduler, cam_id: int, until: float, busy: bool, starts: list):
+    loop = asyncio.get_running_loop()
+    while loop.time() < until:
+        await scheduler.wait_turn(cam_id)
+        starts.append(loop.time())
+        scheduler.report(cam_id, persons=1 if busy else 0, violation=busy, changed=busy)
+
+
+def test_idle_camera_does_not_delay_busy_camera_on_same_nvr():
+    interval, duration = 0.1, 1.5
+
+    async def scenario():
+        scheduler = PollScheduler(min_factor=0.5, max_factor=4.0, idle_after=1)
+        scheduler.register(_camera(1, interval))
+        scheduler.register(_camera(2, interval))
+        until = asyncio.get_running_loop().time() + duration
+        idle, busy = [], []
+        await asyncio.gather(
+            _poll(scheduler, 1, until, False, idle),
+            _poll(scheduler, 2, until, True, busy),
+        )
+        return idle, busy
+
+    idle, busy = asyncio.run(scenario())
+    # Ocupada: ~0.5x o intervalo (≈30 consultas); ociosa: recua até 4x
+    assert len(busy) >= 0.6 * duration / (interval * 0.5)
+    assert len(idle) < len(busy) / 2
+    gaps = [b - a for a, b in zip(busy, busy[1:])]
+    assert max(gaps) < interval * 1.5
+
+
+def test_cameras_due_together_are_spread_across_the_nvr():
+    async def scenario():
+        scheduler = PollScheduler()
+        for cam_id in (1, 2, 3, 4):
+            scheduler.register(_camera(cam_id, 0.4))
+        loop = asyncio.get_running_loop()
+        starts = {}
+
+        async def one(cam_id):
+            await scheduler.wait_turn(cam_id)
+            starts[cam_id] = loop.time()
+
+        await asyncio.gather(*(one(c) for c in (1, 2, 3, 4)))
+        return sorted(starts.values())
+
+    starts = asyncio.run(scenario())
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    # 4 canais, 0.4 s: um pedido a cada ~0.1 s em vez de rajada
+    assert min(gaps) >= 0.08
+
+
+def test_wait_turn_does_not_spend_the_inference_budget():
+    async def scenario():
+        scheduler = PollScheduler(budget_fps=2)
+        scheduler.register(_camera(1, 0.01))
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        for _ in range(10):
+            await scheduler.wait_turn(1)
+            scheduler.report(1, persons=1)
+        polls = loop.time() - t0
+        t0 = loop.time()
+        for _ in range(3):
+            await scheduler.acquire_budget()
+        return polls, loop.time() - t0
+
+    polls, charged = asyncio.run(scenario())
+    assert polls < 0.3          # consultas não esperam fichas
+    assert charged >= 0.4       # 3 fichas a 2/s: a 2ª e a 3ª esperam
+
+
+def test_errors_back_off_exponentially_and_reset_on_success():
+    async def scenario():
+        scheduler = PollScheduler(max_factor=4.0)
+        scheduler.register(_camera(1, 1.0))
+        await scheduler.wait_turn(1)
+        sched = scheduler._cams[1]
+        delays = []
+        for _ in range(4):
+            scheduler.report(1, error=True)
+            delays.append(round(sched.next_due - sched.last_start, 3))
+        scheduler.report(1, persons=1)
+        delays.append(round(sched.next_due - sched.last_start, 3))
+        return delays
+
+    assert asyncio.run(scenario()) == [2.0, 4.0, 4.0, 4.0, 0.5]
+
+
+class _FakeScheduler:
+    def __init__(self, worker_stop_after):
+        self.turns = 0
+        self.budget = 0
+        self.reports = []
+        self.stop_after = worker_stop_after
+        self.worker = None
+
+    async def wait_turn(self, camera_id):
+        self.turns += 1
+        if self.turns >= self.stop_after:
+            self.worker.stop()
+        await asyncio.sleep(0)
+
+    async def acquire_budget(self):
+        self.budget += 1
+
+    def report(self, camera_id, **kwargs):
+        self.reports.append(kwargs)
+
+
+class _FakeEngine:
+    def __init__(self):
+        self.detected = 0
+
+    async def preprocess(self, fn, *args):
+        return fn(*args)
+
+    async def decode(self, jpg, decoder=None):
+        return np.zeros((8, 8, 3), dtype=np.uint8)
+
+    async def detect(self, image, threshold, camera_id=None, model_path=None):
+        self.detected += 1
+        return Detections.empty(("person", "helmet", "mask"))
+
+    def retain_model(self, model_path=None):
+        pass
+
+    def release_model(self, model_path=None):
+        pass
+
+
+class _FakeHttp:
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    async def fetch_picture(self, *args, **kwargs):
+        return self.frames.pop(0) if self.frames else b""
+
+
+def _worker_camera():
+    return SimpleNamespace(
+        id=1, nvr_base_url="http://nvr.local/", channel_no=101, username="u", password="p",
+        polling_interval=1, ai_model_path=None, change_sensitivity=0.02, enabled=True,
+        threshold=0.4, debounce_sec=5, detect_person=True, detect_helmet=True, detect_mask=True,
+    )
+
+
+def _run_worker(frames, turns):
+    from app.services.metrics import get_metrics
+    from app.services.snapshots import SnapshotCache
+    from app.workers.picture_worker import PictureWorker
+
+    scheduler, engine = _FakeScheduler(turns), _FakeEngine()
+    worker = PictureWorker(
+        _worker_camera(), get_metrics(), sink=None, engine=engine, http_pool=_FakeHttp(frames),
+        scheduler=scheduler, snapshots=SnapshotCache(),
+    )
+    scheduler.worker = worker
+    asyncio.run(asyncio.wait_for(worker.run(), 5))
+    return scheduler, engine
+
+
+def test_budget_is_charged_only_for_frames_sent_to_the_engine():
+    ok, jpg = cv2.imencode(".jpg", np.full((48, 64, 3), 128, dtype=np.uint8))
+    scheduler, engine = _run_worker([jpg.tobytes()] * 4, turns=4)
+    # 1º frame inferido; os 3 idênticos são pulados pelo FrameGate
+    assert engine.detected == 1 and scheduler.budget == 1
+    assert len(scheduler.reports) == 4
+
+
+def test_fetch_errors_are_reported_to_the_scheduler():
+    scheduler, engine = _run_worker([], turns=3)
+    assert scheduler.reports == [{"error": True}] * 3
+    assert engine.detected == 0 and scheduler.budget == 0
@@ -0,0 +1,113 @@
+from app.services.detections import Detections
+from app.services.ppe_rules import PPEAnalyzer, event_type
+
+PERSON_WITHOUT_PPE = [{"class": "person", "bbox": [0, 0, 100, 200], "confidence": 0.9}]
+PERSON_WITH_HELMET = PERSON_WITHOUT_PPE + [{"class": "helmet", "bbox": [10, 0, 90, 60], "confidence": 0.8}]
+
+
+def test_disabled_flags_do_not_raise_violations():
+    analyzer = PPEAnalyzer(iou_threshold=0.15)
+    dets = Detections.from_dicts(PERSON_WITHOUT_PPE)
+    assert event_type(analyzer.analyze_detections(dets)) == "no_helmet_no_mask"
+    assert event_type(analyzer.analyze_detections(dets, mask=False)) == "no_helmet"
+    assert event_type(analyzer.analyze_detections(dets, helmet=False)) == "no_mask"
+    summary = analyzer.analyze_detections(dets, helmet=False, mask=False)
+    assert summary["total_violations"] == 0 and summary["details"][0]["helmet"] is None
+    assert analyzer.analyze_detections(dets, person=False)["total_persons"] == 0
+
+
+def test_helmet_flag_only_checks_helmet():
+    analyzer = PPEAnalyzer(iou_threshold=0.15)
+    summary = analyzer.analyze_detections(Detections.from_dicts(PERSON_WITH_HELMET), mask=False)
+    assert summary["total_ok"] == 1 and event_type(summary) is None
+
+
+def _iou(boxA, boxB) -> float:
+    xA, yA = max(boxA[0], boxB[0]), max(boxA[1], boxB[1])
+    xB, yB = min(boxA[2], boxB[2]), min(boxA[3], boxB[3])
+    inter = max(0, xB - xA) * max(0, yB - yA)
+    if inter == 0:
+        return 0.0
+    areaA = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
+    areaB = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
+    return inter / float(areaA + areaB - inter)
+
+
+class _ReferenceAnalyzer(PPEAnalyzer):
+    """Laço original (par a par com `_iou`), anterior à versão vetorizada."""
+
+    def reference(self, detections):
+        persons = [d for d in detections if d["class"] == "person"]
+        helmets = [d for d in detections if d["class"] == "helmet"]
+        masks = [d for d in detections if d["class"] == "mask"]
+        details = []
+        for person in persons:
+            has_helmet = any(_iou(person["bbox"], h["bbox"]) > self.iou_threshold for h in helmets)
+            has_mask = any(_iou(person["bbox"], m["bbox"]) > self.iou_threshold for m in masks)
+            if has_helmet and has_mask:
+                status = "OK"
+            elif not has_helmet and not has_mask:
+                status = "Sem capacete e máscara"
+            elif not has_helmet:
+                status = "Sem capacete"
+            else:
+                status = "Sem máscara"
+            details.append({"person_bbox": person["bbox"], "helmet": has_helmet, "mask": has_mask, "status": status})
+        ok = sum(d["status"] == "OK" for d in details)
+        return {"total_persons": len(persons), "total_ok": ok, "total_violations": len(persons) - ok, "details": details}
+
+
+def _random_detections(rnd, persons):
+    out = []
+    for _ in range(persons):
+        x, y = rnd.randrange(0, 1800), rnd.randrange(0, 900)
+        w, h = rnd.randrange(40, 200), rnd.randrange(100, 400)
+        out.append({"class": "person", "bbox": [x, y, x + w, y + h], "confidence": 0.9})
+        for cls in ("helmet", "mask"):
+            if rnd.random() < 0.6:
+                dx, dy = rnd.randrange(-30, 30), rnd.randrange(-30, 60)
+                out.append({"class": cls, "bbox": [x + dx, y + dy, x + dx + w // 2, y + dy + w // 2], "confidence": 0.8})
+    rnd.shuffle(out)
+    return out
+
+
+def test_vectorized_analysis_matches_original_loop():
+    import random
+
+    rnd = random.Random(0)
+    fixtures = [
+        # Exemplo do próprio módulo (ppe_rules.__main__)
+        [
+            {"class": "person", "bbox": [0, 0, 100, 200], "confidence": 0.9},
+            {"class": "helmet", "bbox": [10, 10, 90, 60], "confidence": 0.8},
+            {"class": "mask", "bbox": [20, 60, 80, 120], "confidence": 0.85},
+        ],
+        PERSON_WITHOUT_PPE,
+        PERSON_WITH_HELMET,
+        [],
+    ]
+    fixtures += [_random_detections(rnd, rnd.randrange(0, 30)) for _ in range(300)]
+    for threshold in (0.3, 0.15):
+        analyzer = _ReferenceAnalyzer(iou_threshold=threshold)
+        for detections in fixtures:
+            expected = analyzer.reference(detections)
+            for got in (analyzer.analyze(detections), analyzer.analyze(Detections.from_dicts(detections))):
+                assert got["total_persons"] == expected["total_persons"]
+                assert got["total_ok"] == expected["total_ok"]
+                assert got["total_violations"] == expected["total_violations"]
+                for g, e in zip(got["details"], expected["details"]):
+                    assert g["person_bbox"] == [float(v) for v in e["person_bbox"]]
+                    assert (g["helmet"], g["mask"], g["status"]) == (e["helmet"], e["mask"], e["status"])
+
+
+def test_hungarian_maximizes_number_of_matches():
+    import numpy as np
+    import pytest
+
+    pytest.importorskip("scipy")
+    from app.services.ppe_rules import assign
+
+    # P1-H1=0.9, P1-H2=0.2, P2-H1=0.2: o ótimo em pares é P1-H2 + P2-H1
+    scores = np.array([[0.9, 0.2], [0.2, 0.0]])
+    assert assign(scores, 0.1, "hungarian").tolist() == [True, True]
+    assert assign(scores, 0.1, "greedy").tolist() == [True, False]
@@ -0,0 +1,19 @@
+import numpy as np
+
+from app.services.preprocess import letterbox
+
+
+def test_to_original_clips_boxes_in_letterbox_padding():
+    frame = letterbox(np.zeros((2160, 3840, 3), dtype=np.uint8), size=640)
+    assert frame.pad_y > 0
+    boxes = np.array([
+        [-5.0, 0.0, 700.0, frame.pad_y + 10.0],    # começa na faixa de padding superior
+        [100.0, 630.0, 200.0, 640.0],              # inteira no padding inferior
+        [320.0, 320.0, 330.0, 330.0],              # dentro da imagem
+    ], dtype=np.float32)
+    out = frame.to_original(boxes)
+    assert out[:, 0::2].min() >= 0 and out[:, 0::2].max() <= 3840
+    assert out[:, 1::2].min() >= 0 and out[:, 1::2].max() <= 2160
+    np.testing.assert_allclose(out[0], [0, 0, 3840, 10 * frame.scale_y], rtol=1e-5)
+    np.testing.assert_allclose(out[1, [1, 3]], [2160, 2160])
+    np.testing.assert_allclose(out[2], [1920, 1080, 1980, 1140], atol=0.5)
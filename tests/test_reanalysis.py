@@ -0,0 +1,151 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app.models import Base, ReanalysisJob, ReanalysisResult, SessionLocal, engine
+from app.routers import reanalysis as reanalysis_router
+from app.services import reanalysis
+from app.services.detections import Detections
+
+
+class FakeBackend:
+    max_concurrency = 1
+
+    def __init__(self):
+        self.frames = 0
+
+    async def detect_batch(self, images, conf, model_path=None):
+        self.frames += len(images)
+        return [Detections.empty(("person", "helmet", "mask")) for _ in images]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.query(ReanalysisResult).delete()
+    db.query(ReanalysisJob).delete()
+    db.commit()
+    db.close()
+    backend = FakeBackend()
+    monkeypatch.setattr(reanalysis, "create_backend", lambda *args: backend)
+    ok, jpg = cv2.imencode(".jpg", np.full((48, 64, 3), 90, dtype=np.uint8))
+    for i in range(5):
+        (tmp_path / f"img{i}.jpg").write_bytes(jpg.tobytes())
+    return str(tmp_path)
+
+
+def _job(directory, **values):
+    db = SessionLocal()
+    try:
+        job = reanalysis.create_job(db, source="directory", directory=directory, threshold=0.4)
+        for key, value in values.items():
+            setattr(job, key, value)
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+
+
+def _results(job_id):
+    db = SessionLocal()
+    try:
+        return [r.image_path for r in db.query(ReanalysisResult).filter(ReanalysisResult.job_id == job_id)]
+    finally:
+        db.close()
+
+
+def _reanalyzer():
+    return reanalysis.Reanalyzer(batch_size=2, chunk_size=2, decode_workers=1, backend="inline")
+
+
+def test_results_and_checkpoint_share_one_transaction(images):
+    job_id = _job(images)
+    reanalyzer = _reanalyzer()
+    try:
+        row = {"job_id": job_id, "image_path": "x.jpg", "persons": 0, "violations": 0, "changed": False}
+        with pytest.raises(Exception):
+            reanalyzer._write_chunk(job_id, [row], {"position": "x.jpg", "no_such_column": 1})
+        assert _results(job_id) == []
+        assert reanalyzer._load_job(job_id).position is None
+    finally:
+        reanalyzer.close()
+
+
+def test_resume_continues_after_the_last_checkpoint(images):
+    job_id = _job(images)
+    reanalyzer = _reanalyzer()
+    try:
+        first = asyncio.run(reanalyzer.run(job_id, time_budget=0))
+        assert first["status"] == "paused" and first["processed"] == 2
+        assert reanalyzer._reopen(job_id)
+        second = asyncio.run(reanalyzer.run(job_id))
+    finally:
+        reanalyzer.close()
+    assert second["status"] == "done" and second["processed"] == 5
+    paths = _results(job_id)
+    assert len(paths) == 5 and len(set(paths)) == 5
+
+
+def test_cli_resume_only_reopens_interrupted_jobs(images):
+    done = _job(images, status="done")
+    cancelled = _job(images, status="cancelled")
+    for job_id in (done, cancelled):
+        with pytest.raises(SystemExit, match="só jobs"):
+            reanalysis.main(["--resume", str(job_id)])
+    with pytest.raises(SystemExit, match="não encontrado"):
+        reanalysis.main(["--resume", "999999"])
+
+    stale = _job(images, status="running")
+    reanalysis.main(["--resume", str(stale)])
+    db = SessionLocal()
+    try:
+        assert db.get(ReanalysisJob, done).status == "done"
+        assert db.get(ReanalysisJob, cancelled).status == "cancelled"
+        assert db.get(ReanalysisJob, stale).status == "done"
+    finally:
+        db.close()
+
+
+def test_pause_and_cancel_endpoints(images):
+    job_id = _job(images)
+    db = SessionLocal()
+    try:
+        assert reanalysis_router.pause_job(job_id, db=db, _=None)["status"] == "paused"
+        with pytest.raises(HTTPException) as exc:
+            reanalysis_router.pause_job(job_id, db=db, _=None)
+        assert exc.value.status_code == 409
+        assert reanalysis_router.cancel_job(job_id, db=db, _=None)["status"] == "cancelled"
+        with pytest.raises(HTTPException) as exc:
+            reanalysis_router.cancel_job(job_id, db=db, _=None)
+        assert exc.value.status_code == 409
+        with pytest.raises(HTTPException) as exc:
+            reanalysis_router.pause_job(12345678, db=db, _=None)
+        assert exc.value.status_code == 404
+    finally:
+        db.close()
+
+
+def test_pause_from_the_api_stops_the_run_at_the_next_chunk(images):
+    job_id = _job(images)
+    reanalyzer = _reanalyzer()
+    calls = []
+
+    def progress(state):
+        calls.append(state["processed"])
+        if len(calls) == 1:
+            reanalyzer._set_job(job_id, status="paused")
+
+    try:
+        result = asyncio.run(reanalyzer.run(job_id, progress=progress))
+    finally:
+        reanalyzer.close()
+    # Pausa gravada depois do 1º bloco: o bloco em andamento termina e grava
+    assert result["status"] == "paused" and result["processed"] == 4
+    assert len(_results(job_id)) == 4
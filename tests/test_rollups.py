@@ -0,0 +1,59 @@
+import datetime as dt
+
+from app.models import Base, Camera, Event, EventRollup, SessionLocal, engine
+from app.services import rollups
+
+
+def _reset():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    for model in (EventRollup, Event, Camera):
+        db.query(model).delete()
+    db.add(Camera(id=1, name="cam1", nvr_base_url="http://nvr", username="u", password="p", channel_no=101))
+    db.commit()
+    return db
+
+
+def _add(db, *times, status="no_helmet"):
+    events = [Event(camera_id=1, image_path="", ppe_status=status, created_at=t) for t in times]
+    db.add_all(events)
+    db.flush()
+    rollups.record_events(db, events)
+    db.commit()
+    return events
+
+
+def test_count_since_includes_the_partial_first_hour():
+    db = _reset()
+    try:
+        since = dt.datetime(2026, 5, 1, 10, 40)
+        _add(
+            db,
+            dt.datetime(2026, 5, 1, 10, 20),  # antes da janela, mesma hora
+            dt.datetime(2026, 5, 1, 10, 45),  # trecho parcial: vem dos minutos
+            dt.datetime(2026, 5, 1, 10, 59),
+            dt.datetime(2026, 5, 1, 11, 0),   # horas completas
+            dt.datetime(2026, 5, 2, 9, 30),
+        )
+        assert rollups.count_since(db, since) == 4
+        assert rollups.count_since(db, dt.datetime(2026, 5, 1, 11, 0)) == 2
+        assert rollups.total_count(db) == 5
+    finally:
+        db.close()
+
+
+def test_delete_event_discounts_the_rollups():
+    from app.routers.events import delete_event
+
+    db = _reset()
+    try:
+        kept, removed = _add(db, dt.datetime(2026, 5, 1, 10, 5), dt.datetime(2026, 5, 1, 10, 6))
+        delete_event(removed.id, db=db, _=None)
+        assert db.query(Event).count() == 1
+        assert rollups.total_count(db) == 1
+        counts = {(r.bucket, r.bucket_start): r.count for r in db.query(EventRollup)}
+        assert counts[("minute", dt.datetime(2026, 5, 1, 10, 5))] == 1
+        assert counts[("minute", dt.datetime(2026, 5, 1, 10, 6))] == 0
+        assert counts[("hour", dt.datetime(2026, 5, 1, 10, 0))] == 1
+    finally:
+        db.close()
@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import pytest
+
+from app.models import Base, Camera, SessionLocal, engine
+from app.workers import manager as manager_module
+from app.workers.manager import WorkerManager
+
+
+class FakeWorker:
+    """Worker de teste: `behaviour` decide se roda, trava ou quebra."""
+
+    behaviour = "ok"
+    runs = 0
+
+    def __init__(self, camera, metrics, sink, http_pool=None, scheduler=None):
+        self.camera = camera
+        self.heartbeat = time.monotonic()
+        self.last_frame_at = None
+        self.consecutive_errors = 0
+        self.last_error = None
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def update_config(self, camera):
+        self.camera = camera
+
+    async def run(self):
+        FakeWorker.runs += 1
+        if self.behaviour == "crash":
+            raise RuntimeError("NVR caiu")
+        while not self._stop:
+            if self.behaviour == "ok":
+                self.heartbeat = time.monotonic()
+                self.last_frame_at = time.time()
+            await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def fake_workers(monkeypatch):
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        db.query(Camera).delete()
+        db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(manager_module, "PictureWorker", FakeWorker)
+    FakeWorker.behaviour = "ok"
+    FakeWorker.runs = 0
+    return FakeWorker
+
+
+def _camera(cam_id=1):
+    return Camera(id=cam_id, name=f"cam{cam_id}", nvr_base_url="http://nvr", username="u", password="p",
+                  channel_no=101, polling_interval=0.01, enabled=True)
+
+
+def _manager(**kw):
+    options = dict(watchdog_interval=0.01, stall_after=0.2, backoff_base=0.05, backoff_max=1.0, stable_after=0.3)
+    options.update(kw)
+    return WorkerManager(**options)
+
+
+def test_crashing_worker_is_restarted_with_jittered_backoff(fake_workers, monkeypatch):
+    jitter = []
+    monkeypatch.setattr(manager_module.random, "uniform", lambda a, b: jitter.append((a, b)) or 1.5)
+    fake_workers.behaviour = "crash"
+
+    async def scenario():
+        m = _manager()
+        await m.start()
+        m.start_worker(_camera())
+        sup = m._cams[1]
+        while sup.state != "backoff":
+            await asyncio.sleep(0)
+        first_delay = sup.next_start - time.monotonic()
+        await asyncio.sleep(0.5)
+        health = m.health(1)[0]
+        await m.stop()
+        return first_delay, sup, health
+
+    first_delay, sup, health = asyncio.run(scenario())
+    # 1ª falha: base * 2^0 * jitter(1.5)
+    assert 0.05 < first_delay <= 0.075 + 1e-3
+    assert jitter and all(j == (0.5, 1.5) for j in jitter)
+    assert sup.restarts >= 2 and sup.failures >= 3
+    assert sup.last_exit.startswith("crash")
+    assert health["status"] in ("down", "ok")
+
+
+def test_stalled_worker_is_cancelled_and_restarted(fake_workers):
+    fake_workers.behaviour = "hang"
+
+    async def scenario():
+        m = _manager()
+        await m.start()
+        m.start_worker(_camera())
+        sup = m._cams[1]
+        await asyncio.sleep(0)
+        first_task = sup.task
+        await asyncio.sleep(0.4)
+        await m.stop()
+        return first_task, sup
+
+    first_task, sup = asyncio.run(scenario())
+    assert first_task.cancelled()
+    assert sup.last_exit.startswith("stalled")
+    assert sup.restarts >= 1
+
+
+def test_failures_reset_after_stable_run_and_health(fake_workers):
+    async def scenario():
+        m = _manager()
+        await m.start()
+        m.start_worker(_camera(1))
+        m.start_worker(_camera(2))
+        await asyncio.sleep(0.05)
+        m._cams[1].failures = 4
+        m._cams[1].started_at = time.monotonic() - 10
+        await asyncio.sleep(0.05)
+        health = {h["camera_id"]: h for h in m.health()}
+        one = m.health(2)
+        await m.stop()
+        return m, health, one
+
+    m, health, one = asyncio.run(scenario())
+    assert health[1]["status"] == "ok" and health[2]["status"] == "ok"
+    assert health[1]["heartbeat_age_sec"] is not None and health[1]["uptime_sec"] >= 0
+    assert [h["camera_id"] for h in one] == [2]
+    assert not m._cams
+
+
+def test_watchdog_errors_are_counted(fake_workers, monkeypatch):
+    from app.services import metrics
+
+    errors = []
+    monkeypatch.setattr(metrics, "record_watchdog_error", lambda: errors.append(1))
+
+    async def scenario():
+        m = _manager()
+        monkeypatch.setattr(m, "_check", lambda: 1 / 0)
+        await m.start()
+        await asyncio.sleep(0.05)
+        alive = not m._watchdog.done()
+        await m.stop()
+        return alive
+
+    assert asyncio.run(scenario())
+    assert errors
+
+
+def test_assign_waits_for_removed_workers(fake_workers):
+    async def scenario():
+        m = _manager()
+        await m.start()
+        m.start_worker(_camera(1))
+        await asyncio.sleep(0)
+        task = m._cams[1].task
+        still = await m.assign({})
+        done = task.done()
+        await m.stop()
+        return still, done
+
+    still, done = asyncio.run(scenario())
+    assert still == set() and done